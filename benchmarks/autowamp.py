@@ -0,0 +1,37 @@
+"""
+Benchmark in-process RPC through the Autobahn transport in direct mode.
+
+Run with: python benchmarks/autowamp.py
+"""
+
+import time
+
+from autobahn.twisted.wamp import ApplicationSession
+
+from wampyre.transports.autowamp import ApplicationRunner
+
+NUMBER = 20000
+
+
+class Callee(ApplicationSession):
+    def onJoin(self, details):
+        return self.register(lambda a: a, "bench.echo")
+
+
+class Caller(ApplicationSession):
+    def onJoin(self, details):
+        start = time.perf_counter()
+        for i in range(NUMBER):
+            self.call("bench.echo", i)
+        duration = time.perf_counter() - start
+        print(f"call: {duration / NUMBER * 1e6:.2f}us per call")
+
+
+def main():
+    runner = ApplicationRunner("bench")
+    runner.run(Callee)
+    runner.run(Caller)
+
+
+if __name__ == "__main__":
+    main()
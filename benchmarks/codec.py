@@ -0,0 +1,82 @@
+"""
+Benchmark the available JSON codecs on representative WAMP messages.
+
+Run with: python benchmarks/codec.py
+"""
+
+import timeit
+
+from wampyre.codec import CODECS
+from wampyre.opcodes import OP
+
+MESSAGES = {
+    "hello": [
+        OP.HELLO,
+        "a.realm",
+        {
+            "roles": {
+                "caller": {"features": {"progressive_call_results": True}},
+                "callee": {"features": {"call_canceling": True}},
+                "publisher": {"features": {"publisher_exclusion": True}},
+                "subscriber": {"features": {"pattern_based_subscription": True}},
+            },
+            "agent": "AutobahnJS-19.6.2",
+        },
+    ],
+    "publish_small": [OP.PUBLISH, 1234, {}, "com.myapp.topic", ["hello"]],
+    "event_kwargs": [
+        OP.EVENT,
+        5512315355,
+        4429313566,
+        {"topic": "com.myapp.stock.update"},
+        [],
+        {"symbol": "ACME", "price": 124.37, "volume": 18000, "ts": 1561800000.123},
+    ],
+    "call": [
+        OP.CALL,
+        7814135,
+        {},
+        "com.myapp.user.get",
+        [123],
+        {"fields": ["name", "email", "groups"]},
+    ],
+    "result_large": [
+        OP.RESULT,
+        7814135,
+        {},
+        [
+            {"id": i, "name": "user %i" % i, "email": "user%i@example.com" % i}
+            for i in range(100)
+        ],
+    ],
+}
+
+NUMBER = 20000
+
+
+def main():
+    codecs = []
+    for codec_cls in CODECS.values():
+        try:
+            codecs.append(codec_cls())
+        except ImportError:
+            print(f"{codec_cls.name}: not installed")
+
+    for message_name, message in MESSAGES.items():
+        print(f"{message_name}:")
+        encoded = codecs[-1].encode(message)
+        for codec in codecs:
+            encode_time = (
+                timeit.timeit(lambda: codec.encode(message), number=NUMBER) / NUMBER
+            )
+            decode_time = (
+                timeit.timeit(lambda: codec.decode(encoded), number=NUMBER) / NUMBER
+            )
+            print(
+                f"  {codec.name:<8} encode {encode_time * 1e6:8.2f}us"
+                f"  decode {decode_time * 1e6:8.2f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict
+
+
+class AuthorizationCache:
+    """
+    Least recently used cache of the decisions of guard and realm_authenticator,
+    every decision expires after ttl seconds.
+
+    Decisions are kept per session, with per_user they are shared by the sessions
+    of a user when the transport knows who the user is.
+    """
+
+    def __init__(self, ttl=60, max_size=10000, per_user=False):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.per_user = per_user
+        self.entries = OrderedDict()
+        self.scopes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_scope(self, session):
+        if self.per_user:
+            user_key = session.transport.get_user_key()
+            if user_key is not None:
+                return user_key
+        return session
+
+    def get(self, session, method, uri):
+        """
+        Returns the cached decision for method and uri, None if there is none.
+        """
+        key = (self.get_scope(session), method, uri)
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, allowed = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return allowed
+
+            self._remove(key)
+
+        self.misses += 1
+        return None
+
+    def set(self, session, method, uri, allowed):
+        key = (self.get_scope(session), method, uri)
+        self.entries[key] = (time.monotonic() + self.ttl, allowed)
+        self.entries.move_to_end(key)
+        self.scopes.setdefault(key[0], set()).add(key)
+        while len(self.entries) > self.max_size:
+            self._remove(next(iter(self.entries)))
+
+    def invalidate(self, scope=None, uri=None):
+        """
+        Remove the decisions of scope, a user key or a session, optionally only for uri.
+        Without a scope, the decisions of everybody are removed.
+        Returns the number of decisions removed.
+        """
+        if scope is None:
+            keys = list(self.entries)
+        else:
+            keys = list(self.scopes.get(scope, ()))
+
+        if uri is not None:
+            keys = [key for key in keys if key[2] == uri]
+
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def forget(self, session):
+        self.invalidate(session)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+        }
+
+    def _remove(self, key):
+        del self.entries[key]
+        keys = self.scopes[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.scopes[key[0]]
@@ -0,0 +1,71 @@
+import json
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Least recently used cache of call results, every result expires after its ttl.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(registration_id, procedure, args=None, kwargs=None):
+        """
+        Returns a key for a call, None if the arguments cannot be canonicalized.
+        """
+        try:
+            arguments = json.dumps(
+                [args or [], kwargs or {}], sort_keys=True, separators=(",", ":")
+            )
+        except (TypeError, ValueError):
+            return None
+
+        return registration_id, procedure, arguments
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, result = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+            del self.entries[key]
+
+        self.misses += 1
+        return None
+
+    def set(self, key, result, ttl):
+        self.entries[key] = (time.monotonic() + ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, procedure=None):
+        """
+        Remove the results of procedure, or all results.
+        Returns the number of results removed.
+        """
+        if procedure is None:
+            removed = len(self.entries)
+            self.entries.clear()
+            return removed
+
+        keys = [key for key in self.entries if key[1] == procedure]
+        for key in keys:
+            del self.entries[key]
+        return len(keys)
+
+    def invalidate_registration(self, registration_id):
+        for key in [key for key in self.entries if key[0] == registration_id]:
+            del self.entries[key]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
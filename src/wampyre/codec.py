@@ -0,0 +1,85 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JSONCodec:
+    """Codec using the json module from the standard library"""
+
+    name = "json"
+
+    def decode(self, data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def encode(self, content):
+        return json.dumps(content, separators=(",", ":"), ensure_ascii=False)
+
+
+class OrjsonCodec:
+    """Codec using orjson, decodes str, bytes and memoryview without copying"""
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._loads = orjson.loads
+        self._dumps = orjson.dumps
+
+    def decode(self, data):
+        return self._loads(data)
+
+    def encode(self, content):
+        return self._dumps(content).decode("utf-8")
+
+
+class UjsonCodec:
+    """Codec using ujson"""
+
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+
+        self._loads = ujson.loads
+        self._dumps = ujson.dumps
+
+    def decode(self, data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return self._loads(data)
+
+    def encode(self, content):
+        return self._dumps(content, ensure_ascii=False, escape_forward_slashes=False)
+
+
+CODECS = {
+    OrjsonCodec.name: OrjsonCodec,
+    UjsonCodec.name: UjsonCodec,
+    JSONCodec.name: JSONCodec,
+}
+
+
+def get_codec(name=None):
+    """
+    Returns the fastest available codec.
+    If name is given that codec is tried first.
+    """
+    names = list(CODECS.keys())
+    if name is not None:
+        if name not in CODECS:
+            logger.warning(f"Unknown codec {name}, falling back to the defaults")
+        else:
+            names.remove(name)
+            names.insert(0, name)
+
+    for codec_name in names:
+        try:
+            return CODECS[codec_name]()
+        except ImportError:
+            logger.debug(f"Codec {codec_name} is not available")
+
+    return JSONCodec()
@@ -0,0 +1,335 @@
+import logging
+import time
+from abc import ABC, abstractmethod
+
+from .opcodes import OP
+from .realm import realm_manager
+from .utils import generate_id, URIPattern
+
+logger = logging.getLogger(__name__)
+
+
+class Peer:
+    """
+    Another router as seen from a local realm.
+    It is used in place of a session when a call crosses routers.
+    """
+
+    def __init__(self, federation, node, realm):
+        self.federation = federation
+        self.node = node
+        self.realm = realm
+
+    def __repr__(self):
+        return f"<Peer {self.node}/{self.realm}>"
+
+    def generate_id(self):
+        return generate_id()
+
+    def send(self, opcode, *args):
+        if opcode == OP.INVOCATION:
+            invocation_id, registration_id, details, *payload = args
+            message = {
+                "type": "wampyre.call",
+                "invocation_id": invocation_id,
+                "procedure": details["procedure"],
+            }
+        elif opcode == OP.RESULT:
+            call_id, details, *payload = args
+            message = {"type": "wampyre.result", "invocation_id": call_id}
+        elif opcode == OP.ERROR:
+            request_opcode, call_id, details, error, *payload = args
+            message = {
+                "type": "wampyre.error",
+                "invocation_id": call_id,
+                "error": error,
+            }
+        else:
+            logger.warning(f"Unable to send opcode:{opcode} to {self!r}")
+            return
+
+        message["node"] = self.federation.node
+        message["realm"] = self.realm
+        message["args"] = payload[0] if len(payload) > 0 else None
+        message["kwargs"] = payload[1] if len(payload) > 1 else None
+        self.federation.send_to(self.node, message)
+
+
+class FederationBase(ABC):
+    """
+    Links the realms of this router to realms with the same name on other routers.
+
+    Every router tells the others which subscription and registration patterns
+    it has, publications are only sent to routers with a matching subscription
+    and calls are sent to the router with a matching registration.
+
+    Routers that send heartbeats are forgotten when they have not been heard from
+    for node_timeout seconds, with their patterns and the calls waiting for them.
+    """
+
+    node = None
+    heartbeat_interval = 10
+    node_timeout = 30
+
+    def __init__(self, realm_manager=realm_manager):
+        self.realm_manager = realm_manager
+
+        self.remote_subscriptions = {}
+        self.remote_registrations = {}
+        self.remote_pattern_ids = {}
+        self.peers = {}
+        self.last_seen = {}
+
+    @abstractmethod
+    def send_to(self, node, message):
+        """Send a message to a single router"""
+
+    @abstractmethod
+    def broadcast(self, message):
+        """Send a message to all other routers"""
+
+    ### Local events ###
+    def interest_changed(self, realm, kind, uri, match, added):
+        """
+        A pattern got its first session or lost its last session.
+        """
+        self.broadcast(
+            {
+                "type": "wampyre.interest",
+                "node": self.node,
+                "changes": [[realm, kind, uri, match, added]],
+            }
+        )
+
+    def publish(
+        self, realm, publication_id, topic, args=None, kwargs=None, receivers=None
+    ):
+        """
+        Send a publication to the routers with matching subscriptions.
+        """
+        subscriptions = self.remote_subscriptions.get(realm)
+        if not subscriptions:
+            return
+
+        nodes = {node for node, pattern_id in subscriptions.match_uri(topic)}
+        for node in nodes:
+            self.send_to(
+                node,
+                {
+                    "type": "wampyre.publish",
+                    "node": self.node,
+                    "realm": realm,
+                    "publication_id": publication_id,
+                    "topic": topic,
+                    "args": args,
+                    "kwargs": kwargs,
+                    "receivers": receivers,
+                },
+            )
+
+    def match_procedure(self, realm, procedure):
+        """
+        Find a router with a registration for procedure.
+        Returns (peer, registration_id) or None.
+        """
+        registrations = self.remote_registrations.get(realm)
+        if not registrations:
+            return None
+
+        matches = registrations.match_uri(procedure)
+        if not matches:
+            return None
+
+        node, registration_id = matches[0]
+        return self.get_peer(node, realm), registration_id
+
+    def get_peer(self, node, realm):
+        if (node, realm) not in self.peers:
+            self.peers[(node, realm)] = Peer(self, node, realm)
+        return self.peers[(node, realm)]
+
+    def snapshot(self):
+        """
+        Returns all patterns with sessions in the local realms.
+        """
+        changes = []
+        for realm in list(self.realm_manager.get_realms()):
+            for uri, match in realm.subscriptions.iter_patterns():
+                changes.append([realm.realm, "subscription", uri, match, True])
+            for uri, match in realm.registrations.iter_patterns():
+                changes.append([realm.realm, "registration", uri, match, True])
+        return changes
+
+    def hello(self, node=None):
+        """
+        Announce this router to a router, to all other routers without node.
+        """
+        message = {
+            "type": "wampyre.hello",
+            "node": self.node,
+            "changes": self.snapshot(),
+        }
+        if node is None:
+            self.broadcast(message)
+        else:
+            self.send_to(node, message)
+
+    def heartbeat(self):
+        """
+        Tell the other routers this router is still alive.
+        """
+        self.broadcast({"type": "wampyre.heartbeat", "node": self.node})
+
+    def expire_nodes(self):
+        """
+        Forget the routers not heard from for node_timeout seconds, e.g. a worker
+        that died without saying goodbye.
+        """
+        deadline = time.monotonic() - self.node_timeout
+        for node, last_seen in list(self.last_seen.items()):
+            if last_seen < deadline:
+                logger.info(f"No heartbeat from {node}, forgetting it")
+                self.node_lost(node)
+
+    def goodbye(self):
+        """
+        Tell the other routers this router is leaving.
+        """
+        self.broadcast({"type": "wampyre.goodbye", "node": self.node})
+
+    ### Remote events ###
+    def dispatch(self, message):
+        """
+        Handle a message from another router in the router loop.
+        """
+        self.realm_manager.submit(self.handle_message, message)
+
+    def handle_message(self, message):
+        message_type = message.get("type")
+        node = message.get("node")
+        if node is not None and node == self.node:
+            return
+
+        if node is not None:
+            known = node in self.last_seen
+            self.last_seen[node] = time.monotonic()
+            if not known and message_type not in ("wampyre.hello", "wampyre.goodbye"):
+                # Never seen or forgotten after a timeout, exchange the patterns again
+                self.hello(node)
+
+        if message_type == "wampyre.hello":
+            self.node_joined(node, message["changes"])
+            self.send_to(
+                node,
+                {
+                    "type": "wampyre.interest",
+                    "node": self.node,
+                    "changes": self.snapshot(),
+                },
+            )
+        elif message_type == "wampyre.interest":
+            self.apply_changes(node, message["changes"])
+        elif message_type == "wampyre.heartbeat":
+            pass  # The router was seen above
+        elif message_type == "wampyre.goodbye":
+            self.node_lost(node)
+        elif message_type == "wampyre.publish":
+            realm = self.realm_manager.realms.get(message["realm"])
+            if realm is not None:
+                realm.publish_local(
+                    message["publication_id"],
+                    message["topic"],
+                    message["args"],
+                    message["kwargs"],
+                    receivers=message.get("receivers"),
+                )
+        elif message_type == "wampyre.call":
+            self.handle_call(node, message)
+        elif message_type == "wampyre.result":
+            realm = self.realm_manager.realms.get(message["realm"])
+            if realm is not None:
+                realm.yield_(
+                    self.get_peer(node, message["realm"]),
+                    message["invocation_id"],
+                    message["args"],
+                    message["kwargs"],
+                )
+        elif message_type == "wampyre.error":
+            realm = self.realm_manager.realms.get(message["realm"])
+            if realm is not None:
+                realm.error_invocation(
+                    self.get_peer(node, message["realm"]),
+                    message["invocation_id"],
+                    {},
+                    message["error"],
+                    message["args"],
+                    message["kwargs"],
+                )
+        else:
+            logger.warning(f"Unknown federation message type:{message_type}")
+
+    def handle_call(self, node, message):
+        peer = self.get_peer(node, message["realm"])
+        realm = self.realm_manager.realms.get(message["realm"])
+        if realm is None or not realm.call(
+            peer,
+            message["invocation_id"],
+            message["procedure"],
+            message["args"],
+            message["kwargs"],
+            federate=False,
+        ):
+            peer.send(
+                OP.ERROR,
+                OP.CALL,
+                message["invocation_id"],
+                {},
+                "wamp.error.no_such_procedure",
+            )
+
+    def apply_changes(self, node, changes):
+        for realm, kind, uri, match, added in changes:
+            if kind == "subscription":
+                patterns = self.remote_subscriptions
+            else:
+                patterns = self.remote_registrations
+
+            key = (node, realm, kind, uri, match)
+            if added:
+                if key in self.remote_pattern_ids:
+                    continue
+                if realm not in patterns:
+                    patterns[realm] = URIPattern(allow_duplicate=True)
+                self.remote_pattern_ids[key] = patterns[realm].register_uri(
+                    node, uri, match
+                )
+            elif key in self.remote_pattern_ids:
+                patterns[realm].unregister_uri(node, self.remote_pattern_ids.pop(key))
+
+    def node_joined(self, node, changes):
+        """
+        A router announced itself with all its patterns.
+        """
+        self.last_seen[node] = time.monotonic()
+        self.apply_changes(node, changes)
+
+    def node_lost(self, node):
+        """
+        Forget everything about a router and fail the calls waiting for it.
+        """
+        self.last_seen.pop(node, None)
+        for key in [key for key in self.remote_pattern_ids if key[0] == node]:
+            del self.remote_pattern_ids[key]
+
+        for patterns in (self.remote_subscriptions, self.remote_registrations):
+            for pattern in patterns.values():
+                pattern.unregister_session(node)
+
+        for (peer_node, realm_name), peer in list(self.peers.items()):
+            if peer_node != node:
+                continue
+
+            del self.peers[(peer_node, realm_name)]
+            realm = self.realm_manager.realms.get(realm_name)
+            if realm is not None:
+                realm.session_lost(peer)
@@ -0,0 +1,132 @@
+import ast
+import operator
+
+
+class InvalidFilterException(Exception):
+    """The filter expression is not allowed"""
+
+
+MISSING = object()
+
+COMPARE_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+CONSTANT_TYPES = (str, int, float, bool, type(None))
+
+
+class EventFilter:
+    """
+    A compiled filter expression evaluated against the kwargs of an event.
+
+    Names refer to keys in kwargs, dotted names to keys in nested dicts.
+    Supported are and, or, not, comparisons, in and not in with constants, lists and tuples,
+    e.g. ``symbol in ["ACME", "EVIL"] and price >= 100``.
+    A comparison with a missing key is false.
+    """
+
+    max_length = 1024
+
+    def __init__(self, expression):
+        if not isinstance(expression, str) or len(expression) > self.max_length:
+            raise InvalidFilterException("Filter must be a string of limited length")
+
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError:
+            raise InvalidFilterException("Filter is not a valid expression")
+
+        self.expression = expression
+        self._evaluate = self._compile(tree.body)
+
+    def __call__(self, kwargs):
+        result = self._evaluate(kwargs or {})
+        return result is not MISSING and bool(result)
+
+    def _compile(self, node):
+        if isinstance(node, ast.BoolOp):
+            values = [self._compile(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return lambda kwargs: all(self._truth(v(kwargs)) for v in values)
+            return lambda kwargs: any(self._truth(v(kwargs)) for v in values)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            value = self._compile(node.operand)
+            return lambda kwargs: not self._truth(value(kwargs))
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            value = self._constant(node)
+            return lambda kwargs: value
+        elif isinstance(node, ast.Compare):
+            return self._compile_compare(node)
+        elif isinstance(node, (ast.Name, ast.Attribute)):
+            return self._compile_lookup(node)
+        else:
+            value = self._constant(node)
+            return lambda kwargs: value
+
+    def _compile_compare(self, node):
+        left = self._compile(node.left)
+        comparisons = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in COMPARE_OPERATORS:
+                raise InvalidFilterException("Operator is not allowed")
+            comparisons.append((COMPARE_OPERATORS[type(op)], self._compile(comparator)))
+
+        def compare(kwargs):
+            a = left(kwargs)
+            for op, comparator in comparisons:
+                b = comparator(kwargs)
+                if a is MISSING or b is MISSING:
+                    return False
+                try:
+                    if not op(a, b):
+                        return False
+                except TypeError:
+                    return False
+                a = b
+            return True
+
+        return compare
+
+    def _compile_lookup(self, node):
+        path = []
+        while isinstance(node, ast.Attribute):
+            path.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            raise InvalidFilterException("Only names can be looked up")
+        path.append(node.id)
+        path = path[::-1]
+
+        def lookup(kwargs):
+            value = kwargs
+            for key in path:
+                if not isinstance(value, dict) or key not in value:
+                    return MISSING
+                value = value[key]
+            return value
+
+        return lookup
+
+    def _constant(self, node):
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            return tuple(self._constant(element) for element in node.elts)
+
+        try:
+            value = ast.literal_eval(node)
+        except ValueError:
+            raise InvalidFilterException("Expression is not allowed in a filter")
+
+        if not isinstance(value, CONSTANT_TYPES):
+            raise InvalidFilterException("Constant type is not allowed")
+        return value
+
+    @staticmethod
+    def _truth(value):
+        return value is not MISSING and bool(value)
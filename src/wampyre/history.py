@@ -0,0 +1,93 @@
+from collections import OrderedDict, deque
+from itertools import count
+
+from .utils import URIPattern
+
+
+def topic_matches(uri, match, topic):
+    """
+    Check if topic is matched by a subscription to uri with match.
+    """
+    if match == "prefix":
+        return topic.startswith(uri + ".")
+    elif match == "wildcard":
+        uri_fragments = uri.split(".")
+        topic_fragments = topic.split(".")
+        return len(uri_fragments) == len(topic_fragments) and all(
+            u in ("", t) for u, t in zip(uri_fragments, topic_fragments)
+        )
+    else:
+        return uri == topic
+
+
+class EventHistory:
+    """
+    Keeps the last events published to the configured topics of a realm.
+
+    Every topic keeps at most the limit of the best matching configured pattern,
+    a limit of one is a last value cache. At most max_events are kept in a realm,
+    events of the least recently published topics are dropped first.
+    """
+
+    def __init__(self, topics, max_events=1000):
+        self.max_events = max_events
+        self.patterns = URIPattern(allow_duplicate=True)
+        self.limits = {}
+        for uri, match, limit in topics:
+            pattern_id = self.patterns.register_uri(self, uri, match)
+            self.limits[pattern_id] = limit
+
+        self.topics = OrderedDict()
+        self.size = 0
+        self._sequence = count()
+
+    def store(self, publication_id, topic, args=None, kwargs=None, receivers=None):
+        events = self.topics.get(topic)
+        if events is None:
+            # The most specific pattern is matched first
+            matches = self.patterns.match_uri(topic)
+            if not matches or not self.limits[matches[0][1]]:
+                return
+            limit = self.limits[matches[0][1]]
+            events = self.topics[topic] = deque(maxlen=limit)
+        else:
+            self.topics.move_to_end(topic)
+
+        if len(events) == events.maxlen:
+            self.size -= 1
+        events.append((next(self._sequence), publication_id, args, kwargs, receivers))
+        self.size += 1
+
+        while self.size > self.max_events:
+            oldest_topic, oldest_events = next(iter(self.topics.items()))
+            oldest_events.popleft()
+            self.size -= 1
+            if not oldest_events:
+                del self.topics[oldest_topic]
+
+    def get_events(self, uri, match=None, limit=None, receiver_filter=None):
+        """
+        Returns the kept events matching a subscription to uri with match
+        as (publication_id, topic, args, kwargs), the oldest first.
+        Events published with receivers are only returned if receiver_filter(receivers) is true.
+        """
+        if match in ("prefix", "wildcard"):
+            topics = [
+                topic for topic in self.topics if topic_matches(uri, match, topic)
+            ]
+        elif uri in self.topics:
+            topics = [uri]
+        else:
+            topics = []
+
+        events = sorted(
+            (sequence, publication_id, topic, args, kwargs)
+            for topic in topics
+            for sequence, publication_id, args, kwargs, receivers in self.topics[topic]
+            if not receivers
+            or (receiver_filter is not None and receiver_filter(receivers))
+        )
+        if limit is not None:
+            events = events[-limit:] if limit > 0 else []
+
+        return [event[1:] for event in events]
@@ -0,0 +1,325 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+from functools import partial
+from queue import Empty, SimpleQueue
+
+from .codec import get_codec
+from .utils import URIPattern
+
+logger = logging.getLogger(__name__)
+
+# Payload length and publication_id, a zero length marks the end of a segment
+RECORD_HEADER = struct.Struct("<IQ")
+
+
+class Segment:
+    """
+    A journal file of a fixed size mapped into memory.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.file = open(path, "a+b")
+        if os.path.getsize(path) < size:
+            self.file.truncate(size)
+        self.size = os.path.getsize(path)
+        self.mmap = mmap.mmap(self.file.fileno(), self.size)
+        self.view = memoryview(self.mmap)
+        self.offset = 0
+        self.publication_ids = []
+
+    def records(self, offset=0):
+        """
+        Yields (publication_id, payload) from offset, the payload is a memoryview
+        slice of the segment and is only valid until the next record is read.
+        """
+        while offset < self.offset:
+            length, publication_id = RECORD_HEADER.unpack_from(self.view, offset)
+            start = offset + RECORD_HEADER.size
+            offset = start + length
+            with self.view[start:offset] as payload:
+                yield publication_id, payload
+
+    def scan(self):
+        """
+        Find the records already written to the segment, e.g. before a crash.
+        """
+        offset = 0
+        while offset + RECORD_HEADER.size <= self.size:
+            length, publication_id = RECORD_HEADER.unpack_from(self.view, offset)
+            if not length or offset + RECORD_HEADER.size + length > self.size:
+                break
+            self.publication_ids.append((publication_id, offset))
+            offset += RECORD_HEADER.size + length
+        self.offset = offset
+
+    def close(self):
+        self.view.release()
+        self.mmap.flush()
+        self.mmap.close()
+        self.file.close()
+
+
+class Journal:
+    """
+    Append-only journal of the events published to durable topics.
+
+    Events are appended to a queue and written in batches by a writer thread,
+    so publishing never waits for the disk. Records are written to memory mapped
+    segment files of segment_size, when max_segments are in use the oldest is removed.
+    The journal is read back when opened, events survive a restart of the router.
+    Replays are read by the writer thread too, so they never block the router.
+    """
+
+    batch_size = 256
+    max_replay = 10000
+
+    def __init__(
+        self,
+        directory,
+        topics,
+        segment_size=16 * 1024 * 1024,
+        max_segments=8,
+        codec=None,
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.codec = codec or get_codec()
+
+        self.topics = URIPattern(allow_duplicate=True)
+        for uri, match in topics:
+            self.topics.register_uri(self, uri, match)
+
+        self.segments = []
+        self.index = {}
+        self.last_segment_number = 0
+
+        self._lock = threading.Lock()
+        self._queue = SimpleQueue()
+        self._thread = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.run, name="wampyre-journal", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        else:
+            self.flush()
+
+        with self._lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments = []
+            self.index = {}
+
+    def is_running(self):
+        return self._thread is not None
+
+    def is_durable(self, topic):
+        return bool(self.topics.match_uri(topic))
+
+    def append(self, publication_id, topic, args=None, kwargs=None, receivers=None):
+        """
+        Queue an event to be written with the receivers it was published to,
+        safe to call from any thread.
+        """
+        self._queue.put((publication_id, topic, args, kwargs, receivers))
+
+    def flush(self):
+        """
+        Wait until the queued events are written.
+        """
+        if self._thread is None:
+            records = []
+            try:
+                while True:
+                    records.append(self._queue.get_nowait())
+            except Empty:
+                pass
+            self._write(records)
+        else:
+            written = threading.Event()
+            self._queue.put(written)
+            written.wait()
+
+    def replay(
+        self,
+        after_publication_id=None,
+        topic_filter=None,
+        limit=None,
+        receiver_filter=None,
+    ):
+        """
+        Returns the events written after after_publication_id as
+        (publication_id, topic, args, kwargs), at most limit of them and only those
+        with a topic accepted by topic_filter. All events without after_publication_id,
+        None if after_publication_id is not in the journal.
+
+        Events published to restricted receivers are only returned
+        when receiver_filter accepts the receivers.
+        """
+        events = []
+        with self._lock:
+            segments = self.segments
+            segment, offset = None, None
+            if after_publication_id is not None:
+                if after_publication_id not in self.index:
+                    return None
+                segment, offset = self.index[after_publication_id]
+                segments = segments[segments.index(segment) :]
+
+            for s in segments:
+                records = s.records(offset if s is segment else 0)
+                if s is segment:
+                    next(records)
+
+                for publication_id, payload in records:
+                    topic, args, kwargs, *receivers = self.codec.decode(payload)
+                    if topic_filter is not None and not topic_filter(topic):
+                        continue
+                    if receivers and receivers[0]:
+                        if receiver_filter is None or not receiver_filter(receivers[0]):
+                            continue
+                    events.append((publication_id, topic, args, kwargs))
+                    if limit is not None and len(events) >= limit:
+                        return events
+
+        return events
+
+    def request_replay(
+        self, callback, after_publication_id, topic_filter=None, receiver_filter=None
+    ):
+        """
+        Read the events for replay in the writer thread, after the events queued before,
+        and call callback with the result of replay from that thread.
+        At most max_replay events are read.
+        """
+        request = partial(
+            self._replay_request,
+            callback,
+            after_publication_id,
+            topic_filter,
+            receiver_filter,
+        )
+        if self._thread is None:
+            self.flush()
+            request()
+        else:
+            self._queue.put(request)
+
+    def _replay_request(
+        self, callback, after_publication_id, topic_filter, receiver_filter
+    ):
+        try:
+            events = self.replay(
+                after_publication_id, topic_filter, self.max_replay, receiver_filter
+            )
+        except Exception:
+            logger.exception(f"Failed to replay events after {after_publication_id}")
+            events = None
+        callback(events)
+
+    def run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except Empty:
+                pass
+
+            self._write([item for item in batch if isinstance(item, tuple)])
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif callable(item):
+                    item()
+
+            if None in batch:
+                return
+
+    def _write(self, records):
+        encoded = [
+            (
+                publication_id,
+                self.codec.encode([topic, args, kwargs, receivers]).encode("utf-8"),
+            )
+            for publication_id, topic, args, kwargs, receivers in records
+        ]
+
+        with self._lock:
+            for publication_id, payload in encoded:
+                record_size = RECORD_HEADER.size + len(payload)
+                if record_size > self.segment_size:
+                    logger.warning(f"Event {publication_id} is too large for journal")
+                    continue
+
+                if (
+                    not self.segments
+                    or self.segments[-1].offset + record_size > self.segments[-1].size
+                ):
+                    self._rotate()
+
+                segment = self.segments[-1]
+                RECORD_HEADER.pack_into(
+                    segment.mmap, segment.offset, len(payload), publication_id
+                )
+                segment.mmap[
+                    segment.offset + RECORD_HEADER.size : segment.offset + record_size
+                ] = payload
+                segment.publication_ids.append((publication_id, segment.offset))
+                self.index[publication_id] = (segment, segment.offset)
+                segment.offset += record_size
+
+    def _rotate(self):
+        if self.segments:
+            self.segments[-1].mmap.flush()
+
+        self.last_segment_number += 1
+        self.segments.append(
+            Segment(self._segment_path(self.last_segment_number), self.segment_size)
+        )
+
+        while len(self.segments) > self.max_segments:
+            segment = self.segments.pop(0)
+            for publication_id, offset in segment.publication_ids:
+                self.index.pop(publication_id, None)
+            segment.close()
+            os.remove(segment.path)
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"{number:010d}.journal")
+
+    def _load(self):
+        numbers = sorted(
+            int(filename.split(".")[0])
+            for filename in os.listdir(self.directory)
+            if filename.endswith(".journal") and filename.split(".")[0].isdigit()
+        )
+
+        for number in numbers[: -self.max_segments]:
+            os.remove(self._segment_path(number))
+
+        for number in numbers[-self.max_segments :]:
+            segment = Segment(self._segment_path(number), self.segment_size)
+            segment.scan()
+            for publication_id, offset in segment.publication_ids:
+                self.index[publication_id] = (segment, offset)
+            self.segments.append(segment)
+
+        if numbers:
+            self.last_segment_number = numbers[-1]
@@ -24,3 +24,7 @@ class OP:
     UNREGISTERED = 67
     INVOCATION = 68
     YIELD = 70
+
+    # Extensions, not part of the WAMP specification
+    PUBLISH_BATCH = 240
+    EVENT_BATCH = 241
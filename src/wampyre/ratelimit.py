@@ -0,0 +1,98 @@
+import time
+from collections import Counter
+
+from .opcodes import OP
+
+RATE_LIMITED_OPCODES = {
+    OP.PUBLISH: "publish",
+    OP.PUBLISH_BATCH: "publish",
+    OP.CALL: "call",
+    OP.SUBSCRIBE: "subscribe",
+}
+
+
+class TokenBucket:
+    """
+    Allows rate messages per second on average and bursts of up to burst messages.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+
+    def available(self, tokens=1):
+        """
+        Returns True if tokens can be consumed, more tokens than burst need a full bucket.
+        """
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+        return self.tokens >= min(tokens, self.burst)
+
+    def consume(self, tokens=1):
+        if not self.available(tokens):
+            return False
+
+        self.tokens -= min(tokens, self.burst)
+        return True
+
+
+class RateLimiter:
+    """
+    Token buckets per session and per realm for the publish, call and subscribe classes.
+    Limits are dicts of class to (rate, burst), classes without a limit are not limited.
+    """
+
+    def __init__(self, session_limits=None, realm_limits=None):
+        self.session_limits = session_limits or {}
+        self.realm_buckets = {
+            message_class: TokenBucket(rate, burst)
+            for message_class, (rate, burst) in (realm_limits or {}).items()
+        }
+        self.session_buckets = {}
+
+        self.throttled = Counter()
+        self.session_throttled = {}
+
+    def allow(self, session, opcode, tokens=1):
+        """
+        Returns False if the message from session must be throttled.
+        """
+        message_class = RATE_LIMITED_OPCODES.get(opcode)
+        if message_class is None:
+            return True
+
+        buckets = []
+        if message_class in self.session_limits:
+            session_buckets = self.session_buckets.setdefault(session, {})
+            bucket = session_buckets.get(message_class)
+            if bucket is None:
+                bucket = session_buckets[message_class] = TokenBucket(
+                    *self.session_limits[message_class]
+                )
+            buckets.append(bucket)
+
+        bucket = self.realm_buckets.get(message_class)
+        if bucket is not None:
+            buckets.append(bucket)
+
+        # Nothing is charged unless every bucket has the tokens
+        if not all(bucket.available(tokens) for bucket in buckets):
+            return self._throttle(session, message_class)
+
+        for bucket in buckets:
+            bucket.consume(tokens)
+        return True
+
+    def forget(self, session):
+        self.session_buckets.pop(session, None)
+        self.session_throttled.pop(session, None)
+
+    def _throttle(self, session, message_class):
+        self.throttled[message_class] += 1
+        self.session_throttled.setdefault(session, Counter())[message_class] += 1
+        return False
@@ -1,14 +1,71 @@
 import logging
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future
+from functools import partial
 
+from .cache import ResultCache
+from .history import EventHistory, topic_matches
 from .opcodes import OP
+from .ratelimit import RateLimiter
 from .utils import generate_id, URIPattern
 
 logger = logging.getLogger(__name__)
 
+CallResult = namedtuple("CallResult", ["args", "kwargs"])
+
+RECEIVER_OPTIONS = ("exclude", "eligible", "exclude_authid", "eligible_authid")
+
+
+class CallError(Exception):
+    """A call made through the embedded API failed"""
+
+    def __init__(self, error, args=None, kwargs=None):
+        super().__init__(error)
+        self.error = error
+        self.error_args = args
+        self.error_kwargs = kwargs
+
+
+class EmbeddedCaller:
+    """
+    Stands in for a session when calling from the embedded API.
+    """
+
+    def __init__(self):
+        self.futures = {}
+
+    def send(self, opcode, *args):
+        if opcode == OP.RESULT:
+            request_id, details, *payload = args
+            future = self.futures.pop(request_id, None)
+            if future is not None and not future.done():
+                future.set_result(CallResult(*(payload + [None, None])[:2]))
+        elif opcode == OP.ERROR:
+            request_opcode, request_id, details, error, *payload = args
+            future = self.futures.pop(request_id, None)
+            if future is not None and not future.done():
+                future.set_exception(CallError(error, *payload))
+
+
+class CallQueue:
+    """
+    Invocations in flight and calls waiting for a registration with limited concurrency.
+    """
+
+    def __init__(self, concurrency, max_size):
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self.running = 0
+        self.queue = deque()
+
 
 class Realm:
-    def __init__(self, realm):
+    call_queue_size = 1000
+
+    def __init__(self, realm, manager=None):
         self.realm = realm
+        self.manager = manager
 
         self.subscriptions = URIPattern(allow_duplicate=True)
         self.registrations = URIPattern(allow_duplicate=False)
@@ -19,6 +76,41 @@ class Realm:
         self.invocations = {}
 
         self.sessions = set()
+        self.lost_sessions = set()
+        self.embedded_caller = EmbeddedCaller()
+
+        self.result_cache = ResultCache()
+        self.cache_ttls = {}
+        self.pending_results = {}
+
+        self.coalescing = set()
+        self.inflight = {}
+        self.waiting_calls = {}
+
+        self.call_queues = {}
+        self.queued_invocations = {}
+
+        self.meta_procedures = {
+            "wamp.subscription.get_events": self.meta_get_events,
+            "wamp.registration.invalidate_cache": self.meta_invalidate_cache,
+            "wamp.registration.cache_stats": self.meta_cache_stats,
+        }
+
+        self.event_history = None
+        if manager is not None and realm in manager.event_history:
+            self.event_history = EventHistory(**manager.event_history[realm])
+
+        self.journal = None
+        if manager is not None:
+            self.journal = manager.journals.get(realm)
+
+        self.rate_limiter = None
+        if manager is not None and realm in manager.rate_limits:
+            self.rate_limiter = RateLimiter(**manager.rate_limits[realm])
+
+        self.federation = None
+        if manager is not None and manager.federation is not None:
+            self.set_federation(manager.federation)
 
     ### Broker functionality ###
     def subscribe(self, session, options, topic):
@@ -26,7 +118,9 @@ class Realm:
         Subscribes a client to a topic.
         Returns a subscription_id
         """
-        return self.subscriptions.register_uri(session, topic, options.get("match"))
+        return self.subscriptions.register_uri(
+            session, topic, options.get("match"), options.get("filter")
+        )
 
     def unsubscribe(self, session, subscription_id):
         """
@@ -35,13 +129,89 @@ class Realm:
         """
         return self.subscriptions.unregister_uri(session, subscription_id)
 
-    def publish(self, options, topic, args=None, kwargs=None):
+    def publish(self, options, topic, args=None, kwargs=None, session=None):
         """
         Publish a message to a topic.
         Optionally returns a publication_id.
         """
+        receivers = self.receiver_options(options, session)
         publication_id = generate_id()
-        subscriptions = self.subscriptions.match_uri(topic)
+        self.publish_local(publication_id, topic, args, kwargs, receivers=receivers)
+
+        if self.federation is not None:
+            self.federation.publish(
+                self.realm, publication_id, topic, args, kwargs, receivers
+            )
+
+        if options.get("acknowledge"):
+            return publication_id
+
+    def publish_many(self, publications, receivers=None):
+        """
+        Publish a list of (topic, args, kwargs) in one pass.
+        Topics are only matched once per batch and the events are grouped
+        per subscriber, subscribers supporting it get them in one EVENT_BATCH.
+        Returns the publication_ids.
+        """
+        subscriptions = {}
+        session_events = {}
+        publication_ids = []
+        for topic, args, kwargs in publications:
+            if topic not in subscriptions:
+                subscriptions[topic] = self.filter_receivers(
+                    self.subscriptions.match_uri(topic), receivers
+                )
+
+            event_args = []
+            if args is not None:
+                event_args.append(args)
+                if kwargs is not None:
+                    event_args.append(kwargs)
+
+            publication_id = generate_id()
+            self.store_event(publication_id, topic, args, kwargs, receivers)
+
+            for subscription_session, subscription_id in self.filter_subscriptions(
+                subscriptions[topic], kwargs
+            ):
+                session_events.setdefault(subscription_session, []).append(
+                    [subscription_id, publication_id, {"topic": topic}] + event_args
+                )
+
+            if self.federation is not None:
+                self.federation.publish(
+                    self.realm, publication_id, topic, args, kwargs, receivers
+                )
+            publication_ids.append(publication_id)
+
+        for subscription_session, events in session_events.items():
+            if len(events) > 1 and getattr(subscription_session, "event_batch", False):
+                subscription_session.send(OP.EVENT_BATCH, events)
+            else:
+                for event in events:
+                    subscription_session.send(OP.EVENT, *event)
+
+        return publication_ids
+
+    def publish_local(
+        self,
+        publication_id,
+        topic,
+        args=None,
+        kwargs=None,
+        subscriptions=None,
+        receivers=None,
+    ):
+        """
+        Send an event to the subscribers connected to this router.
+        """
+        self.store_event(publication_id, topic, args, kwargs, receivers)
+
+        if subscriptions is None:
+            subscriptions = self.subscriptions.match_uri(topic)
+
+        subscriptions = self.filter_receivers(subscriptions, receivers)
+        subscriptions = self.filter_subscriptions(subscriptions, kwargs)
         if subscriptions:
             event_args = []
             if args is not None:
@@ -58,33 +228,299 @@ class Realm:
                 ] + event_args
                 subscription_session.send(*cmd)
 
-        if options.get("acknowledge"):
-            return publication_id
+    def store_event(
+        self, publication_id, topic, args=None, kwargs=None, receivers=None
+    ):
+        """
+        Keep an event in the event history and the journal,
+        with the receivers it was published to.
+        """
+        if self.event_history is not None:
+            self.event_history.store(publication_id, topic, args, kwargs, receivers)
+
+        if self.journal is not None and self.journal.is_durable(topic):
+            self.journal.append(publication_id, topic, args, kwargs, receivers)
+
+    def get_events(self, session, subscription_id, limit=None):
+        """
+        Returns the kept events for a subscription of session as
+        (publication_id, topic, args, kwargs), None if there is no such subscription.
+        """
+        pattern = self.subscriptions.sessions.get(session, {}).get(subscription_id)
+        if pattern is None:
+            return None
+
+        if self.event_history is None:
+            return []
+
+        uri, match = pattern.pattern
+        return self.event_history.get_events(
+            uri, match, limit, partial(self.is_receiver, session)
+        )
+
+    def send_retained(self, session, subscription_id):
+        """
+        Send the kept events for a subscription, e.g. to a new subscriber.
+        """
+        self.send_stored_events(
+            session,
+            subscription_id,
+            self.get_events(session, subscription_id) or [],
+            {"retained": True},
+        )
+
+    def send_replay(self, session, subscription_id, publication_id):
+        """
+        Send the journaled events published after publication_id for a subscription,
+        e.g. to a subscriber that reconnects. The events are read by the journal thread,
+        nothing is sent if publication_id is not in the journal.
+        """
+        pattern = self.subscriptions.sessions.get(session, {}).get(subscription_id)
+        if pattern is None or self.journal is None:
+            return
+
+        uri, match = pattern.pattern
+        self.journal.request_replay(
+            partial(self._replay_read, session, subscription_id),
+            publication_id,
+            partial(topic_matches, uri, match),
+            partial(self.is_receiver, session),
+        )
+
+    def _replay_read(self, session, subscription_id, events):
+        if self.manager is not None:
+            self.manager.submit(self._send_replay, session, subscription_id, events)
+        else:
+            self._send_replay(session, subscription_id, events)
+
+    def _send_replay(self, session, subscription_id, events):
+        if events is None:
+            logger.info(f"Nothing to replay for subscription {subscription_id}")
+            return
+
+        if subscription_id in self.subscriptions.sessions.get(session, {}):
+            self.send_stored_events(
+                session, subscription_id, events, {"replayed": True}
+            )
+
+    def send_stored_events(self, session, subscription_id, events, details):
+        event_filter = self.subscriptions.filters.get(subscription_id)
+        for publication_id, topic, args, kwargs in events:
+            if event_filter is not None and not event_filter(kwargs):
+                continue
+
+            cmd = [
+                OP.EVENT,
+                subscription_id,
+                publication_id,
+                dict(details, topic=topic),
+            ]
+            if args is not None:
+                cmd.append(args)
+                if kwargs is not None:
+                    cmd.append(kwargs)
+            session.send(*cmd)
+
+    def receiver_options(self, options, session=None):
+        """
+        Returns the black and white listing options of a publication or None,
+        exclude_me is turned into an exclude of the publishing session.
+        """
+        receivers = {
+            option: options[option]
+            for option in RECEIVER_OPTIONS
+            if isinstance(options.get(option), list)
+        }
+
+        if (
+            session is not None
+            and session.session_id is not None
+            and options.get("exclude_me", True)
+        ):
+            receivers["exclude"] = receivers.get("exclude", []) + [session.session_id]
+
+        return receivers or None
+
+    def filter_receivers(self, subscriptions, receivers):
+        """
+        Removes the subscriptions of sessions excluded or not eligible.
+        """
+        if not receivers:
+            return subscriptions
+
+        is_receiver = self.receiver_check(receivers)
+        return [
+            subscription
+            for subscription in subscriptions
+            if is_receiver(subscription[0])
+        ]
+
+    def is_receiver(self, session, receivers):
+        """
+        Check if session may receive an event published with receivers.
+        """
+        return not receivers or self.receiver_check(receivers)(session)
+
+    def receiver_check(self, receivers):
+        """
+        Returns a function checking if a session may receive an event published with receivers,
+        the lists are turned into sets once so every session costs a lookup.
+        """
+        exclude = set(receivers.get("exclude", ()))
+        exclude_authid = set(receivers.get("exclude_authid", ()))
+        eligible = receivers.get("eligible")
+        if eligible is not None:
+            eligible = set(eligible)
+        eligible_authid = receivers.get("eligible_authid")
+        if eligible_authid is not None:
+            eligible_authid = set(eligible_authid)
+
+        def is_receiver(session):
+            if session.session_id in exclude or (
+                eligible is not None and session.session_id not in eligible
+            ):
+                return False
+            if session.authid is not None and session.authid in exclude_authid:
+                return False
+            if eligible_authid is not None and session.authid not in eligible_authid:
+                return False
+            return True
+
+        return is_receiver
+
+    def filter_subscriptions(self, subscriptions, kwargs):
+        """
+        Removes the subscriptions with a filter not matching kwargs,
+        every distinct filter is only evaluated once.
+        """
+        filters = self.subscriptions.filters
+        if not filters:
+            return subscriptions
+
+        results = {}
+        matched = []
+        for subscription in subscriptions:
+            event_filter = filters.get(subscription[1])
+            if event_filter is not None:
+                if event_filter not in results:
+                    results[event_filter] = event_filter(kwargs)
+                if not results[event_filter]:
+                    continue
+            matched.append(subscription)
+
+        return matched
 
     ### Dealer functionality ###
     def register(self, session, options, procedure):
         """
         Registers a procedure.
+        With the option cache_ttl, results are cached for that many seconds.
+        With the option coalesce, identical calls share an invocation in flight.
+        With the option concurrency, at most that many invocations are in flight,
+        up to queue_size calls wait for them to finish.
         Returns a registration_id
         """
-        return self.registrations.register_uri(session, procedure, options.get("match"))
+        registration_id = self.registrations.register_uri(
+            session, procedure, options.get("match")
+        )
+
+        cache_ttl = options.get("cache_ttl")
+        if (
+            registration_id
+            and isinstance(cache_ttl, (int, float))
+            and not isinstance(cache_ttl, bool)
+            and cache_ttl > 0
+        ):
+            self.cache_ttls[registration_id] = cache_ttl
+
+        if registration_id and options.get("coalesce"):
+            self.coalescing.add(registration_id)
+
+        concurrency = options.get("concurrency")
+        if registration_id and isinstance(concurrency, int) and concurrency > 0:
+            queue_size = options.get("queue_size")
+            if not isinstance(queue_size, int) or queue_size < 0:
+                queue_size = self.call_queue_size
+            self.call_queues[registration_id] = CallQueue(concurrency, queue_size)
+
+        return registration_id
 
     def unregister(self, session, registration_id):
         """
         Unregisters a procedure.
         """
-        return self.registrations.unregister_uri(session, registration_id)
+        if not self.registrations.unregister_uri(session, registration_id):
+            return False
+
+        self.forget_registration(registration_id)
+        return True
+
+    def forget_registration(self, registration_id):
+        self.coalescing.discard(registration_id)
+        if self.cache_ttls.pop(registration_id, None) is not None:
+            self.result_cache.invalidate_registration(registration_id)
 
-    def call(self, session, request_id, procedure, args=None, kwargs=None):
+        call_queue = self.call_queues.pop(registration_id, None)
+        if call_queue is not None:
+            while call_queue.queue:
+                self._call_queued(*call_queue.queue.popleft())
+
+    def call(
+        self, session, request_id, procedure, args=None, kwargs=None, federate=True
+    ):
         """
         Call a procedure.
+        If federate is True, procedures registered on other routers are called too.
         """
+        if procedure in self.meta_procedures:
+            self.meta_procedures[procedure](session, request_id, args, kwargs)
+            return True
+
         match = self.registrations.match_uri(procedure)
+        if not match and federate and self.federation is not None:
+            match = self.federation.match_procedure(self.realm, procedure)
+
         if not match:
             return False
 
         procedure_session, procedure_registration_id = match
 
+        call_key = None
+        cache_ttl = self.cache_ttls.get(procedure_registration_id)
+        coalesce = procedure_registration_id in self.coalescing
+        if cache_ttl is not None or coalesce:
+            call_key = ResultCache.make_key(
+                procedure_registration_id, procedure, args, kwargs
+            )
+
+        if call_key is not None and cache_ttl is not None:
+            result = self.result_cache.get(call_key)
+            if result is not None:
+                session.send(OP.RESULT, request_id, {}, *result)
+                return True
+
+        if call_key is not None and coalesce and call_key in self.inflight:
+            _, waiting_calls = self.waiting_calls[self.inflight[call_key]]
+            waiting_calls.append((session, request_id))
+            self.calls.setdefault(session, set()).add(request_id)
+            self.call_ids[request_id] = session
+            return True
+
+        call_queue = self.call_queues.get(procedure_registration_id)
+        if call_queue is not None:
+            if call_queue.running >= call_queue.concurrency:
+                if len(call_queue.queue) >= call_queue.max_size:
+                    session.send(OP.ERROR, OP.CALL, request_id, {}, "wamp.error.busy")
+                else:
+                    call_queue.queue.append(
+                        (session, request_id, procedure, args, kwargs)
+                    )
+                    self.calls.setdefault(session, set()).add(request_id)
+                    self.call_ids[request_id] = session
+                return True
+
+            call_queue.running += 1
+
         invocation_args = []
         if args is not None:
             invocation_args.append(args)
@@ -98,7 +534,15 @@ class Realm:
             procedure_registration_id,
             {"procedure": procedure},
         ] + invocation_args
-        procedure_session.send(*cmd)
+
+        invocation = (procedure_session, invocation_request_id)
+        if call_queue is not None:
+            self.queued_invocations[invocation] = procedure_registration_id
+        if call_key is not None and cache_ttl is not None:
+            self.pending_results[invocation] = (call_key, cache_ttl)
+        if call_key is not None and coalesce:
+            self.inflight[call_key] = invocation
+            self.waiting_calls[invocation] = (call_key, [])
 
         self.calls.setdefault(session, set()).add(request_id)
         self.call_ids[request_id] = session
@@ -106,27 +550,46 @@ class Realm:
         self.invocation_to_call_id[invocation_request_id] = request_id
         self.invocations.setdefault(procedure_session, set()).add(invocation_request_id)
 
+        # Sent last, a callee can answer before send returns
+        procedure_session.send(*cmd)
         return True
 
-    def yield_(self, session, invocation_id, args=None, kwargs=None):
+    def call_future(self, procedure, args=None, kwargs=None, future=None):
         """
-        Get result from a procedure call.
+        Call a procedure from the router itself.
+        Returns a Future with a CallResult or a CallError.
         """
-        if invocation_id not in self.invocation_to_call_id:
-            return
+        if future is None:
+            future = Future()
 
-        call_id = self.invocation_to_call_id.pop(invocation_id)
-        call_session = self.call_ids.pop(call_id)
-        self.calls[call_session].discard(call_id)
+        request_id = generate_id()
+        self.embedded_caller.futures[request_id] = future
+        if not self.call(self.embedded_caller, request_id, procedure, args, kwargs):
+            del self.embedded_caller.futures[request_id]
+            future.set_exception(CallError("wamp.error.no_such_procedure"))
+
+        return future
 
+    def yield_(self, session, invocation_id, args=None, kwargs=None):
+        """
+        Get result from a procedure call.
+        """
         call_args = []
         if args is not None:
             call_args.append(args)
             if kwargs is not None:
                 call_args.append(kwargs)
 
-        cmd = [OP.RESULT, call_id, {}] + call_args
-        call_session.send(*cmd)
+        pending_result = self.pending_results.pop((session, invocation_id), None)
+        if pending_result is not None:
+            cache_key, cache_ttl = pending_result
+            self.result_cache.set(cache_key, call_args, cache_ttl)
+
+        for call_session, call_id in self._pop_callers(session, invocation_id):
+            cmd = [OP.RESULT, call_id, {}] + call_args
+            call_session.send(*cmd)
+
+        self._release_invocation(session, invocation_id)
 
     def error_invocation(
         self, session, invocation_id, details, error, args=None, kwargs=None
@@ -134,12 +597,7 @@ class Realm:
         """
         An invocation call failed.
         """
-        if invocation_id not in self.invocation_to_call_id:
-            return
-
-        call_id = self.invocation_to_call_id.pop(invocation_id)
-        call_session = self.call_ids.pop(call_id)
-        self.calls[call_session].discard(call_id)
+        self.pending_results.pop((session, invocation_id), None)
 
         call_args = []
         if args is not None:
@@ -147,59 +605,415 @@ class Realm:
             if kwargs is not None:
                 call_args.append(kwargs)
 
-        cmd = [OP.ERROR, OP.CALL, call_id, {}, error] + call_args
-        call_session.send(*cmd)
+        for call_session, call_id in self._pop_callers(session, invocation_id):
+            cmd = [OP.ERROR, OP.CALL, call_id, {}, error] + call_args
+            call_session.send(*cmd)
+
+        self._release_invocation(session, invocation_id)
+
+    def _release_invocation(self, session, invocation_id):
+        """
+        An invocation of a registration with limited concurrency finished,
+        the calls waiting for it are made.
+        """
+        registration_id = self.queued_invocations.pop((session, invocation_id), None)
+        call_queue = self.call_queues.get(registration_id)
+        if call_queue is None:
+            return
+
+        call_queue.running -= 1
+        while call_queue.queue and call_queue.running < call_queue.concurrency:
+            self._call_queued(*call_queue.queue.popleft())
+
+    def _call_queued(self, session, request_id, procedure, args, kwargs):
+        if self.call_ids.get(request_id) is not session:
+            return
+
+        del self.call_ids[request_id]
+        self.calls[session].discard(request_id)
+        if not self.call(session, request_id, procedure, args, kwargs):
+            session.send(
+                OP.ERROR, OP.CALL, request_id, {}, "wamp.error.no_such_procedure"
+            )
+
+    def _pop_callers(self, session, invocation_id):
+        """
+        Forget an invocation, returns the (session, request_id) of the callers
+        still waiting for it, including the ones coalesced into it.
+        """
+        callers = []
+        call_session, call_id = self._pop_invocation(session, invocation_id)
+        if call_session is not None:
+            callers.append((call_session, call_id))
+
+        if (session, invocation_id) in self.waiting_calls:
+            call_key, waiting_calls = self.waiting_calls.pop((session, invocation_id))
+            del self.inflight[call_key]
+            for call_session, call_id in waiting_calls:
+                if self.call_ids.get(call_id) is call_session:
+                    del self.call_ids[call_id]
+                    self.calls[call_session].discard(call_id)
+                    callers.append((call_session, call_id))
+
+        return callers
+
+    def _pop_invocation(self, session, invocation_id):
+        """
+        Forget an invocation, returns the session and request_id of the caller.
+        """
+        if invocation_id not in self.invocation_to_call_id:
+            return None, None
+
+        call_id = self.invocation_to_call_id.pop(invocation_id)
+        if session in self.invocations:
+            self.invocations[session].discard(invocation_id)
+
+        call_session = self.call_ids.pop(call_id, None)
+        if call_session is None:
+            return None, None
+
+        self.calls[call_session].discard(call_id)
+        return call_session, call_id
+
+    ### Meta procedures ###
+    def meta_get_events(self, session, request_id, args=None, kwargs=None):
+        """
+        wamp.subscription.get_events(subscription_id, limit=None)
+        """
+        args = list(args or [])
+        subscription_id = args[0] if args else None
+        limit = args[1] if len(args) > 1 else (kwargs or {}).get("limit")
+
+        if not all(
+            isinstance(value, int) and not isinstance(value, bool)
+            for value in [subscription_id] + ([] if limit is None else [limit])
+        ):
+            session.send(
+                OP.ERROR,
+                OP.CALL,
+                request_id,
+                {},
+                "wamp.error.invalid_argument",
+                ["subscription_id and limit must be integers"],
+            )
+            return
+
+        events = self.get_events(session, subscription_id, limit)
+        if events is None:
+            session.send(
+                OP.ERROR, OP.CALL, request_id, {}, "wamp.error.no_such_subscription"
+            )
+            return
+
+        session.send(
+            OP.RESULT,
+            request_id,
+            {},
+            [
+                [
+                    {
+                        "subscription": subscription_id,
+                        "publication": publication_id,
+                        "topic": topic,
+                        "args": args,
+                        "kwargs": kwargs,
+                    }
+                    for publication_id, topic, args, kwargs in events
+                ]
+            ],
+        )
+
+    def meta_invalidate_cache(self, session, request_id, args=None, kwargs=None):
+        """
+        wamp.registration.invalidate_cache(procedure=None)
+        """
+        args = list(args or [])
+        procedure = args[0] if args else (kwargs or {}).get("procedure")
+        session.send(
+            OP.RESULT, request_id, {}, [self.result_cache.invalidate(procedure)]
+        )
+
+    def meta_cache_stats(self, session, request_id, args=None, kwargs=None):
+        """
+        wamp.registration.cache_stats()
+        """
+        session.send(OP.RESULT, request_id, {}, [], self.result_cache.stats())
 
     ### External management ###
+    def set_federation(self, federation):
+        """
+        Connect this realm to other routers, changes to
+        subscriptions and registrations are sent to the federation.
+        """
+        self.federation = federation
+        if federation is None:
+            self.subscriptions.interest_callback = None
+            self.registrations.interest_callback = None
+        else:
+            self.subscriptions.interest_callback = partial(
+                federation.interest_changed, self.realm, "subscription"
+            )
+            self.registrations.interest_callback = partial(
+                federation.interest_changed, self.realm, "registration"
+            )
+
     def session_joined(self, session):
         self.sessions.add(session)
+        if self.manager is not None and self.manager.idle_reaper is not None:
+            self.manager.idle_reaper.track(session)
 
     def session_lost(self, session):
-        self.sessions.discard(session)
+        """
+        With a router loop, the sessions lost while it works through its inbox
+        are removed together afterwards.
+        """
+        if self.manager is None or self.manager.router_loop is None:
+            self.sessions_lost([session])
+            return
 
-        self.subscriptions.unregister_session(session)
-        self.registrations.unregister_session(session)
+        if not self.lost_sessions:
+            self.manager.router_loop.submit(self._remove_lost_sessions)
+        self.lost_sessions.add(session)
 
-        if session in self.invocations:
-            for invocation_id in self.invocations[session]:
-                request_id = self.invocation_to_call_id[invocation_id]
-                if request_id in self.call_ids:
-                    self.error_invocation(
-                        session, request_id, {}, "wamp.error.callee_lost"
-                    )
+    def _remove_lost_sessions(self):
+        sessions, self.lost_sessions = self.lost_sessions, set()
+        self.sessions_lost(sessions)
+
+    def sessions_lost(self, sessions):
+        """
+        Remove sessions from the realm, a mass disconnect is handled in one pass.
+        """
+        sessions = set(sessions)
+        self.sessions -= sessions
 
-            del self.invocations[session]
+        idle_reaper = self.manager.idle_reaper if self.manager is not None else None
+        for session in sessions:
+            if idle_reaper is not None:
+                idle_reaper.untrack(session)
+            if self.rate_limiter is not None:
+                self.rate_limiter.forget(session)
 
-        if session in self.calls:
-            for request_id in self.calls[session]:
-                del self.call_ids[request_id]
+            for request_id in self.calls.pop(session, ()):
+                if self.call_ids.get(request_id) is session:
+                    del self.call_ids[request_id]
 
-            del self.calls[session]
+        self.subscriptions.unregister_sessions(sessions)
+        registration_ids = [
+            registration_id
+            for session in sessions
+            for registration_id in self.registrations.sessions.get(session, {})
+        ]
+        self.registrations.unregister_sessions(sessions)
+        for registration_id in registration_ids:
+            self.forget_registration(registration_id)
 
-        if not self.sessions:
-            realm_manager.discard_realm(self.realm)
+        invocations = [
+            (session, invocation_id)
+            for session in sessions
+            for invocation_id in self.invocations.pop(session, ())
+        ]
+        for session, invocation_id in invocations:
+            self.error_invocation(session, invocation_id, {}, "wamp.error.callee_lost")
+
+        if not self.sessions and self.manager is not None:
+            self.manager.realm_idle(self.realm)
 
 
 class RealmManager:
+    realm_grace_period = 0
+    max_idle_realms = 100
+
     def __init__(self):
         self.realms = {}
+        self.idle_realms = OrderedDict()
         self.callbacks = []
+        self.federation = None
+        self.router_loop = None
+        self.idle_reaper = None
+        self.authorization_cache = None
+        self.event_history = {}
+        self.journals = {}
+        self.rate_limits = {}
 
     def get_realm(self, realm):
+        self.idle_realms.pop(realm, None)
+        self.expire_idle_realms()
         if realm not in self.realms:
             self._trigger_callback("create", realm)
-            self.realms[realm] = Realm(realm)
+            self.realms[realm] = Realm(realm, manager=self)
 
         return self.realms[realm]
 
     def get_realms(self):
         return self.realms.values()
 
+    ### Embedded API ###
+    def publish(self, realm, topic, args=None, kwargs=None):
+        """
+        Publish to a topic without a session, safe to call from any thread.
+        """
+        self.publish_many(realm, [(topic, args, kwargs)])
+
+    def publish_many(self, realm, publications):
+        """
+        Publish a list of (topic, args, kwargs) in one pass.
+        """
+        self.submit(self._publish_many, realm, list(publications))
+
+    def call(self, realm, procedure, args=None, kwargs=None):
+        """
+        Call a procedure without a session, safe to call from any thread.
+        Returns a concurrent.futures.Future with a CallResult or a CallError.
+        """
+        future = Future()
+        self.submit(self._call, future, realm, procedure, args, kwargs)
+        return future
+
+    def _publish_many(self, realm_name, publications):
+        realm = self.realms.get(realm_name)
+        if realm is not None:
+            realm.publish_many(publications)
+        elif self.federation is not None:
+            for topic, args, kwargs in publications:
+                self.federation.publish(realm_name, generate_id(), topic, args, kwargs)
+
+    def _call(self, future, realm_name, procedure, args, kwargs):
+        realm = self.realms.get(realm_name)
+        if (
+            realm is None
+            and self.federation is not None
+            and self.federation.match_procedure(realm_name, procedure)
+        ):
+            # The result comes back through the realm, it is idle again afterwards
+            realm = self.get_realm(realm_name)
+            future.add_done_callback(
+                lambda future: self.submit(self._embedded_call_done, realm_name)
+            )
+
+        if realm is None:
+            future.set_exception(CallError("wamp.error.no_such_procedure"))
+        else:
+            realm.call_future(procedure, args, kwargs, future=future)
+
+    def _embedded_call_done(self, realm_name):
+        realm = self.realms.get(realm_name)
+        if (
+            realm is not None
+            and not realm.sessions
+            and not realm.embedded_caller.futures
+            and realm_name not in self.idle_realms
+        ):
+            self.realm_idle(realm_name)
+
+    def realm_idle(self, realm):
+        """
+        The last session left realm, it is kept for realm_grace_period seconds
+        so a client reconnecting gets the same realm back.
+        """
+        if self.realm_grace_period <= 0:
+            self.discard_realm(realm)
+            return
+
+        self.idle_realms[realm] = time.monotonic() + self.realm_grace_period
+        self.idle_realms.move_to_end(realm)
+        self.expire_idle_realms()
+
+    def expire_idle_realms(self):
+        """
+        Discard the idle realms past their grace period and the oldest
+        idle realms beyond max_idle_realms.
+        """
+        now = time.monotonic()
+        while self.idle_realms:
+            realm, expires = next(iter(self.idle_realms.items()))
+            if expires > now and len(self.idle_realms) <= self.max_idle_realms:
+                break
+            self.discard_realm(realm)
+
+    def set_realm_grace_period(self, grace_period, max_idle_realms=100):
+        """
+        Keep realms without sessions for grace_period seconds, at most max_idle_realms of them.
+        """
+        self.realm_grace_period = grace_period
+        self.max_idle_realms = max_idle_realms
+        if grace_period <= 0:
+            for realm in list(self.idle_realms):
+                self.discard_realm(realm)
+        self.expire_idle_realms()
+
     def discard_realm(self, realm):
+        self.idle_realms.pop(realm, None)
         if realm in self.realms:
             self._trigger_callback("discard", realm)
             del self.realms[realm]
 
+    def submit(self, f, *args):
+        """
+        Run f in the router loop if there is one, otherwise right away.
+        """
+        if self.router_loop is None:
+            f(*args)
+        else:
+            self.router_loop.submit(f, *args)
+
+    def set_event_history(self, realm, topics, max_events=1000):
+        """
+        Keep the last events published in realm to topics, a list of (uri, match, limit).
+        At most max_events are kept in the realm.
+        """
+        self.event_history[realm] = {"topics": list(topics), "max_events": max_events}
+        if realm in self.realms:
+            self.realms[realm].event_history = EventHistory(**self.event_history[realm])
+
+    def set_rate_limits(self, realm, session_limits=None, realm_limits=None):
+        """
+        Limit the publish, call and subscribe messages in realm, limits are
+        dicts of message class to (messages per second, burst).
+        """
+        self.rate_limits[realm] = {
+            "session_limits": session_limits,
+            "realm_limits": realm_limits,
+        }
+        if realm in self.realms:
+            self.realms[realm].rate_limiter = RateLimiter(**self.rate_limits[realm])
+
+    def set_journal(self, realm, journal):
+        """
+        Write the events published in realm to the durable topics of journal.
+        """
+        # Replays are read by the journal thread and must be sent where the router runs
+        if journal is not None and journal.is_running() and self.router_loop is None:
+            raise RuntimeError(
+                "A started Journal needs a router loop owning the realms"
+            )
+
+        if journal is None:
+            self.journals.pop(realm, None)
+        else:
+            self.journals[realm] = journal
+
+        if realm in self.realms:
+            self.realms[realm].journal = journal
+
+    def set_authorization_cache(self, authorization_cache):
+        """
+        Cache the decisions of guard and realm_authenticator in authorization_cache, None to stop caching.
+        """
+        self.authorization_cache = authorization_cache
+
+    def invalidate_authorization(self, scope=None, uri=None):
+        """
+        Forget cached authorization decisions, e.g. after permissions changed.
+        Safe to call from any thread, see AuthorizationCache.invalidate.
+        """
+        if self.authorization_cache is not None:
+            self.submit(self.authorization_cache.invalidate, scope, uri)
+
+    def set_federation(self, federation):
+        self.federation = federation
+        for realm in self.realms.values():
+            realm.set_federation(federation)
+
     def _trigger_callback(self, callback_type, realm):
         for callback in self.callbacks:
             callback(callback_type=callback_type, realm=realm)
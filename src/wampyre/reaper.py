@@ -0,0 +1,147 @@
+import logging
+import math
+import threading
+import time
+
+from .realm import realm_manager
+from .session import STATE_CLOSED
+
+logger = logging.getLogger(__name__)
+
+
+class TimingWheel:
+    """
+    Hashed timing wheel, timers are kept in the slot they expire in
+    so scheduling and cancelling do not depend on the number of timers.
+    """
+
+    def __init__(self, tick=1.0, slots=64):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]
+        self.position = 0
+        self.timers = {}
+
+    def __len__(self):
+        return len(self.timers)
+
+    def schedule(self, key, delay, callback):
+        """
+        Call callback(key) after delay seconds, replaces the timer of key.
+        """
+        self.cancel(key)
+
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self.position + ticks) % len(self.slots)
+        rounds = (ticks - 1) // len(self.slots)
+        self.slots[slot][key] = [rounds, callback]
+        self.timers[key] = slot
+
+    def cancel(self, key):
+        slot = self.timers.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+
+    def advance(self):
+        """
+        Move one tick ahead and call the timers that expire.
+        """
+        self.position = (self.position + 1) % len(self.slots)
+        slot = self.slots[self.position]
+
+        expired = []
+        for key, timer in slot.items():
+            if timer[0]:
+                timer[0] -= 1
+            else:
+                expired.append((key, timer[1]))
+
+        for key, callback in expired:
+            del slot[key]
+            del self.timers[key]
+
+        for key, callback in expired:
+            try:
+                callback(key)
+            except Exception:
+                logger.exception(f"Timer for {key!r} failed")
+
+
+class IdleReaper:
+    """
+    Closes sessions that have not sent anything for idle_timeout seconds.
+
+    Sessions idle for heartbeat_interval seconds are sent a heartbeat, e.g. a RawSocket ping,
+    so live clients answer before they are closed. All sessions share one timing wheel.
+    The checks are submitted to the router loop, which must be set up before start.
+    """
+
+    def __init__(
+        self,
+        realm_manager=realm_manager,
+        idle_timeout=60,
+        heartbeat_interval=20,
+        tick=1.0,
+    ):
+        self.realm_manager = realm_manager
+        self.idle_timeout = idle_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.wheel = TimingWheel(tick)
+
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Ticks close sessions and discard realms, they must run where the router runs
+        if self.realm_manager.router_loop is None:
+            raise RuntimeError("IdleReaper needs a router loop owning the realms")
+
+        self.realm_manager.idle_reaper = self
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="wampyre-reaper", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self.realm_manager.idle_reaper = None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def run(self):
+        while not self._stop.wait(self.wheel.tick):
+            self.realm_manager.submit(self.tick)
+
+    def tick(self):
+        with self._lock:
+            self.wheel.advance()
+        self.realm_manager.expire_idle_realms()
+
+    def track(self, session):
+        with self._lock:
+            self.wheel.schedule(session, self._next_check(0), self.check)
+
+    def untrack(self, session):
+        with self._lock:
+            self.wheel.cancel(session)
+
+    def check(self, session):
+        if session.state == STATE_CLOSED:
+            return
+
+        idle = time.monotonic() - session.last_activity
+        if idle >= self.idle_timeout:
+            logger.info(f"Closing session idle for {idle:.0f} seconds")
+            session.close_session()
+            return
+
+        if idle >= self.heartbeat_interval:
+            session.transport.send_heartbeat()
+
+        self.wheel.schedule(session, self._next_check(idle), self.check)
+
+    def _next_check(self, idle):
+        if idle < self.heartbeat_interval:
+            return self.heartbeat_interval - idle
+        return min(self.heartbeat_interval, self.idle_timeout - idle)
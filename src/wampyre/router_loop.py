@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from queue import Empty, SimpleQueue
+
+from .realm import realm_manager
+
+logger = logging.getLogger(__name__)
+
+
+class RouterLoop(ABC):
+    """
+    Owns the realms of a RealmManager, all router work is done by the owner.
+    Other threads hand over work with submit, the work is done in batches.
+    """
+
+    batch_size = 256
+
+    @abstractmethod
+    def submit(self, f, *args):
+        """Hand over work to the owner, safe to call from any thread"""
+
+    def run_batch(self, batch):
+        for f, args in batch:
+            try:
+                f(*args)
+            except Exception:
+                logger.exception(f"Failed to run {f!r} in router loop")
+
+
+class ThreadRouterLoop(RouterLoop):
+    """
+    Runs the router in its own thread.
+    """
+
+    def __init__(self, name="wampyre-router"):
+        self.name = name
+        self.inbox = SimpleQueue()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.inbox.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def submit(self, f, *args):
+        self.inbox.put((f, args))
+
+    def run(self):
+        while True:
+            batch = [self.inbox.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.inbox.get_nowait())
+            except Empty:
+                pass
+
+            if None in batch:
+                self.run_batch(batch[: batch.index(None)])
+                self._run_remaining(batch[batch.index(None) + 1 :])
+                return
+
+            self.run_batch(batch)
+
+    def _run_remaining(self, batch):
+        """
+        Run the work submitted before stopping or by the last batch.
+        """
+        while True:
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.inbox.get_nowait())
+            except Empty:
+                pass
+
+            if not batch:
+                return
+            self.run_batch([work for work in batch if work is not None])
+            batch = []
+
+
+class AsyncioRouterLoop(RouterLoop):
+    """
+    Runs the router in an asyncio event loop, e.g. the one of the ASGI server.
+    The loop is woken up once per batch.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.inbox = deque()
+        self._scheduled = False
+
+    def submit(self, f, *args):
+        self.inbox.append((f, args))
+        if not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        self._scheduled = False
+
+        batch = []
+        while self.inbox and len(batch) < self.batch_size:
+            batch.append(self.inbox.popleft())
+        self.run_batch(batch)
+
+        if self.inbox and not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon(self._drain)
+
+
+class RouterLoopMiddleware:
+    """
+    ASGI middleware that lets the server event loop own the router.
+    """
+
+    def __init__(self, inner, realm_manager=realm_manager):
+        self.inner = inner
+        self.realm_manager = realm_manager
+
+    async def __call__(self, scope, receive, send):
+        if self.realm_manager.router_loop is None:
+            self.realm_manager.router_loop = AsyncioRouterLoop(
+                asyncio.get_running_loop()
+            )
+
+        return await self.inner(scope, receive, send)
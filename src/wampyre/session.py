@@ -1,9 +1,14 @@
+import asyncio
+import inspect
 import logging
+import time
+from collections import deque
 
+from .filter import InvalidFilterException
 from .opcodes import OP
 from .pattern import Pattern
-from .realm import realm_manager
-from .utils import generate_id
+from .ratelimit import RATE_LIMITED_OPCODES
+from .utils import generate_id, payload_too_deep
 
 STATE_UNAUTHENTICATED = 0
 STATE_AUTHENTICATING = 1
@@ -12,21 +17,63 @@ STATE_CLOSED = 3
 
 logger = logging.getLogger(__name__)
 
+# Messages answered with an ERROR carrying their opcode and request id
+REQUEST_OPCODES = {
+    OP.PUBLISH,
+    OP.PUBLISH_BATCH,
+    OP.SUBSCRIBE,
+    OP.UNSUBSCRIBE,
+    OP.CALL,
+    OP.REGISTER,
+    OP.UNREGISTER,
+}
+
 
 class AccessDeniedException(Exception):
     """Transport is not allowed to access a given method"""
 
 
+class PendingAuthorization(Exception):
+    """The transport answers asynchronously, the command waits for the decision"""
+
+    def __init__(self, method, uri, result):
+        super().__init__(method, uri)
+        self.method = method
+        self.uri = uri
+        self.result = result
+
+
+async def await_result(awaitable):
+    return await awaitable
+
+
+def is_pending(result):
+    """Returns True if result is an awaitable or a Twisted Deferred"""
+    return inspect.isawaitable(result) or hasattr(result, "addCallbacks")
+
+
 class Session:
     state = STATE_UNAUTHENTICATED
 
     supported_roles = None
     agent = None
     realm = None
+    event_batch = False
+    session_id = None
+    authid = None
+
+    batch_publication_pattern = Pattern("uri", "list?", "dict?")
+    procedure_call_pattern = Pattern("id", "dict", "uri", "list?", "dict?")
+    meta_call_pattern = Pattern("id", "dict", "uri!", "list?", "dict?")
 
     def __init__(self, transport):
         self.last_id = 0
         self.transport = transport
+        self.last_activity = time.monotonic()
+
+        # Commands received while waiting for an asynchronous authorization
+        self.paused_commands = None
+        self.decisions = {}
 
         self.command_registry = {
             OP.HELLO: (
@@ -50,6 +97,11 @@ class Session:
                 Pattern("id", "dict", "uri", "list?", "dict?"),
                 STATE_AUTHENTICATED,
             ),
+            OP.PUBLISH_BATCH: (
+                self.handle_publish_batch,
+                Pattern("id", "dict", "list"),
+                STATE_AUTHENTICATED,
+            ),
             OP.SUBSCRIBE: (
                 self.handle_subscribe,
                 Pattern("id", "dict", "uriw", "list?", "dict?"),
@@ -62,7 +114,7 @@ class Session:
             ),
             OP.CALL: (
                 self.handle_call,
-                Pattern("id", "dict", "uri", "list?", "dict?"),
+                self.call_pattern,
                 STATE_AUTHENTICATED,
             ),
             OP.REGISTER: (
@@ -84,6 +136,19 @@ class Session:
 
     def handle_command(self, opcode, *args):
         logger.debug("Handling opcode:%s with args:%r" % (opcode, args))
+        if self.paused_commands is not None:
+            if len(self.paused_commands) >= self.transport.max_paused_commands:
+                self.send(
+                    OP.ABORT,
+                    {"message": "Too many messages waiting for authorization"},
+                    "wamp.error.protocol_violation",
+                )
+                self.close_session()
+                return
+
+            self.paused_commands.append((opcode, args))
+            return
+
         if opcode not in self.command_registry:
             self.send(
                 OP.ABORT, {"message": "Invalid opcode"}, "wamp.error.protocol_violation"
@@ -91,6 +156,22 @@ class Session:
             self.close_session()
             return
 
+        if (
+            opcode in RATE_LIMITED_OPCODES
+            and self.realm is not None
+            and self.realm.rate_limiter is not None
+        ):
+            tokens = 1
+            if (
+                opcode == OP.PUBLISH_BATCH
+                and len(args) > 2
+                and isinstance(args[2], list)
+            ):
+                tokens = max(1, len(args[2]))
+            if not self.realm.rate_limiter.allow(self, opcode, tokens):
+                self.throttle(opcode, args)
+                return
+
         func, pattern, allowed_state = self.command_registry[opcode]
         if self.state != allowed_state:
             self.send(
@@ -110,8 +191,18 @@ class Session:
             self.close_session()
             return
 
+        if payload_too_deep(args, self.transport.max_payload_depth):
+            self.payload_size_exceeded(opcode, args[0] if args else None)
+            return
+
+        self.execute_command(opcode, args)
+
+    def execute_command(self, opcode, args):
+        func = self.command_registry[opcode][0]
         try:
             func(*args)
+        except PendingAuthorization as e:
+            self.wait_for_authorization(opcode, args, e)
         except AccessDeniedException:
             logger.warning("Client tried to access method it was not allowed to.")
             self.send(OP.ERROR, opcode, args[0], {}, "wamp.error.not_authorized")
@@ -126,8 +217,103 @@ class Session:
             self.close_session()
             return
 
+    def wait_for_authorization(self, opcode, args, pending):
+        """
+        Pause the commands of this session until the transport decided,
+        other sessions are served meanwhile.
+        """
+        self.paused_commands = deque()
+        submit = self.transport.realm_manager.submit
+
+        def resolved(allowed=None, error=None):
+            submit(
+                self.authorization_resolved,
+                opcode,
+                args,
+                pending.method,
+                pending.uri,
+                allowed,
+                error,
+            )
+
+        if hasattr(pending.result, "addCallbacks"):
+            pending.result.addCallbacks(
+                resolved, lambda failure: resolved(error=failure.value)
+            )
+            return
+
+        def done(future):
+            if future.cancelled():
+                resolved(error=asyncio.CancelledError())
+            elif future.exception() is not None:
+                resolved(error=future.exception())
+            else:
+                resolved(future.result())
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Not in an event loop, e.g. a sync consumer thread, the awaitable
+            # runs in the loop owning the router if there is one
+            loop = getattr(self.transport.realm_manager.router_loop, "loop", None)
+            if loop is None:
+                if inspect.iscoroutine(pending.result):
+                    pending.result.close()
+                resolved(
+                    error=RuntimeError(
+                        "Asynchronous authorization needs an asyncio router loop"
+                    )
+                )
+                return
+
+            future = asyncio.run_coroutine_threadsafe(
+                await_result(pending.result), loop
+            )
+        else:
+            future = asyncio.ensure_future(pending.result)
+        future.add_done_callback(done)
+
+    def authorization_resolved(self, opcode, args, method, uri, allowed, error):
+        if self.state == STATE_CLOSED:
+            return
+
+        paused, self.paused_commands = self.paused_commands, None
+        if error is not None:
+            self.decisions.clear()
+            logger.error(
+                "Failed to authorize %s %r" % (method, uri),
+                exc_info=(type(error), error, error.__traceback__),
+            )
+            self.send(
+                OP.ABORT,
+                {"message": "Failed to execute command"},
+                "wamp.error.protocol_violation",
+            )
+            self.close_session()
+            return
+
+        allowed = bool(allowed)
+        authorization_cache = self.transport.realm_manager.authorization_cache
+        if authorization_cache is not None:
+            authorization_cache.set(self, method, uri, allowed)
+
+        # The decisions are kept until the command is done, a command asking
+        # about more than one uri is run again once per pending decision
+        self.decisions[(method, uri)] = allowed
+        self.execute_command(opcode, args)
+        if self.paused_commands is None:
+            self.decisions.clear()
+
+        while paused and self.paused_commands is None:
+            opcode, args = paused.popleft()
+            self.handle_command(opcode, *args)
+
+        if paused and self.paused_commands is not None:
+            self.paused_commands.extend(paused)
+
     def handle_hello(self, realm, details):
-        if not self.transport.realm_allowed(realm):
+        self.authid = self.transport.get_authid(details)
+        if not self.is_allowed("join", realm, self.transport.realm_allowed, realm):
             self.send(
                 OP.ABORT,
                 {"message": "You do not have access to this realm."},
@@ -139,7 +325,12 @@ class Session:
         self.supported_roles = details.get("roles")
         self.agent = details.get("agent")
 
-        self.realm = realm_manager.get_realm(realm)
+        subscriber_features = (
+            (self.supported_roles or {}).get("subscriber", {}).get("features", {})
+        )
+        self.event_batch = bool(subscriber_features.get("event_batch"))
+
+        self.realm = self.transport.realm_manager.get_realm(realm)
         if not self.realm:
             self.send(
                 OP.ABORT,
@@ -149,20 +340,61 @@ class Session:
             self.close_session()
             return
 
+        self.session_id = generate_id()
         self.realm.session_joined(self)
 
         self.state = STATE_AUTHENTICATED
         self.send(
             OP.WELCOME,
-            generate_id(),
+            self.session_id,
             {
                 "roles": {
-                    "broker": {"features": {"pattern_based_subscription": True}},
+                    "broker": {
+                        "features": {
+                            "pattern_based_subscription": True,
+                            "publish_batch": True,
+                            "subscription_filter": True,
+                            "publisher_exclusion": True,
+                            "subscriber_blackwhite_listing": True,
+                            "event_history": True,
+                            "event_retention": True,
+                            "event_replay": True,
+                        }
+                    },
                     "dealer": {"features": {"pattern_based_registration": True}},
                 }
             },
         )
 
+    def payload_size_exceeded(self, opcode, request_id):
+        """
+        A message was too large or too deep, reply with an error when it is a request.
+        """
+        if opcode in REQUEST_OPCODES and isinstance(request_id, int):
+            self.send(
+                OP.ERROR, opcode, request_id, {}, "wamp.error.payload_size_exceeded"
+            )
+        else:
+            self.send(
+                OP.ABORT,
+                {"message": "Message is too large"},
+                "wamp.error.payload_size_exceeded",
+            )
+            self.close_session()
+
+    def throttle(self, opcode, args):
+        """
+        Reply to a message over the rate limit without validating it,
+        publications are dropped unless they are acknowledged.
+        """
+        if opcode in (OP.PUBLISH, OP.PUBLISH_BATCH) and not (
+            len(args) > 1 and isinstance(args[1], dict) and args[1].get("acknowledge")
+        ):
+            return
+
+        if args and isinstance(args[0], int):
+            self.send(OP.ERROR, opcode, args[0], {}, "wamp.error.throttled")
+
     def handle_abort(self, details, reason):
         logger.info(
             "Client aborted our session with reason:%s and details:%r"
@@ -184,15 +416,80 @@ class Session:
     def handle_publish(self, request_id, options, topic, args=None, kwargs=None):
         self.method_uri_allowed("publish", topic)
 
-        publish_id = self.realm.publish(options, topic, args, kwargs)
+        publish_id = self.realm.publish(options, topic, args, kwargs, session=self)
         if publish_id:
             self.send(OP.PUBLISHED, request_id, publish_id)
 
+    def handle_publish_batch(self, request_id, options, publications):
+        for publication in publications:
+            if not isinstance(
+                publication, (list, tuple)
+            ) or not self.batch_publication_pattern(*publication):
+                self.send(
+                    OP.ABORT,
+                    {"message": "Batch publication syntax is not allowed"},
+                    "wamp.error.protocol_violation",
+                )
+                self.close_session()
+                return
+
+        if not publications:
+            if options.get("acknowledge"):
+                self.send(
+                    OP.ERROR,
+                    OP.PUBLISH_BATCH,
+                    request_id,
+                    {},
+                    "wamp.error.invalid_argument",
+                    ["A batch needs at least one publication"],
+                )
+            return
+
+        for topic in {publication[0] for publication in publications}:
+            self.method_uri_allowed("publish", topic)
+
+        publication_ids = self.realm.publish_many(
+            ((list(publication) + [None, None])[:3] for publication in publications),
+            self.realm.receiver_options(options, session=self),
+        )
+        if options.get("acknowledge"):
+            self.send(OP.PUBLISHED, request_id, publication_ids[0])
+
     def handle_subscribe(self, request_id, options, topic):
         self.method_uri_allowed("subscribe", topic)
 
-        subscription_id = self.realm.subscribe(self, options, topic)
+        replay_after = options.get("replay_after")
+        if replay_after is not None and (
+            not isinstance(replay_after, int) or isinstance(replay_after, bool)
+        ):
+            self.send(
+                OP.ERROR,
+                OP.SUBSCRIBE,
+                request_id,
+                {},
+                "wamp.error.invalid_argument",
+                ["replay_after must be a publication id"],
+            )
+            return
+
+        try:
+            subscription_id = self.realm.subscribe(self, options, topic)
+        except InvalidFilterException as e:
+            self.send(
+                OP.ERROR,
+                OP.SUBSCRIBE,
+                request_id,
+                {},
+                "wamp.error.invalid_argument",
+                [str(e)],
+            )
+            return
+
         self.send(OP.SUBSCRIBED, request_id, subscription_id)
+        if options.get("get_retained"):
+            self.realm.send_retained(self, subscription_id)
+        if replay_after is not None:
+            self.realm.send_replay(self, subscription_id, replay_after)
 
     def handle_unsubscribe(self, request_id, subscription_id):
         if self.realm.unsubscribe(self, subscription_id):
@@ -207,6 +504,19 @@ class Session:
             )
 
     ### Dealer functionality ###
+    def call_pattern(self, *args):
+        """
+        Only the meta procedures of the realm can be called in the wamp namespace.
+        """
+        if (
+            len(args) > 2
+            and isinstance(args[2], str)
+            and self.realm is not None
+            and args[2] in self.realm.meta_procedures
+        ):
+            return self.meta_call_pattern(*args)
+        return self.procedure_call_pattern(*args)
+
     def handle_call(self, request_id, options, procedure, args=None, kwargs=None):
         self.method_uri_allowed("call", procedure)
 
@@ -246,7 +556,11 @@ class Session:
     ### General functionality ###
     def close_session(self):
         self.state = STATE_CLOSED
+        self.paused_commands = None
         self.transport.close_session()
+        authorization_cache = self.transport.realm_manager.authorization_cache
+        if authorization_cache is not None:
+            authorization_cache.forget(self)
         if self.realm:
             self.realm.session_lost(self)
 
@@ -259,5 +573,30 @@ class Session:
         return self.last_id
 
     def method_uri_allowed(self, method, uri):
-        if not self.transport.method_uri_allowed(method, uri):
+        if not self.is_allowed(
+            method, uri, self.transport.method_uri_allowed, method, uri
+        ):
             raise AccessDeniedException()
+
+    def is_allowed(self, method, uri, check, *args):
+        """
+        Ask the transport with check(*args), through the authorization cache if there is one.
+        Raises PendingAuthorization if the transport answers asynchronously.
+        """
+        if (method, uri) in self.decisions:
+            return self.decisions[(method, uri)]
+
+        authorization_cache = self.transport.realm_manager.authorization_cache
+        if authorization_cache is not None:
+            allowed = authorization_cache.get(self, method, uri)
+            if allowed is not None:
+                return allowed
+
+        allowed = check(*args)
+        if is_pending(allowed):
+            raise PendingAuthorization(method, uri, allowed)
+
+        allowed = bool(allowed)
+        if authorization_cache is not None:
+            authorization_cache.set(self, method, uri, allowed)
+        return allowed
@@ -0,0 +1,66 @@
+from ..authorization import AuthorizationCache
+from ..opcodes import OP
+from ..realm import realm_manager
+from .test_session import transport_base
+
+
+def test_authorization_cache(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("wampyre.authorization.time.monotonic", lambda: now[0])
+
+    cache = AuthorizationCache(ttl=10, max_size=2)
+    assert cache.get("s1", "call", "a.procedure") is None
+    cache.set("s1", "call", "a.procedure", True)
+    cache.set("s1", "call", "b.procedure", False)
+    assert cache.get("s1", "call", "a.procedure") is True
+    assert cache.get("s1", "call", "b.procedure") is False
+
+    cache.set("s2", "call", "a.procedure", True)
+    assert cache.get("s1", "call", "a.procedure") is None
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "size": 2}
+
+    now[0] += 11
+    assert cache.get("s1", "call", "b.procedure") is None
+    cache.set("s1", "call", "b.procedure", True)
+    assert cache.invalidate("s1", uri="a.procedure") == 0
+    assert cache.invalidate("s1") == 1
+    assert list(cache.scopes) == ["s2"]
+    assert cache.invalidate() == 1
+    assert not cache.entries
+    assert not cache.scopes
+
+
+def test_authorization_cache_session():
+    cache = AuthorizationCache(per_user=True)
+    realm_manager.set_authorization_cache(cache)
+    try:
+        transport = transport_base()
+        transport2 = transport_base()
+        transport2.get_user_key = lambda: ("user", 1)
+        checks = []
+
+        def allowed(method, uri):
+            checks.append((method, uri))
+            return uri != "b.topic"
+
+        for t in (transport, transport2):
+            t._method_uri_allowed = allowed
+            t.connect("a.realm")
+            for topic in ["a.topic", "b.topic", "a.topic"]:
+                t.receive(OP.PUBLISH, t.generate_id(), {"acknowledge": True}, topic)
+        assert checks == [("publish", "a.topic"), ("publish", "b.topic")] * 2
+        assert transport.get_reply()[0] == OP.PUBLISHED
+        assert transport.get_reply()[1][3] == "wamp.error.not_authorized"
+        assert set(cache.scopes) == {transport.session, ("user", 1)}
+
+        realm_manager.invalidate_authorization(("user", 1), "b.topic")
+        transport2.receive(OP.PUBLISH, transport2.generate_id(), {}, "b.topic")
+        assert checks[-1] == ("publish", "b.topic")
+        assert len(checks) == 5
+
+        transport.disconnect()
+        transport2.disconnect()
+        assert set(cache.scopes) == {("user", 1)}
+    finally:
+        realm_manager.set_authorization_cache(None)
+        realm_manager.realms = {}
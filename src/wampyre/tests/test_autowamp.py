@@ -0,0 +1,140 @@
+import pytest
+
+pytest.importorskip("autobahn")
+pytest.importorskip("twisted")
+
+import threading
+
+from autobahn.twisted.wamp import ApplicationSession
+from twisted.python import threadable
+
+from ..opcodes import OP
+from ..realm import realm_manager
+from ..transports import autowamp
+from ..transports.autowamp import ApplicationRunner
+from ..transports.autowamp_common import (
+    AutobahnTransport,
+    LocalDelivery,
+    local_delivery,
+)
+
+
+@pytest.fixture
+def runner():
+    # Stands in for the reactor thread
+    io_thread = threadable.ioThread
+    threadable.registerAsIOThread()
+    yield ApplicationRunner("a.realm")
+    threadable.ioThread = io_thread
+    realm_manager.realms = {}
+
+
+def test_direct_call(runner):
+    results = []
+
+    class Callee(ApplicationSession):
+        def onJoin(self, details):
+            return self.register(lambda a: a * 2, "a.procedure")
+
+    class Caller(ApplicationSession):
+        def onJoin(self, details):
+            self.call("a.procedure", 21).addCallback(results.append)
+
+    stop_callee = runner.run(Callee)
+    stop_caller = runner.run(Caller)
+    assert results == [42]
+
+    stop_caller()
+    stop_callee()
+    assert "a.realm" not in realm_manager.realms
+
+
+def test_direct_publish_from_handler(runner):
+    events = []
+
+    class Component(ApplicationSession):
+        def onJoin(self, details):
+            def on_event(i):
+                events.append(i)
+                if i < 100:
+                    self.publish("a.topic", i + 1, options=self.publish_options)
+
+            from autobahn.wamp.types import PublishOptions
+
+            self.publish_options = PublishOptions(exclude_me=False)
+            self.subscribe(on_event, "a.topic")
+
+    class Publisher(ApplicationSession):
+        def onJoin(self, details):
+            self.publish("a.topic", 0)
+
+    runner.run(Component)
+    runner.run(Publisher)
+    assert events == list(range(101))
+
+
+def test_deliver_from_other_thread(runner, monkeypatch):
+    from_thread = []
+    monkeypatch.setattr(
+        autowamp.reactor, "callFromThread", lambda f, *args: from_thread.append(f)
+    )
+    results = []
+
+    class Component(ApplicationSession):
+        def onJoin(self, details):
+            results.append(details.realm)
+
+    thread = threading.Thread(target=runner.run, args=(Component,))
+    thread.start()
+    thread.join()
+    assert not results
+    assert len(from_thread) == 1
+
+
+def test_close_after_queued_messages(runner):
+    received = []
+
+    class Session:
+        def onOpen(self, transport):
+            pass
+
+        def onMessage(self, msg):
+            received.append(type(msg).__name__)
+
+        def onClose(self, was_clean):
+            received.append("close")
+
+    protocol = runner.create_protocol(Session())
+    transport = AutobahnTransport(protocol)
+    protocol._transport = transport
+    protocol.onOpen()
+
+    def reply_and_close():
+        transport.send(OP.RESULT, 1, {})
+        transport.close_session()
+        assert received == []
+
+    local_delivery(reply_and_close)
+    assert received == ["Result", "close"]
+
+
+def test_local_delivery_per_thread():
+    delivery = LocalDelivery()
+    delivered = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        delivered.append("first")
+
+    thread = threading.Thread(target=delivery, args=(blocking,))
+    thread.start()
+    started.wait(5)
+    delivery(delivered.append, "second")
+    assert delivered == ["second"]
+
+    release.set()
+    thread.join()
+    assert delivered == ["second", "first"]
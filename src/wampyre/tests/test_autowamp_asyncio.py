@@ -0,0 +1,44 @@
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("autobahn")
+
+# txaio can only use one framework per process and the Twisted tests select Twisted
+SCRIPT = """
+import asyncio
+
+from autobahn.asyncio.wamp import ApplicationSession
+
+from wampyre.transports.autowamp_asyncio import ApplicationRunner
+
+
+async def main():
+    result = asyncio.get_running_loop().create_future()
+
+    class Callee(ApplicationSession):
+        async def onJoin(self, details):
+            await self.register(lambda a: a * 2, "a.procedure")
+
+    class Caller(ApplicationSession):
+        async def onJoin(self, details):
+            await asyncio.sleep(0.01)
+            result.set_result(await self.call("a.procedure", 21))
+
+    runner = ApplicationRunner("a.realm")
+    runner.run(Callee)
+    runner.run(Caller)
+    print(await asyncio.wait_for(result, 5))
+
+
+asyncio.run(main())
+"""
+
+
+def test_asyncio_call():
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT], capture_output=True, text=True, timeout=30
+    )
+    assert output.returncode == 0, output.stderr
+    assert output.stdout.strip() == "42"
@@ -0,0 +1,36 @@
+import time
+
+from ..cache import ResultCache
+
+
+def test_result_cache_lru():
+    cache = ResultCache(max_size=2)
+    key = ResultCache.make_key(1, "a.procedure", ["a"], {"b": 1, "c": 2})
+    assert key == ResultCache.make_key(1, "a.procedure", ["a"], {"c": 2, "b": 1})
+    assert ResultCache.make_key(1, "a.procedure", [object()]) is None
+
+    assert cache.get(key) is None
+    cache.set(key, [["result"]], 10)
+    assert cache.get(key) == [["result"]]
+
+    key2 = ResultCache.make_key(1, "a.procedure", ["b"])
+    key3 = ResultCache.make_key(2, "b.procedure")
+    cache.set(key2, [], 10)
+    cache.get(key)
+    cache.set(key3, [], 10)
+    assert cache.get(key2) is None
+    assert cache.get(key) is not None
+    assert cache.stats() == {"hits": 3, "misses": 2, "size": 2}
+
+    assert cache.invalidate("a.procedure") == 1
+    cache.invalidate_registration(2)
+    assert not cache.entries
+
+
+def test_result_cache_ttl():
+    cache = ResultCache()
+    key = ResultCache.make_key(1, "a.procedure")
+    cache.set(key, [], 0.01)
+    time.sleep(0.02)
+    assert cache.get(key) is None
+    assert not cache.entries
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("channels")
+
+from channels.layers import InMemoryChannelLayer
+
+from ..opcodes import OP
+from ..realm import RealmManager
+from ..transports.channels_layer import ChannelsLayerFederation
+from .test_session import transport_base
+
+
+def test_publish_and_call_between_workers():
+    async def run():
+        channel_layer = InMemoryChannelLayer()
+        worker_a = ChannelsLayerFederation(channel_layer, RealmManager())
+        worker_b = ChannelsLayerFederation(channel_layer, RealmManager())
+        await worker_a.start()
+        await worker_b.start()
+
+        transport_a = transport_base()
+        transport_a.realm_manager = worker_a.realm_manager
+        transport_a.connect("a.realm")
+        transport_b = transport_base()
+        transport_b.realm_manager = worker_b.realm_manager
+        transport_b.connect("a.realm")
+
+        transport_b.receive(OP.SUBSCRIBE, transport_b.generate_id(), {}, "a.topic")
+        transport_b.get_reply()
+        transport_b.receive(OP.REGISTER, transport_b.generate_id(), {}, "a.procedure")
+        transport_b.get_reply()
+        await asyncio.sleep(0.05)
+
+        transport_a.receive(OP.PUBLISH, transport_a.generate_id(), {}, "a.topic", [1])
+        transport_a.receive(OP.CALL, transport_a.generate_id(), {}, "a.procedure")
+        await asyncio.sleep(0.05)
+
+        opcode, args = transport_b.get_reply()
+        assert opcode == OP.INVOCATION
+        transport_b.receive(OP.YIELD, args[0], {}, ["result"])
+        opcode, args = transport_b.get_reply()
+        assert opcode == OP.EVENT
+        assert args[3] == [1]
+        await asyncio.sleep(0.05)
+
+        opcode, args = transport_a.get_reply()
+        assert opcode == OP.RESULT
+        assert args[2] == ["result"]
+
+        await worker_a.stop()
+        await worker_b.stop()
+
+    asyncio.run(run())
+
+
+def test_dead_worker_is_forgotten():
+    async def run():
+        channel_layer = InMemoryChannelLayer()
+        worker_a = ChannelsLayerFederation(channel_layer, RealmManager())
+        worker_b = ChannelsLayerFederation(channel_layer, RealmManager())
+        for worker in (worker_a, worker_b):
+            worker.heartbeat_interval = 0.01
+            worker.node_timeout = 0.05
+            await worker.start()
+
+        transport_b = transport_base()
+        transport_b.realm_manager = worker_b.realm_manager
+        transport_b.connect("a.realm")
+        transport_b.receive(OP.REGISTER, transport_b.generate_id(), {}, "a.procedure")
+        await asyncio.sleep(0.03)
+        assert worker_a.match_procedure("a.realm", "a.procedure") is not None
+
+        # The worker dies without saying goodbye
+        for task in worker_b._tasks:
+            task.cancel()
+        await asyncio.sleep(0.1)
+        assert worker_a.match_procedure("a.realm", "a.procedure") is None
+        assert worker_b.node not in worker_a.last_seen
+
+        await worker_a.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+import pytest
+
+from ..codec import CODECS, JSONCodec, get_codec
+from ..opcodes import OP
+
+
+def available_codecs():
+    codecs = []
+    for codec_cls in CODECS.values():
+        try:
+            codecs.append(codec_cls())
+        except ImportError:
+            pass
+    return codecs
+
+
+@pytest.mark.parametrize("codec", available_codecs(), ids=lambda c: c.name)
+def test_roundtrip(codec):
+    message = [OP.EVENT, 2 ** 53, 1, {"topic": "a.topic"}, ["æøå"], {"b": "/c"}]
+
+    encoded = codec.encode(message)
+    assert isinstance(encoded, str)
+    assert codec.decode(encoded) == message
+    assert codec.decode(encoded.encode("utf-8")) == message
+    assert codec.decode(memoryview(encoded.encode("utf-8"))) == message
+
+
+def test_get_codec_fallback():
+    assert get_codec("json").name == "json"
+    assert get_codec("nonexisting").name in CODECS
+
+    for codec_cls in CODECS.values():
+        try:
+            codec_cls()
+        except ImportError:
+            continue
+        assert isinstance(get_codec(), codec_cls)
+        break
+
+
+def test_stdlib_codec_compact():
+    assert JSONCodec().encode([1, {"a": "b"}]) == '[1,{"a":"b"}]'
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("channels")
+
+from ..opcodes import OP
+from ..router_loop import AsyncioRouterLoop
+from ..transports.django import WAMPRouter
+
+
+def router(**kwargs):
+    consumer = WAMPRouter(**kwargs)
+    consumer.sent = []
+
+    async def base_send(message):
+        consumer.sent.append(message)
+
+    consumer.base_send = base_send
+    return consumer
+
+
+def test_max_message_size():
+    consumer = router(max_message_size=64, max_payload_depth=4)
+    assert consumer.transport.max_payload_depth == 4
+
+    consumer.receive(text_data=json.dumps([OP.CALL, 12, {}, "a.procedure", ["a" * 64]]))
+    assert json.loads(consumer.sent.pop()["text"]) == [
+        OP.ERROR,
+        OP.CALL,
+        12,
+        {},
+        "wamp.error.payload_size_exceeded",
+    ]
+
+    # Fewer characters than the limit but more bytes
+    message = json.dumps(
+        [OP.CALL, 13, {}, "a.procedure", ["€" * 20]], ensure_ascii=False
+    )
+    assert len(message) < 64 < len(message.encode("utf-8"))
+    consumer.receive(text_data=message)
+    assert (
+        json.loads(consumer.sent.pop()["text"])[4] == "wamp.error.payload_size_exceeded"
+    )
+
+    consumer.receive(bytes_data=b"{" + b" " * 64 + b"}")
+    assert json.loads(consumer.sent[0]["text"])[2] == "wamp.error.payload_size_exceeded"
+    assert consumer.sent[1] == {"type": "websocket.close"}
+
+
+def test_coroutine_guard_needs_router_loop():
+    async def guard(user, method, uri):
+        return True
+
+    with pytest.raises(ValueError):
+        router(guard=guard)
+
+
+def test_sync_guard_in_event_loop():
+    from django.conf import settings
+
+    if not settings.configured:
+        settings.configure()
+    guard_threads = []
+
+    def guard(user, method, uri):
+        guard_threads.append(threading.get_ident())
+        return uri != "b.topic"
+
+    async def run():
+        consumer = router(guard=guard)
+        realm_manager = consumer.transport.realm_manager
+        realm_manager.router_loop = AsyncioRouterLoop(asyncio.get_running_loop())
+        try:
+            for message in [
+                [OP.HELLO, "a.realm", {}],
+                [OP.PUBLISH, 1, {"acknowledge": True}, "a.topic"],
+                [OP.PUBLISH, 2, {"acknowledge": True}, "b.topic"],
+            ]:
+                consumer.receive(text_data=json.dumps(message))
+            await asyncio.sleep(0.2)
+        finally:
+            realm_manager.router_loop = None
+            realm_manager.realms = {}
+        return [json.loads(message["text"]) for message in consumer.sent]
+
+    replies = asyncio.run(run())
+    assert [reply[0] for reply in replies] == [OP.WELCOME, OP.PUBLISHED, OP.ERROR]
+    assert replies[2][4] == "wamp.error.not_authorized"
+    assert threading.get_ident() not in guard_threads
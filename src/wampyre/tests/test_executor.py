@@ -0,0 +1,111 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from ..opcodes import OP
+from ..realm import realm_manager
+from ..router_loop import ThreadRouterLoop
+from ..session import STATE_CLOSED
+from ..transports.executor import ExecutorCallee
+from .test_session import transport_base
+
+
+def multiply(a, b=1):
+    return a * b
+
+
+def fail():
+    raise ValueError("no happy time")
+
+
+def wait_for_replies(transport, count, timeout=10.0):
+    for _ in range(int(timeout / 0.01)):
+        if len(transport._sends) >= count:
+            return
+        time.sleep(0.01)
+    raise AssertionError("Never got the replies")
+
+
+@pytest.fixture
+def caller():
+    transport = transport_base()
+    transport.connect("a.realm")
+    yield transport
+    realm_manager.realms = {}
+
+
+def test_process_pool(caller):
+    callee = ExecutorCallee("a.realm", ProcessPoolExecutor(max_workers=2))
+    callee.connect()
+    callee.register("a.multiply", multiply)
+    callee.register("a.fail", fail)
+
+    caller.receive(OP.CALL, caller.generate_id(), {}, "a.multiply", [6], {"b": 7})
+    wait_for_replies(caller, 1)
+    opcode, args = caller.get_reply()
+    assert opcode == OP.RESULT
+    assert args[2] == [42]
+
+    caller.receive(OP.CALL, caller.generate_id(), {}, "a.fail")
+    wait_for_replies(caller, 1)
+    opcode, args = caller.get_reply()
+    assert opcode == OP.ERROR
+    assert args[3] == "wamp.error.runtime_error"
+    assert args[4] == ["no happy time"]
+
+    callee.close()
+
+
+def test_concurrency_limit(caller):
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def slow(i):
+        with lock:
+            running.append(i)
+            max_running.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(i)
+        return i
+
+    callee = ExecutorCallee(
+        "a.realm", ThreadPoolExecutor(max_workers=10), max_concurrency=2
+    )
+    callee.connect()
+    callee.register("a.slow", slow)
+
+    # The caller calls from this thread while results come from the pool
+    router_loop = ThreadRouterLoop()
+    router_loop.start()
+    realm_manager.router_loop = router_loop
+    try:
+        for i in range(10):
+            caller.receive(OP.CALL, caller.generate_id(), {}, "a.slow", [i])
+        wait_for_replies(caller, 10)
+    finally:
+        realm_manager.router_loop = None
+        router_loop.stop()
+
+    assert max(max_running) == 2
+    assert sorted(args[2][0] for opcode, args in caller._sends) == list(range(10))
+    callee.close()
+
+
+def test_submit_failure(caller):
+    executor = ThreadPoolExecutor(max_workers=1)
+    callee = ExecutorCallee("a.realm", executor, max_concurrency=1)
+    callee.connect()
+    callee.register("a.multiply", multiply)
+    executor.shutdown()
+
+    for _ in range(2):
+        caller.receive(OP.CALL, caller.generate_id(), {}, "a.multiply", [6])
+        opcode, args = caller.get_reply()
+        assert opcode == OP.ERROR
+        assert args[3] == "wamp.error.runtime_error"
+    assert callee._running == 0
+    assert caller.session.state != STATE_CLOSED
@@ -0,0 +1,212 @@
+from ..federation import FederationBase
+from ..opcodes import OP
+from ..pattern import Pattern
+from ..realm import RealmManager
+from .test_session import transport_base
+
+
+class LoopbackFederation(FederationBase):
+    def __init__(self, network, node):
+        super().__init__(RealmManager())
+        self.network = network
+        self.node = node
+        self.received = []
+        self.realm_manager.set_federation(self)
+        network[node] = self
+
+    def send_to(self, node, message):
+        self.network[node].received.append(message["type"])
+        self.network[node].handle_message(message)
+
+    def broadcast(self, message):
+        for node in list(self.network):
+            if node != self.node:
+                self.send_to(node, message)
+
+    def transport(self, realm="a.realm"):
+        transport = transport_base()
+        transport.realm_manager = self.realm_manager
+        transport.connect(realm)
+        return transport
+
+
+def create_network(*nodes):
+    network = {}
+    federations = [LoopbackFederation(network, node) for node in nodes]
+    for federation in federations:
+        federation.hello()
+    return federations
+
+
+def test_publish_only_to_interested():
+    node_a, node_b, node_c = create_network("a", "b", "c")
+    publisher = node_a.transport()
+    subscriber = node_b.transport()
+    node_c.transport()
+
+    subscriber.receive(OP.SUBSCRIBE, subscriber.generate_id(), {}, "a.topic")
+    opcode, args = subscriber.get_reply()
+    subscription_id = args[1]
+
+    node_b.received, node_c.received = [], []
+    publisher.receive(OP.PUBLISH, publisher.generate_id(), {}, "a.topic", ["a"])
+    opcode, args = subscriber.get_reply()
+    assert opcode == OP.EVENT
+    assert args[0] == subscription_id
+    assert args[3] == ["a"]
+    assert node_b.received == ["wampyre.publish"]
+    assert node_c.received == []
+
+    publisher.receive(OP.PUBLISH, publisher.generate_id(), {}, "b.topic", ["a"])
+    assert subscriber.is_empty()
+    assert node_b.received == ["wampyre.publish"]
+
+    subscriber.receive(OP.UNSUBSCRIBE, subscriber.generate_id(), subscription_id)
+    subscriber.get_reply()
+    publisher.receive(OP.PUBLISH, publisher.generate_id(), {}, "a.topic", ["a"])
+    assert subscriber.is_empty()
+    assert node_b.received == ["wampyre.publish"]
+
+
+def test_publish_exclusion_across_routers():
+    node_a, node_b = create_network("a", "b")
+    publisher = node_a.transport()
+    subscriber = node_b.transport()
+    subscriber2 = node_b.transport()
+
+    for t in [subscriber, subscriber2]:
+        t.receive(OP.SUBSCRIBE, t.generate_id(), {}, "a.topic")
+        t.get_reply()
+
+    publisher.receive(
+        OP.PUBLISH,
+        publisher.generate_id(),
+        {"exclude": [subscriber.session.session_id]},
+        "a.topic",
+    )
+    assert subscriber.is_empty()
+    assert subscriber2.get_reply()[0] == OP.EVENT
+
+
+def test_late_joiner_receives_interest():
+    (node_a,) = create_network("a")
+    subscriber = node_a.transport()
+    subscriber.receive(OP.SUBSCRIBE, subscriber.generate_id(), {"match": "prefix"}, "a")
+    subscriber.get_reply()
+
+    (node_b,) = [LoopbackFederation(node_a.network, "b")]
+    node_b.hello()
+    publisher = node_b.transport()
+    publisher.receive(OP.PUBLISH, publisher.generate_id(), {}, "a.topic", ["a"])
+    opcode, args = subscriber.get_reply()
+    assert opcode == OP.EVENT
+    assert args[2] == {"topic": "a.topic"}
+
+
+def test_remote_call():
+    node_a, node_b = create_network("a", "b")
+    caller = node_a.transport()
+    callee = node_b.transport()
+
+    callee.receive(OP.REGISTER, callee.generate_id(), {}, "a.procedure")
+    opcode, args = callee.get_reply()
+    registration_id = args[1]
+
+    caller.receive(OP.CALL, caller.generate_id(), {}, "a.procedure", ["a"], {"b": 1})
+    opcode, args = callee.get_reply()
+    assert opcode == OP.INVOCATION
+    assert args[1] == registration_id
+    assert args[2] == {"procedure": "a.procedure"}
+    assert args[3] == ["a"]
+    assert args[4] == {"b": 1}
+
+    callee.receive(OP.YIELD, args[0], {}, ["c"])
+    opcode, args = caller.get_reply()
+    assert opcode == OP.RESULT
+    assert args[0] == caller._last_id
+    assert args[2] == ["c"]
+    assert caller.is_empty()
+
+    caller.receive(OP.CALL, caller.generate_id(), {}, "a.procedure")
+    opcode, args = callee.get_reply()
+    callee.receive(OP.ERROR, OP.INVOCATION, args[0], {}, "a.procedure.error")
+    opcode, args = caller.get_reply()
+    assert opcode == OP.ERROR
+    assert Pattern("opcode", "id", "dict", "uri")(*args)
+    assert args[3] == "a.procedure.error"
+
+
+def test_remote_callee_lost():
+    node_a, node_b = create_network("a", "b")
+    caller = node_a.transport()
+    callee = node_b.transport()
+
+    callee.receive(OP.REGISTER, callee.generate_id(), {}, "a.procedure")
+    callee.get_reply()
+
+    caller.receive(OP.CALL, caller.generate_id(), {}, "a.procedure")
+    callee.get_reply()
+    node_b.goodbye()
+
+    opcode, args = caller.get_reply()
+    assert opcode == OP.ERROR
+    assert args[3] == "wamp.error.callee_lost"
+
+    caller.receive(OP.CALL, caller.generate_id(), {}, "a.procedure")
+    opcode, args = caller.get_reply()
+    assert opcode == OP.ERROR
+    assert args[3] == "wamp.error.no_such_procedure"
+
+
+def test_stale_node_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("wampyre.federation.time.monotonic", lambda: now[0])
+    node_a, node_b = create_network("a", "b")
+    caller = node_a.transport()
+    callee = node_b.transport()
+
+    callee.receive(OP.REGISTER, callee.generate_id(), {}, "a.procedure")
+    callee.get_reply()
+    caller.receive(OP.CALL, caller.generate_id(), {}, "a.procedure")
+    callee.get_reply()
+
+    now[0] += 20
+    node_a.expire_nodes()
+    assert caller.is_empty()
+
+    now[0] += 20
+    node_a.expire_nodes()
+    opcode, args = caller.get_reply()
+    assert opcode == OP.ERROR
+    assert args[3] == "wamp.error.callee_lost"
+    assert "b" not in node_a.last_seen
+
+    caller.receive(OP.CALL, caller.generate_id(), {}, "a.procedure")
+    opcode, args = caller.get_reply()
+    assert args[3] == "wamp.error.no_such_procedure"
+
+    node_b.heartbeat()
+    assert node_a.received[-2:] == ["wampyre.heartbeat", "wampyre.interest"]
+    assert node_b.received[-1] == "wampyre.hello"
+    caller.receive(OP.CALL, caller.generate_id(), {}, "a.procedure")
+    assert callee.get_reply()[0] == OP.INVOCATION
+
+
+def test_embedded_call_to_remote_router():
+    node_a, node_b = create_network("a", "b")
+    callee = node_b.transport()
+    callee.receive(OP.REGISTER, callee.generate_id(), {}, "a.procedure")
+    callee.get_reply()
+
+    future = node_a.realm_manager.call("a.realm", "a.procedure", ["a"])
+    opcode, args = callee.get_reply()
+    assert opcode == OP.INVOCATION
+    assert args[3] == ["a"]
+    assert "a.realm" in node_a.realm_manager.realms
+
+    callee.receive(OP.YIELD, args[0], {}, ["b"])
+    assert future.result(timeout=1).args == ["b"]
+    assert "a.realm" not in node_a.realm_manager.realms
+
+    future = node_a.realm_manager.call("a.realm", "b.procedure")
+    assert future.exception(timeout=1).error == "wamp.error.no_such_procedure"
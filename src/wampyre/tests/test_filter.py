@@ -0,0 +1,69 @@
+import pytest
+
+from ..filter import EventFilter, InvalidFilterException
+from ..utils import URIPattern
+
+
+def test_filter_comparisons():
+    assert EventFilter("a == 1")({"a": 1})
+    assert not EventFilter("a == 1")({"a": 2})
+    assert EventFilter("a != 1")({"a": 2})
+    assert EventFilter("1 < a <= 3")({"a": 3})
+    assert not EventFilter("1 < a <= 3")({"a": 4})
+    assert EventFilter("a >= -1.5")({"a": -1})
+    assert EventFilter("a in ['x', 'y']")({"a": "y"})
+    assert EventFilter("a not in ('x', 'y')")({"a": "z"})
+    assert EventFilter("'x' in a")({"a": ["x"]})
+    assert EventFilter("a.b == 'c'")({"a": {"b": "c"}})
+
+
+def test_filter_boolean_operators():
+    event_filter = EventFilter("(a == 1 or b == 2) and not c")
+    assert event_filter({"a": 1})
+    assert event_filter({"b": 2, "c": False})
+    assert not event_filter({"b": 2, "c": True})
+    assert not event_filter({})
+
+
+def test_filter_missing_and_mismatched():
+    assert not EventFilter("a == 1")({})
+    assert not EventFilter("a != 1")({})
+    assert not EventFilter("a.b == 1")({"a": 1})
+    assert not EventFilter("a > 1")({"a": "x"})
+    assert not EventFilter("a")(None)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "__import__('os')",
+        "a.__class__()",
+        "a[0] == 1",
+        "a + 1 == 2",
+        "lambda: 1",
+        "a is None",
+        "a ==",
+        "x" * 2000,
+        1,
+    ],
+)
+def test_filter_invalid(expression):
+    with pytest.raises(InvalidFilterException):
+        EventFilter(expression)
+
+
+def test_filter_shared_per_expression():
+    pattern = URIPattern(allow_duplicate=True)
+    session, session2 = object(), object()
+    pattern_id = pattern.register_uri(session, "a.b", None, "a == 1")
+    pattern_id2 = pattern.register_uri(session2, "a", "prefix", "a == 1")
+    assert pattern.filters[pattern_id] is pattern.filters[pattern_id2]
+
+    pattern.unregister_uri(session, pattern_id)
+    assert pattern_id not in pattern.filters
+    pattern.unregister_session(session2)
+    assert not pattern.filters
+
+    with pytest.raises(InvalidFilterException):
+        pattern.register_uri(session, "a.b", None, "a +")
+    assert not list(pattern.iter_patterns())
@@ -0,0 +1,35 @@
+from ..history import EventHistory, topic_matches
+
+
+def test_topic_matches():
+    assert topic_matches("a.b", "exact", "a.b")
+    assert not topic_matches("a.b", None, "a.b.c")
+    assert topic_matches("a", "prefix", "a.b.c")
+    assert not topic_matches("a", "prefix", "ab")
+    assert topic_matches("a..c", "wildcard", "a.b.c")
+    assert not topic_matches("a..c", "wildcard", "a.b.d")
+
+
+def test_history_limits():
+    history = EventHistory([("a", "prefix", 2), ("a.last", None, 1)], max_events=4)
+    history.store(1, "b.topic", ["a"])
+    assert history.size == 0
+
+    history.store(2, "a.topic", ["a"])
+    history.store(3, "a.topic", ["b"])
+    history.store(4, "a.topic", ["c"])
+    assert history.get_events("a.topic") == [
+        (3, "a.topic", ["b"], None),
+        (4, "a.topic", ["c"], None),
+    ]
+
+    history.store(5, "a.last", [1])
+    history.store(6, "a.last", [2])
+    assert history.get_events("a.last") == [(6, "a.last", [2], None)]
+
+    history.store(7, "a.other", [], {"a": "b"})
+    history.store(8, "a.other", [])
+    assert history.size == 4
+    assert history.get_events("a.topic") == [(4, "a.topic", ["c"], None)]
+    assert [event[0] for event in history.get_events("a", "prefix")] == [4, 6, 7, 8]
+    assert [event[0] for event in history.get_events("a", "prefix", 2)] == [7, 8]
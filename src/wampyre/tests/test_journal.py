@@ -0,0 +1,174 @@
+import os
+import threading
+
+import pytest
+
+from ..journal import Journal
+from ..opcodes import OP
+from ..realm import realm_manager
+from ..router_loop import ThreadRouterLoop
+from .test_session import transport_base
+
+
+def test_journal_replay(tmp_path):
+    journal = Journal(str(tmp_path), [("a", "prefix")])
+    assert journal.is_durable("a.topic")
+    assert not journal.is_durable("b.topic")
+
+    journal.append(1, "a.topic", ["a"])
+    journal.append(2, "a.topic", [], {"b": "c"})
+    journal.append(3, "a.other_topic")
+    journal.flush()
+    assert [event[0] for event in journal.replay()] == [1, 2, 3]
+    assert journal.replay(1) == [
+        (2, "a.topic", [], {"b": "c"}),
+        (3, "a.other_topic", None, None),
+    ]
+    assert journal.replay(3) == []
+    assert journal.replay(1234) is None
+    assert journal.replay(limit=2, topic_filter=lambda topic: topic == "a.topic") == [
+        (1, "a.topic", ["a"], None),
+        (2, "a.topic", [], {"b": "c"}),
+    ]
+    journal.stop()
+
+
+def test_journal_rotation_and_reopen(tmp_path):
+    journal = Journal(str(tmp_path), [("a", "prefix")], segment_size=64, max_segments=2)
+    journal.start()
+    for i in range(1, 11):
+        journal.append(i, "a.topic", [i])
+    journal.flush()
+    assert len(os.listdir(str(tmp_path))) == 2
+    replayed = [event[0] for event in journal.replay()]
+    assert replayed == list(range(11 - len(replayed), 11))
+    journal.stop()
+
+    journal = Journal(str(tmp_path), [("a", "prefix")], segment_size=64, max_segments=2)
+    assert [event[0] for event in journal.replay()] == replayed
+    journal.append(11, "a.topic", [11])
+    journal.flush()
+    assert journal.replay(10) == [(11, "a.topic", [11], None)]
+    journal.stop()
+
+
+def test_journal_replay_subscription(tmp_path):
+    journal = Journal(str(tmp_path), [("a", "prefix")])
+    realm_manager.set_journal("a.realm", journal)
+    try:
+        transport = transport_base()
+        transport.connect("a.realm")
+        publication_ids = []
+        for i in range(3):
+            transport.receive(
+                OP.PUBLISH,
+                transport.generate_id(),
+                {"acknowledge": True},
+                "a.topic",
+                [i],
+            )
+            publication_ids.append(transport.get_reply()[1][1])
+        transport.receive(OP.PUBLISH, transport.generate_id(), {}, "a.other", [3])
+
+        transport2 = transport_base()
+        transport2.connect("a.realm")
+        transport2.receive(
+            OP.SUBSCRIBE,
+            transport2.generate_id(),
+            {"replay_after": publication_ids[0]},
+            "a.topic",
+        )
+        opcode, args = transport2.get_reply()
+        assert opcode == OP.EVENT
+        assert args[1] == publication_ids[2]
+        assert args[2] == {"topic": "a.topic", "replayed": True}
+        assert args[3] == [2]
+        opcode, args = transport2.get_reply()
+        assert opcode == OP.EVENT
+        assert args[1] == publication_ids[1]
+        assert transport2.get_reply()[0] == OP.SUBSCRIBED
+    finally:
+        realm_manager.set_journal("a.realm", None)
+        realm_manager.realms = {}
+        journal.stop()
+
+
+def test_journal_replay_in_writer_thread(tmp_path):
+    journal = Journal(str(tmp_path), [("a", "prefix")])
+    journal.max_replay = 2
+    journal.start()
+    with pytest.raises(RuntimeError):
+        realm_manager.set_journal("a.realm", journal)
+
+    router_loop = ThreadRouterLoop()
+    router_loop.start()
+    realm_manager.router_loop = router_loop
+    realm_manager.set_journal("a.realm", journal)
+    try:
+        journal.append(1, "a.topic", [1])
+        journal.append(2, "a.topic", [2], receivers={"eligible": [1234]})
+        for publication_id in range(3, 6):
+            journal.append(publication_id, "a.topic", [publication_id])
+
+        transport = transport_base()
+        transport.receive(OP.HELLO, "a.realm", {})
+        transport.receive(OP.SUBSCRIBE, 1, {"replay_after": 1}, "a.topic")
+        transport.receive(OP.SUBSCRIBE, 2, {"replay_after": 1234}, "a.other")
+        transport.receive(OP.SUBSCRIBE, 3, {"replay_after": ["a"]}, "a.topic")
+        subscribed = threading.Event()
+        router_loop.submit(subscribed.set)
+        subscribed.wait()
+        journal.flush()
+    finally:
+        realm_manager.router_loop = None
+        router_loop.stop()
+        realm_manager.set_journal("a.realm", None)
+        realm_manager.realms = {}
+        journal.stop()
+
+    assert transport._sends.pop(0)[0] == OP.WELCOME
+    assert [(opcode, args[0]) for opcode, args in transport._sends] == [
+        (OP.SUBSCRIBED, 1),
+        (OP.SUBSCRIBED, 2),
+        (OP.ERROR, OP.SUBSCRIBE),
+        (OP.EVENT, transport._sends[0][1][1]),
+        (OP.EVENT, transport._sends[0][1][1]),
+    ]
+    assert [args[1] for opcode, args in transport._sends[3:]] == [3, 4]
+    assert transport._sends[2][1][3] == "wamp.error.invalid_argument"
+
+
+def test_journal_receivers(tmp_path):
+    journal = Journal(str(tmp_path), [("a", "prefix")])
+    realm_manager.set_journal("a.realm", journal)
+    try:
+        transport = transport_base()
+        transport2 = transport_base()
+        transport3 = transport_base()
+        for t in (transport, transport2, transport3):
+            t.connect("a.realm")
+
+        transport.receive(
+            OP.PUBLISH, transport.generate_id(), {"acknowledge": True}, "a.topic", [0]
+        )
+        first_id = transport.get_reply()[1][1]
+        transport.receive(
+            OP.PUBLISH,
+            transport.generate_id(),
+            {"eligible": [transport2.session.session_id]},
+            "a.topic",
+            ["secret"],
+        )
+        transport.receive(OP.PUBLISH, transport.generate_id(), {}, "a.topic", [1])
+
+        for t in (transport2, transport3):
+            t.receive(OP.SUBSCRIBE, 1, {"replay_after": first_id}, "a.topic")
+        assert [args[3] for opcode, args in transport2._sends[1:]] == [
+            ["secret"],
+            [1],
+        ]
+        assert [args[3] for opcode, args in transport3._sends[1:]] == [[1]]
+    finally:
+        realm_manager.set_journal("a.realm", None)
+        realm_manager.realms = {}
+        journal.stop()
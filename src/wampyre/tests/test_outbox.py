@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+import pytest
+
+from ..opcodes import OP
+from ..realm import RealmManager
+from ..transports.base import (
+    PRIORITY_CONTROL,
+    PRIORITY_EVENT,
+    PRIORITY_INVOCATION,
+    PriorityOutbox,
+)
+from ..transports.rawsocket import RawSocketProtocol
+
+
+def test_priority_outbox_weighted():
+    outbox = PriorityOutbox()
+    for i in range(6):
+        outbox.put(PRIORITY_EVENT, f"e{i}")
+    for i in range(6):
+        outbox.put(PRIORITY_CONTROL, f"c{i}")
+    outbox.put(PRIORITY_INVOCATION, "i0")
+    assert len(outbox) == 13
+
+    assert [outbox.pop() for _ in range(len(outbox))] == [
+        "c0",
+        "c1",
+        "c2",
+        "c3",
+        "i0",
+        "e0",
+        "c4",
+        "c5",
+        "e1",
+        "e2",
+        "e3",
+        "e4",
+        "e5",
+    ]
+
+    outbox.put(PRIORITY_EVENT, "e6")
+    outbox.put_last("close")
+    outbox.put(PRIORITY_CONTROL, "c6")
+    assert len(outbox) == 3
+    assert [outbox.pop() for _ in range(len(outbox))] == ["c6", "e6", "close"]
+
+
+class FakeTransport:
+    def __init__(self):
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def test_rawsocket_replies_overtake_events():
+    protocol = RawSocketProtocol(realm_manager=RealmManager(), serializer=1)
+    transport = FakeTransport()
+    protocol.connection_made(transport)
+
+    protocol.send_message([OP.EVENT, 1, 1, {}])
+    assert len(transport.written) == 1
+
+    protocol.pause_writing()
+    protocol.send_message([OP.EVENT, 1, 2, {}])
+    protocol.send_message([OP.RESULT, 1, {}])
+    assert len(transport.written) == 1
+
+    protocol.resume_writing()
+    assert [protocol.codec.decode(frame[4:])[0] for frame in transport.written[1:]] == [
+        OP.RESULT,
+        OP.EVENT,
+    ]
+
+    protocol.pause_writing()
+    protocol.send_message([OP.EVENT, 1, 3, {}])
+    protocol.close()
+    assert len(transport.written) == 4
+    assert transport.closed
+
+
+def test_django_replies_overtake_events():
+    django = pytest.importorskip("wampyre.transports.django")
+
+    class Consumer:
+        def __init__(self):
+            self.sent = []
+
+        def encode_json(self, content):
+            return json.dumps(content)
+
+        async def base_send(self, message):
+            self.sent.append(message)
+            await asyncio.sleep(0)
+
+    async def run():
+        consumer = Consumer()
+        transport = django.DjangoWebsocketTransport(consumer)
+        transport.send(OP.EVENT, 1, 1, {})
+        transport.send(OP.EVENT, 1, 2, {})
+        transport.send(OP.RESULT, 1, {})
+        transport.close_session()
+        await asyncio.sleep(0.01)
+        return consumer.sent
+
+    sent = asyncio.run(run())
+    assert [json.loads(message["text"])[0] for message in sent[:3]] == [
+        OP.RESULT,
+        OP.EVENT,
+        OP.EVENT,
+    ]
+    assert sent[3] == {"type": "websocket.close"}
+
+
+def test_django_close_after_control_messages():
+    django = pytest.importorskip("wampyre.transports.django")
+
+    class Consumer:
+        def __init__(self):
+            self.sent = []
+
+        def encode_json(self, content):
+            return json.dumps(content)
+
+        async def base_send(self, message):
+            self.sent.append(message)
+            await asyncio.sleep(0)
+
+    async def run():
+        consumer = Consumer()
+        transport = django.DjangoWebsocketTransport(consumer)
+        for i in range(5):
+            transport.send(OP.RESULT, i, {})
+        transport.send(OP.ABORT, {}, "wamp.error.protocol_violation")
+        transport.close_session()
+        await asyncio.sleep(0.01)
+        return consumer.sent
+
+    sent = asyncio.run(run())
+    assert len(sent) == 7
+    assert [json.loads(message["text"])[0] for message in sent[:6]] == [
+        OP.RESULT
+    ] * 5 + [OP.ABORT]
+    assert sent[6] == {"type": "websocket.close"}
@@ -0,0 +1,49 @@
+import time
+
+from ..opcodes import OP
+from ..ratelimit import RateLimiter, TokenBucket
+
+
+def test_token_bucket():
+    bucket = TokenBucket(100, 2)
+    assert bucket.consume()
+    assert bucket.consume()
+    assert not bucket.consume()
+    time.sleep(0.02)
+    assert bucket.consume()
+    assert not bucket.consume(3)
+
+
+def test_rate_limiter():
+    limiter = RateLimiter({"call": (0.001, 1)}, {"publish": (0.001, 2)})
+    session, session2 = object(), object()
+
+    assert limiter.allow(session, OP.CALL)
+    assert not limiter.allow(session, OP.CALL)
+    assert limiter.allow(session2, OP.CALL)
+    assert limiter.allow(session, OP.SUBSCRIBE)
+    assert limiter.allow(session, OP.REGISTER)
+
+    assert limiter.allow(session, OP.PUBLISH)
+    assert limiter.allow(session2, OP.PUBLISH)
+    assert not limiter.allow(session, OP.PUBLISH_BATCH, 1)
+    assert limiter.throttled == {"call": 1, "publish": 1}
+    assert limiter.session_throttled[session] == {"call": 1, "publish": 1}
+
+    limiter.forget(session)
+    assert session not in limiter.session_buckets
+    assert limiter.allow(session, OP.CALL)
+
+
+def test_rate_limiter_charges_all_or_nothing():
+    limiter = RateLimiter({"publish": (0.001, 3)}, {"publish": (0.001, 2)})
+    session = object()
+
+    assert limiter.allow(session, OP.PUBLISH_BATCH, 10)
+    assert limiter.session_buckets[session]["publish"].tokens < 1.1
+    assert not limiter.allow(session, OP.PUBLISH)
+
+    limiter = RateLimiter({"publish": (0.001, 3)}, {"publish": (0.001, 1)})
+    assert limiter.allow(session, OP.PUBLISH)
+    assert not limiter.allow(session, OP.PUBLISH)
+    assert limiter.session_buckets[session]["publish"].tokens > 1.9
@@ -0,0 +1,67 @@
+import json
+import struct
+
+from ..opcodes import OP
+from ..realm import RealmManager
+from ..transports.rawsocket import RawSocketProtocol, build_frame
+
+
+class FakeTransport:
+    def __init__(self):
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def decode_frames(protocol, transport):
+    return [protocol.codec.decode(frame[4:]) for frame in transport.written]
+
+
+def test_rawsocket_max_length():
+    protocol = RawSocketProtocol(
+        realm_manager=RealmManager(), serializer=1, max_length=1000, max_payload_depth=4
+    )
+    transport = FakeTransport()
+    protocol.connection_made(transport)
+    assert protocol.max_length_exponent == 0
+    assert protocol.wamp_transport.max_payload_depth == 4
+
+    protocol.data_received(build_frame(json.dumps([OP.HELLO, "a.realm", {}]).encode()))
+    assert decode_frames(protocol, transport)[-1][0] == OP.WELCOME
+
+    frame = build_frame(
+        json.dumps([OP.CALL, 12, {}, "a.procedure", ["a" * 2000]]).encode()
+    )
+    protocol.data_received(frame[:100])
+    protocol.data_received(frame[100:1500])
+    assert decode_frames(protocol, transport)[-1] == [
+        OP.ERROR,
+        OP.CALL,
+        12,
+        {},
+        "wamp.error.payload_size_exceeded",
+    ]
+    assert not transport.closed
+
+    protocol.data_received(frame[1500:] + build_frame(b'[6, {}, "wamp.close.normal"]'))
+    assert decode_frames(protocol, transport)[-1][0] == OP.GOODBYE
+
+
+def test_rawsocket_max_length_without_request():
+    protocol = RawSocketProtocol(
+        realm_manager=RealmManager(), serializer=1, max_length=600
+    )
+    transport = FakeTransport()
+    protocol.connection_made(transport)
+
+    protocol.data_received(struct.pack("!I", 2000) + b"{" + b" " * 100)
+    assert decode_frames(protocol, transport)[-1][0] == OP.ABORT
+    assert transport.closed
@@ -0,0 +1,111 @@
+import pytest
+
+from ..opcodes import OP
+from ..realm import CallError, RealmManager, realm_manager
+from .test_session import transport_base
+
+
+@pytest.fixture
+def transport():
+    yield transport_base()
+    realm_manager.realms = {}
+
+
+def test_embedded_publish(transport):
+    transport.connect("a.realm")
+    transport.receive(OP.SUBSCRIBE, transport.generate_id(), {"match": "prefix"}, "a")
+    opcode, args = transport.get_reply()
+    subscription_id = args[1]
+
+    realm_manager.publish("a.realm", "a.topic", ["a"], {"b": "c"})
+    opcode, args = transport.get_reply()
+    assert opcode == OP.EVENT
+    assert args[0] == subscription_id
+    assert args[2] == {"topic": "a.topic"}
+    assert args[3] == ["a"]
+    assert args[4] == {"b": "c"}
+
+    realm_manager.publish_many(
+        "a.realm",
+        [("a.topic", [1], None), ("b.topic", [2], None), ("a.topic", [3], None)],
+    )
+    assert [args[3] for opcode, args in transport._sends] == [[1], [3]]
+
+    realm_manager.publish("another.realm", "a.topic", ["a"])
+    assert "another.realm" not in realm_manager.realms
+
+
+def test_embedded_call(transport):
+    transport.connect("a.realm")
+    transport.receive(OP.REGISTER, transport.generate_id(), {}, "a.procedure")
+    transport.get_reply()
+
+    future = realm_manager.call("a.realm", "a.procedure", [1], {"b": 2})
+    opcode, args = transport.get_reply()
+    assert opcode == OP.INVOCATION
+    assert args[3] == [1]
+    assert args[4] == {"b": 2}
+    assert not future.done()
+
+    transport.receive(OP.YIELD, args[0], {}, ["c"])
+    assert future.result(timeout=0).args == ["c"]
+    assert future.result(timeout=0).kwargs is None
+
+    future = realm_manager.call("a.realm", "a.procedure")
+    opcode, args = transport.get_reply()
+    transport.receive(OP.ERROR, OP.INVOCATION, args[0], {}, "a.error", ["d"])
+    with pytest.raises(CallError) as e:
+        future.result(timeout=0)
+    assert e.value.error == "a.error"
+    assert e.value.error_args == ["d"]
+
+    with pytest.raises(CallError) as e:
+        realm_manager.call("a.realm", "b.procedure").result(timeout=0)
+    assert e.value.error == "wamp.error.no_such_procedure"
+
+    with pytest.raises(CallError):
+        RealmManager().call("a.realm", "a.procedure").result(timeout=0)
+
+
+def test_realm_grace_period(monkeypatch):
+    manager = RealmManager()
+    events = []
+    manager.register_callback(
+        lambda callback_type, realm: events.append((callback_type, realm))
+    )
+    manager.set_realm_grace_period(10, max_idle_realms=2)
+    now = [100.0]
+    monkeypatch.setattr("wampyre.realm.time.monotonic", lambda: now[0])
+
+    def connect(realm):
+        transport = transport_base()
+        transport.realm_manager = manager
+        transport.connect(realm)
+        return transport
+
+    transport = connect("a.realm")
+    realm = manager.realms["a.realm"]
+    transport.session.close_session()
+    assert manager.realms["a.realm"] is realm
+    assert list(manager.idle_realms) == ["a.realm"]
+
+    now[0] += 5
+    transport = connect("a.realm")
+    assert transport.session.realm is realm
+    assert not manager.idle_realms
+    assert events == [("create", "a.realm")]
+
+    transport.session.close_session()
+    for name in ["b.realm", "c.realm"]:
+        connect(name).session.close_session()
+    assert list(manager.idle_realms) == ["b.realm", "c.realm"]
+    assert events[-1] == ("discard", "a.realm")
+
+    now[0] += 11
+    manager.expire_idle_realms()
+    assert not manager.realms
+    assert not manager.idle_realms
+
+    manager.set_realm_grace_period(0)
+    connect("d.realm").session.close_session()
+    assert not manager.realms
@@ -0,0 +1,64 @@
+import pytest
+
+from ..opcodes import OP
+from ..realm import RealmManager
+from ..reaper import IdleReaper, TimingWheel
+from ..session import STATE_CLOSED
+from .test_session import transport_base
+
+
+def test_timing_wheel():
+    wheel = TimingWheel(tick=1.0, slots=4)
+    expired = []
+    wheel.schedule("a", 1, expired.append)
+    wheel.schedule("b", 6, expired.append)
+    wheel.schedule("c", 2, expired.append)
+    wheel.schedule("c", 3, expired.append)
+    wheel.schedule("d", 2, expired.append)
+    wheel.cancel("d")
+    assert len(wheel) == 3
+
+    ticks = []
+    for _ in range(7):
+        wheel.advance()
+        ticks.append(list(expired))
+        expired.clear()
+    assert ticks == [["a"], [], ["c"], [], [], ["b"], []]
+    assert len(wheel) == 0
+
+
+def test_idle_reaper():
+    realm_manager = RealmManager()
+    reaper = IdleReaper(realm_manager, idle_timeout=3, heartbeat_interval=1, tick=1)
+    realm_manager.idle_reaper = reaper
+
+    heartbeats = []
+    transports = []
+    for _ in range(2):
+        transport = transport_base()
+        transport.realm_manager = realm_manager
+        transport.send_heartbeat = lambda transport=transport: heartbeats.append(
+            transport
+        )
+        transport.connect("a.realm")
+        transports.append(transport)
+    idle, alive = transports
+    assert len(reaper.wheel) == 2
+
+    for _ in range(3):
+        idle.session.last_activity -= 1
+        reaper.tick()
+        alive.touch()
+    assert heartbeats == [idle, idle]
+    assert idle.session.state == STATE_CLOSED
+    assert idle._closed
+    assert alive.session.state != STATE_CLOSED
+    assert len(reaper.wheel) == 1
+
+    alive.receive(OP.GOODBYE, {}, "wamp.close.normal")
+    assert len(reaper.wheel) == 0
+
+
+def test_idle_reaper_needs_router_loop():
+    with pytest.raises(RuntimeError):
+        IdleReaper(RealmManager()).start()
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+from ..opcodes import OP
+from ..realm import RealmManager
+from ..router_loop import AsyncioRouterLoop, ThreadRouterLoop
+from .test_session import transport_base
+
+
+def test_thread_router_loop():
+    manager = RealmManager()
+    manager.router_loop = ThreadRouterLoop()
+    manager.router_loop.start()
+
+    subscriber = transport_base()
+    subscriber.realm_manager = manager
+    subscriber.receive(OP.HELLO, "a.realm", {})
+    subscriber.receive(OP.SUBSCRIBE, 1, {}, "a.topic")
+
+    def client(i):
+        transport = transport_base()
+        transport.realm_manager = manager
+        transport.receive(OP.HELLO, "a.realm", {})
+        for j in range(1, 101):
+            transport.receive(OP.SUBSCRIBE, j, {}, f"a.topic.{i}")
+            transport.receive(OP.PUBLISH, j, {}, "a.topic", [i, j])
+        transport.receive(OP.GOODBYE, {}, "wamp.close.goodbye_and_out")
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manager.router_loop.stop()
+
+    events = [args[3] for opcode, args in subscriber._sends if opcode == OP.EVENT]
+    assert len(events) == 1000
+    for i in range(10):
+        assert [j for k, j in events if k == i] == list(range(1, 101))
+
+    realm = manager.realms["a.realm"]
+    assert realm.sessions == {subscriber.session}
+    assert list(realm.subscriptions.iter_patterns()) == [("a.topic", "exact")]
+
+
+def test_asyncio_router_loop():
+    async def run():
+        loop = asyncio.get_running_loop()
+        router_loop = AsyncioRouterLoop(loop)
+        router_loop.batch_size = 10
+        done = loop.create_future()
+        results = []
+        batches = []
+
+        def work(i):
+            results.append((threading.get_ident(), i))
+            if len(results) == 100:
+                done.set_result(None)
+
+        original_run_batch = router_loop.run_batch
+
+        def run_batch(batch):
+            batches.append(len(batch))
+            original_run_batch(batch)
+
+        router_loop.run_batch = run_batch
+
+        def producer():
+            for i in range(50):
+                router_loop.submit(work, i)
+
+        threads = [threading.Thread(target=producer) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        await asyncio.wait_for(done, 5)
+        assert {ident for ident, i in results} == {threading.get_ident()}
+        assert sorted(i for ident, i in results) == sorted(list(range(50)) * 2)
+        assert max(batches) <= 10
+
+    asyncio.run(run())
@@ -1,8 +1,13 @@
+import asyncio
+import threading
+import time
+
 import pytest
 
 from ..opcodes import OP
 from ..pattern import Pattern
 from ..realm import realm_manager
+from ..router_loop import AsyncioRouterLoop
 from ..session import STATE_CLOSED, STATE_UNAUTHENTICATED
 from ..transports.base import TransportBase
 
@@ -121,7 +126,12 @@ def test_subscribe_unsubscribe(transport, transport2, transport3):
     transport3_a_topic_subscription_id = args[1]
 
     transport2.receive(
-        OP.PUBLISH, transport2.generate_id(), {}, "a.topic", ["b"], {"c": "d"}
+        OP.PUBLISH,
+        transport2.generate_id(),
+        {"exclude_me": False},
+        "a.topic",
+        ["b"],
+        {"c": "d"},
     )
     opcode, args = transport2.get_reply()
     assert opcode == OP.EVENT
@@ -570,3 +580,657 @@ def test_register_wildcard(transport, transport2, transport3):
     assert args[4] == {"b": "c"}
 
     assert transport3.is_empty()
+
+
+def test_publish_batch(transport, transport2, transport3):
+    opcode, args = transport.connect("a.realm")
+    assert args[1]["roles"]["broker"]["features"]["publish_batch"]
+    transport2.receive(
+        OP.HELLO,
+        "a.realm",
+        {"roles": {"subscriber": {"features": {"event_batch": True}}}},
+    )
+    transport2.get_reply()
+    transport3.connect("a.realm")
+
+    transport2.receive(OP.SUBSCRIBE, transport2.generate_id(), {"match": "prefix"}, "a")
+    opcode, args = transport2.get_reply()
+    transport2_subscription_id = args[1]
+    transport3.receive(OP.SUBSCRIBE, transport3.generate_id(), {}, "a.topic")
+    opcode, args = transport3.get_reply()
+    transport3_subscription_id = args[1]
+
+    transport.receive(
+        OP.PUBLISH_BATCH,
+        transport.generate_id(),
+        {"acknowledge": True},
+        [["a.topic", ["a"]], ["a.other_topic", [], {"b": "c"}], ["a.topic"]],
+    )
+    opcode, args = transport.get_reply()
+    assert opcode == OP.PUBLISHED
+    assert args[0] == transport._last_id
+
+    opcode, args = transport2.get_reply()
+    assert opcode == OP.EVENT_BATCH
+    events = args[0]
+    assert len(events) == 3
+    assert all(event[0] == transport2_subscription_id for event in events)
+    assert [event[2] for event in events] == [
+        {"topic": "a.topic"},
+        {"topic": "a.other_topic"},
+        {"topic": "a.topic"},
+    ]
+    assert events[0][3:] == [["a"]]
+    assert events[1][3:] == [[], {"b": "c"}]
+    assert events[2][3:] == []
+    assert transport2.is_empty()
+
+    opcode, args = transport3.get_reply()
+    assert opcode == OP.EVENT
+    assert args[0] == transport3_subscription_id
+    opcode, args = transport3.get_reply()
+    assert opcode == OP.EVENT
+    assert args[3] == ["a"]
+    assert transport3.is_empty()
+
+    transport.receive(OP.PUBLISH_BATCH, transport.generate_id(), {}, [])
+    assert transport.is_empty()
+    transport.receive(
+        OP.PUBLISH_BATCH, transport.generate_id(), {"acknowledge": True}, []
+    )
+    opcode, args = transport.get_reply()
+    assert opcode == OP.ERROR
+    assert args[:2] == (OP.PUBLISH_BATCH, transport._last_id)
+    assert args[3] == "wamp.error.invalid_argument"
+
+    transport.receive(
+        OP.PUBLISH_BATCH, transport.generate_id(), {}, [["a.topic"], ["wamp.topic"]]
+    )
+    opcode, args = transport.get_reply()
+    assert opcode == OP.ABORT
+    assert args[1] == "wamp.error.protocol_violation"
+    assert transport2.is_empty()
+
+
+def test_subscription_filter(transport, transport2, transport3):
+    transport.connect("a.realm")
+    transport2.connect("a.realm")
+    transport3.connect("a.realm")
+
+    transport2.receive(
+        OP.SUBSCRIBE, transport2.generate_id(), {"filter": "price > 10"}, "a.topic"
+    )
+    opcode, args = transport2.get_reply()
+    assert opcode == OP.SUBSCRIBED
+    transport3.receive(
+        OP.SUBSCRIBE,
+        transport3.generate_id(),
+        {"filter": "symbol in ['ACME'] and price > 10"},
+        "a.topic",
+    )
+    opcode, args = transport3.get_reply()
+    assert opcode == OP.SUBSCRIBED
+
+    transport.receive(
+        OP.PUBLISH, transport.generate_id(), {}, "a.topic", [], {"price": 5}
+    )
+    assert transport2.is_empty()
+    assert transport3.is_empty()
+
+    transport.receive(
+        OP.PUBLISH, transport.generate_id(), {}, "a.topic", [], {"price": 15}
+    )
+    opcode, args = transport2.get_reply()
+    assert opcode == OP.EVENT
+    assert args[4] == {"price": 15}
+    assert transport3.is_empty()
+
+    transport.receive(
+        OP.PUBLISH,
+        transport.generate_id(),
+        {},
+        "a.topic",
+        [],
+        {"price": 15, "symbol": "ACME"},
+    )
+    assert transport2.get_reply()[0] == OP.EVENT
+    assert transport3.get_reply()[0] == OP.EVENT
+
+    transport2.receive(
+        OP.SUBSCRIBE, transport2.generate_id(), {"filter": "__import__('os')"}, "a"
+    )
+    opcode, args = transport2.get_reply()
+    assert opcode == OP.ERROR
+    assert args[3] == "wamp.error.invalid_argument"
+
+
+def test_publish_exclusion(transport, transport2, transport3):
+    opcode, args = transport.connect("a.realm")
+    transport_session_id = args[0]
+    assert transport_session_id == transport.session.session_id
+    unauthenticated = transport_base()
+    unauthenticated.receive(OP.HELLO, "a.realm", {"authid": "user2"})
+    assert unauthenticated.session.authid is None
+    unauthenticated.disconnect()
+
+    transport2.get_authid = lambda details: "user2"
+    transport3.get_authid = lambda details: "user3"
+    opcode, args = transport2.connect("a.realm")
+    transport2_session_id = args[0]
+    transport3.connect("a.realm")
+
+    for t in [transport, transport2, transport3]:
+        t.receive(OP.SUBSCRIBE, t.generate_id(), {}, "a.topic")
+        assert t.get_reply()[0] == OP.SUBSCRIBED
+
+    def receivers(options):
+        transport.receive(OP.PUBLISH, transport.generate_id(), options, "a.topic")
+        received = []
+        for t in [transport, transport2, transport3]:
+            if not t.is_empty():
+                assert t.get_reply()[0] == OP.EVENT
+                received.append(t)
+            assert t.is_empty()
+        return received
+
+    assert receivers({}) == [transport2, transport3]
+    assert receivers({"exclude_me": False}) == [transport, transport2, transport3]
+    assert receivers({"exclude": [transport2_session_id]}) == [transport3]
+    assert receivers({"eligible": [transport2_session_id]}) == [transport2]
+    assert receivers({"exclude_me": False, "eligible": []}) == []
+    assert receivers({"exclude_authid": ["user3"]}) == [transport2]
+    assert receivers({"eligible_authid": ["user3"]}) == [transport3]
+    assert receivers(
+        {"eligible_authid": ["user2", "user3"], "exclude_authid": ["user2"]}
+    ) == [transport3]
+
+
+def test_event_history(transport, transport2):
+    realm_manager.set_event_history("a.realm", [("a", "prefix", 2)])
+    try:
+        transport.connect("a.realm")
+        for i in range(3):
+            transport.receive(
+                OP.PUBLISH, transport.generate_id(), {}, "a.topic", [i], {"i": i}
+            )
+        transport.receive(OP.PUBLISH, transport.generate_id(), {}, "b.topic", [3])
+
+        transport2.connect("a.realm")
+        transport2.receive(
+            OP.SUBSCRIBE,
+            transport2.generate_id(),
+            {"get_retained": True, "filter": "i > 1"},
+            "a.topic",
+        )
+        opcode, args = transport2.get_reply()
+        assert opcode == OP.EVENT
+        assert args[2] == {"topic": "a.topic", "retained": True}
+        assert args[3] == [2]
+        opcode, args = transport2.get_reply()
+        assert opcode == OP.SUBSCRIBED
+        subscription_id = args[1]
+
+        transport2.receive(
+            OP.CALL,
+            transport2.generate_id(),
+            {},
+            "wamp.subscription.get_events",
+            [subscription_id],
+        )
+        opcode, args = transport2.get_reply()
+        assert opcode == OP.RESULT
+        assert [event["args"] for event in args[2][0]] == [[1], [2]]
+        assert args[2][0][0]["subscription"] == subscription_id
+
+        transport.receive(
+            OP.CALL,
+            transport.generate_id(),
+            {},
+            "wamp.subscription.get_events",
+            [subscription_id],
+        )
+        opcode, args = transport.get_reply()
+        assert opcode == OP.ERROR
+        assert args[3] == "wamp.error.no_such_subscription"
+
+        for call_args, call_kwargs in [
+            ([[subscription_id]], {}),
+            ([subscription_id], {"limit": "1"}),
+            ([subscription_id, True], {}),
+        ]:
+            transport2.receive(
+                OP.CALL,
+                transport2.generate_id(),
+                {},
+                "wamp.subscription.get_events",
+                call_args,
+                call_kwargs,
+            )
+            opcode, args = transport2.get_reply()
+            assert opcode == OP.ERROR
+            assert args[3] == "wamp.error.invalid_argument"
+
+        transport.receive(OP.CALL, transport.generate_id(), {}, "wamp.session.kill")
+        opcode, args = transport.get_reply()
+        assert opcode == OP.ABORT
+        assert args[1] == "wamp.error.protocol_violation"
+    finally:
+        realm_manager.event_history = {}
+
+
+def test_event_history_receivers(transport, transport2, transport3):
+    realm_manager.set_event_history("a.realm", [("a.topic", "exact", 10)])
+    try:
+        transport.connect("a.realm")
+        transport2.connect("a.realm")
+        transport3.connect("a.realm")
+        transport.receive(
+            OP.PUBLISH,
+            transport.generate_id(),
+            {"eligible": [transport2.session.session_id]},
+            "a.topic",
+            ["secret"],
+        )
+        transport.receive(
+            OP.PUBLISH, transport.generate_id(), {}, "a.topic", ["public"]
+        )
+
+        for t in (transport2, transport3):
+            t.receive(OP.SUBSCRIBE, 1, {"get_retained": True}, "a.topic")
+            subscription_id = t._sends[0][1][1]
+            t.receive(OP.CALL, 2, {}, "wamp.subscription.get_events", [subscription_id])
+            opcode, args = t.get_reply()
+            assert opcode == OP.RESULT
+            t.events = [event["args"] for event in args[2][0]]
+            t.retained = [args[3] for opcode, args in t._sends if opcode == OP.EVENT]
+
+        assert transport2.events == transport2.retained == [["secret"], ["public"]]
+        assert transport3.events == transport3.retained == [["public"]]
+    finally:
+        realm_manager.event_history = {}
+
+
+def test_result_cache(transport, transport2):
+    transport.connect("a.realm")
+    transport2.connect("a.realm")
+
+    transport.receive(
+        OP.REGISTER, transport.generate_id(), {"cache_ttl": 60}, "a.procedure"
+    )
+    opcode, args = transport.get_reply()
+    registration_id = args[1]
+
+    transport2.receive(OP.CALL, transport2.generate_id(), {}, "a.procedure", ["a"])
+    opcode, args = transport.get_reply()
+    assert opcode == OP.INVOCATION
+    transport.receive(OP.YIELD, args[0], {}, ["result"])
+    opcode, args = transport2.get_reply()
+    assert opcode == OP.RESULT
+    assert args[2] == ["result"]
+
+    transport2.receive(OP.CALL, transport2.generate_id(), {}, "a.procedure", ["a"])
+    opcode, args = transport2.get_reply()
+    assert opcode == OP.RESULT
+    assert args[0] == transport2._last_id
+    assert args[2] == ["result"]
+    assert transport.is_empty()
+
+    transport2.receive(OP.CALL, transport2.generate_id(), {}, "a.procedure", ["b"])
+    opcode, args = transport.get_reply()
+    assert opcode == OP.INVOCATION
+    transport.receive(OP.ERROR, OP.INVOCATION, args[0], {}, "wamp.error.runtime_error")
+    transport2.get_reply()
+
+    transport2.receive(
+        OP.CALL, transport2.generate_id(), {}, "wamp.registration.cache_stats"
+    )
+    opcode, args = transport2.get_reply()
+    assert args[3] == {"hits": 1, "misses": 2, "size": 1}
+
+    transport2.receive(
+        OP.CALL,
+        transport2.generate_id(),
+        {},
+        "wamp.registration.invalidate_cache",
+        ["a.procedure"],
+    )
+    opcode, args = transport2.get_reply()
+    assert args[2] == [1]
+
+    transport2.receive(OP.CALL, transport2.generate_id(), {}, "a.procedure", ["a"])
+    assert transport.get_reply()[0] == OP.INVOCATION
+
+    transport.receive(OP.UNREGISTER, transport.generate_id(), registration_id)
+    assert not transport.session.realm.cache_ttls
+
+
+def test_call_coalescing(transport, transport2, transport3):
+    transport.connect("a.realm")
+    transport2.connect("a.realm")
+    transport3.connect("a.realm")
+    transport3._last_id = 100
+
+    transport.receive(
+        OP.REGISTER, transport.generate_id(), {"coalesce": True}, "a.procedure"
+    )
+    transport.get_reply()
+
+    transport2.receive(OP.CALL, transport2.generate_id(), {}, "a.procedure", ["a"])
+    opcode, args = transport.get_reply()
+    assert opcode == OP.INVOCATION
+    invocation_id = args[0]
+    transport3.receive(OP.CALL, transport3.generate_id(), {}, "a.procedure", ["a"])
+    transport2.receive(OP.CALL, transport2.generate_id(), {}, "a.procedure", ["b"])
+    opcode, args = transport.get_reply()
+    assert args[3] == ["b"]
+    other_invocation_id = args[0]
+    assert transport.is_empty()
+
+    transport.receive(OP.YIELD, invocation_id, {}, ["result"])
+    opcode, args = transport2.get_reply()
+    assert (opcode, args[0], args[2]) == (OP.RESULT, 1, ["result"])
+    opcode, args = transport3.get_reply()
+    assert (opcode, args[0], args[2]) == (OP.RESULT, 101, ["result"])
+    assert transport2.is_empty()
+
+    transport3.receive(OP.CALL, transport3.generate_id(), {}, "a.procedure", ["b"])
+    assert transport.is_empty()
+    transport.receive(
+        OP.ERROR, OP.INVOCATION, other_invocation_id, {}, "wamp.error.runtime_error"
+    )
+    opcode, args = transport2.get_reply()
+    assert (opcode, args[1], args[3]) == (OP.ERROR, 2, "wamp.error.runtime_error")
+    opcode, args = transport3.get_reply()
+    assert (opcode, args[1], args[3]) == (OP.ERROR, 102, "wamp.error.runtime_error")
+
+    transport2.receive(OP.CALL, transport2.generate_id(), {}, "a.procedure", ["a"])
+    transport.get_reply()
+    transport3.receive(OP.CALL, transport3.generate_id(), {}, "a.procedure", ["a"])
+    transport3.receive(OP.GOODBYE, {}, "wamp.close.normal")
+    transport3.get_reply()
+    transport.receive(OP.GOODBYE, {}, "wamp.close.normal")
+    opcode, args = transport2.get_reply()
+    assert (opcode, args[1], args[3]) == (OP.ERROR, 3, "wamp.error.callee_lost")
+    assert transport3.is_empty()
+    realm = transport2.session.realm
+    assert not realm.inflight
+    assert not realm.waiting_calls
+
+
+def test_call_concurrency(transport, transport2):
+    transport.connect("a.realm")
+    transport2.connect("a.realm")
+
+    transport.receive(
+        OP.REGISTER,
+        transport.generate_id(),
+        {"concurrency": 1, "queue_size": 2},
+        "a.procedure",
+    )
+    transport.get_reply()
+
+    for i in range(4):
+        transport2.receive(OP.CALL, transport2.generate_id(), {}, "a.procedure", [i])
+    opcode, args = transport2.get_reply()
+    assert (opcode, args[1], args[3]) == (OP.ERROR, 4, "wamp.error.busy")
+    assert transport2.is_empty()
+    opcode, args = transport.get_reply()
+    assert opcode == OP.INVOCATION
+    assert args[3] == [0]
+    assert transport.is_empty()
+
+    transport.receive(OP.YIELD, args[0], {}, ["result"])
+    assert transport2.get_reply()[1][0] == 1
+    opcode, args = transport.get_reply()
+    assert args[3] == [1]
+    assert transport.is_empty()
+
+    transport.receive(OP.ERROR, OP.INVOCATION, args[0], {}, "wamp.error.runtime_error")
+    assert transport2.get_reply()[1][1] == 2
+    opcode, args = transport.get_reply()
+    assert args[3] == [2]
+
+    transport2.receive(OP.CALL, transport2.generate_id(), {}, "a.procedure", [5])
+    transport.receive(OP.GOODBYE, {}, "wamp.close.normal")
+    opcode, args = transport2.get_reply()
+    assert (opcode, args[1], args[3]) == (OP.ERROR, 3, "wamp.error.callee_lost")
+    opcode, args = transport2.get_reply()
+    assert (opcode, args[1], args[3]) == (OP.ERROR, 5, "wamp.error.no_such_procedure")
+    assert not transport2.session.realm.call_queues
+
+
+def test_rate_limits(transport, transport2):
+    realm_manager.set_rate_limits(
+        "a.realm", session_limits={"publish": (0.001, 1), "call": (0.001, 1)}
+    )
+    try:
+        transport.connect("a.realm")
+        transport2.connect("a.realm")
+        transport2.receive(OP.SUBSCRIBE, transport2.generate_id(), {}, "a.topic")
+        transport2.get_reply()
+
+        transport.receive(OP.PUBLISH, transport.generate_id(), {}, "a.topic")
+        assert transport2.get_reply()[0] == OP.EVENT
+        transport.receive(OP.PUBLISH, transport.generate_id(), {}, "a.topic")
+        assert transport2.is_empty()
+        assert transport.is_empty()
+        transport.receive(
+            OP.PUBLISH, transport.generate_id(), {"acknowledge": True}, "a.topic"
+        )
+        opcode, args = transport.get_reply()
+        assert (opcode, args[0], args[1], args[3]) == (
+            OP.ERROR,
+            OP.PUBLISH,
+            3,
+            "wamp.error.throttled",
+        )
+
+        transport.receive(OP.CALL, transport.generate_id(), {}, "a.procedure")
+        assert transport.get_reply()[1][3] == "wamp.error.no_such_procedure"
+        transport.receive(OP.CALL, transport.generate_id(), {}, "not a valid uri")
+        assert transport.get_reply()[1][3] == "wamp.error.throttled"
+
+        rate_limiter = transport.session.realm.rate_limiter
+        assert rate_limiter.throttled == {"publish": 2, "call": 1}
+    finally:
+        realm_manager.rate_limits = {}
+
+
+def test_payload_size_exceeded(transport, transport2):
+    transport.connect("a.realm")
+    transport.max_payload_depth = 3
+
+    transport.receive(OP.PUBLISH, transport.generate_id(), {}, "a.topic", [[1]])
+    assert transport.is_empty()
+    transport.receive(OP.PUBLISH, transport.generate_id(), {}, "a.topic", [[[1]]])
+    opcode, args = transport.get_reply()
+    assert (opcode, args[0], args[1], args[3]) == (
+        OP.ERROR,
+        OP.PUBLISH,
+        2,
+        "wamp.error.payload_size_exceeded",
+    )
+
+    transport.receive_too_large(None, None)
+    opcode, args = transport.get_reply()
+    assert (opcode, args[1]) == (OP.ABORT, "wamp.error.payload_size_exceeded")
+    assert transport._closed
+
+
+def test_sessions_lost(transport, transport2, transport3):
+    transport.connect("a.realm")
+    transport2.connect("a.realm")
+    transport3.connect("a.realm")
+    realm = transport.session.realm
+
+    transport.receive(OP.REGISTER, transport.generate_id(), {}, "a.procedure")
+    transport.get_reply()
+    transport2.receive(OP.SUBSCRIBE, transport2.generate_id(), {}, "a.topic")
+    transport3.receive(OP.SUBSCRIBE, transport3.generate_id(), {}, "a.topic")
+    transport3.receive(OP.CALL, transport3.generate_id(), {}, "a.procedure")
+    transport2.receive(OP.CALL, 100, {}, "a.procedure")
+
+    realm.sessions_lost([transport.session, transport3.session])
+    opcode, args = transport2.get_reply()
+    assert (opcode, args[1], args[3]) == (OP.ERROR, 100, "wamp.error.callee_lost")
+    assert transport3.get_reply()[0] == OP.SUBSCRIBED
+    assert realm.sessions == {transport2.session}
+    assert [s for s, _ in realm.subscriptions.match_uri("a.topic")] == [
+        transport2.session
+    ]
+    assert realm.registrations.match_uri("a.procedure") is None
+    assert not realm.invocations
+    assert list(realm.calls) == [transport2.session]
+
+
+def test_async_authorization(transport, transport2):
+    async def run():
+        decided = asyncio.Event()
+
+        async def allowed(method, uri):
+            await decided.wait()
+            return uri != "b.topic"
+
+        transport.connect("a.realm")
+        transport2.connect("a.realm")
+        transport._method_uri_allowed = allowed
+
+        transport.receive(OP.SUBSCRIBE, 1, {}, "a.topic")
+        transport.receive(OP.SUBSCRIBE, 2, {}, "b.topic")
+        transport.receive(OP.UNSUBSCRIBE, 3, 1234)
+        transport2.receive(OP.SUBSCRIBE, transport2.generate_id(), {}, "a.topic")
+        assert transport2.get_reply()[0] == OP.SUBSCRIBED
+        await asyncio.sleep(0)
+        assert transport.is_empty()
+
+        decided.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        replies = [(opcode, args[0:2]) for opcode, args in transport._sends]
+        assert replies == [
+            (OP.SUBSCRIBED, (1, replies[0][1][1])),
+            (OP.ERROR, (OP.SUBSCRIBE, 2)),
+            (OP.ERROR, (OP.UNSUBSCRIBE, 3)),
+        ]
+
+        async def failing(method, uri):
+            raise ValueError("database is down")
+
+        transport._method_uri_allowed = failing
+        transport.receive(OP.CALL, 4, {}, "a.procedure")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        opcode, args = transport.get_reply()
+        assert opcode == OP.ABORT
+        assert transport.session.state == STATE_CLOSED
+
+    asyncio.run(run())
+
+
+def test_async_authorization_paused_limit(transport):
+    async def run():
+        decided = asyncio.Event()
+
+        async def allowed(method, uri):
+            await decided.wait()
+            return True
+
+        transport.connect("a.realm")
+        transport.max_paused_commands = 3
+        transport._method_uri_allowed = allowed
+
+        for i in range(1, 5):
+            transport.receive(OP.PUBLISH, i, {}, "a.topic")
+        assert transport.is_empty()
+
+        transport.receive(OP.PUBLISH, 5, {}, "a.topic")
+        opcode, args = transport.get_reply()
+        assert opcode == OP.ABORT
+        assert transport.session.state == STATE_CLOSED
+        assert transport.session.paused_commands is None
+
+        decided.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert transport.is_empty()
+
+    asyncio.run(run())
+
+
+def test_async_authorization_batch(transport):
+    async def run():
+        checks = []
+
+        async def allowed(method, uri):
+            checks.append(uri)
+            await asyncio.sleep(0)
+            return True
+
+        transport.connect("a.realm")
+        transport._method_uri_allowed = allowed
+        transport.receive(
+            OP.PUBLISH_BATCH,
+            1,
+            {"acknowledge": True},
+            [["a.topic"], ["b.topic"], ["c.topic"], ["a.topic"]],
+        )
+        transport.receive(OP.PUBLISH, 2, {"acknowledge": True}, "a.topic")
+        for _ in range(20):
+            await asyncio.sleep(0)
+
+        assert sorted(checks) == ["a.topic", "a.topic", "b.topic", "c.topic"]
+        assert [(opcode, args[0]) for opcode, args in transport._sends] == [
+            (OP.PUBLISHED, 1),
+            (OP.PUBLISHED, 2),
+        ]
+        assert not transport.session.decisions
+
+    asyncio.run(run())
+
+
+def test_async_authorization_from_thread(transport):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    transport.connect("a.realm")
+
+    async def allowed(method, uri):
+        return True
+
+    transport._method_uri_allowed = allowed
+    realm_manager.router_loop = AsyncioRouterLoop(loop)
+    try:
+        transport.session.handle_command(OP.SUBSCRIBE, 1, {}, "a.topic")
+        for _ in range(100):
+            if not transport.is_empty():
+                break
+            time.sleep(0.01)
+        assert transport.get_reply()[0] == OP.SUBSCRIBED
+
+        realm_manager.router_loop = None
+        transport.session.handle_command(OP.SUBSCRIBE, 2, {}, "b.topic")
+        assert transport.get_reply()[0] == OP.ABORT
+    finally:
+        realm_manager.router_loop = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_deferred_authorization(transport):
+    defer = pytest.importorskip("twisted.internet.defer")
+    deferred = defer.Deferred()
+    transport.connect("a.realm")
+    transport._method_uri_allowed = lambda method, uri: deferred
+
+    transport.receive(OP.REGISTER, 1, {}, "a.procedure")
+    transport._method_uri_allowed = lambda method, uri: True
+    transport.receive(OP.CALL, 2, {}, "a.procedure")
+    assert transport.is_empty()
+
+    deferred.callback(True)
+    opcode, args = transport.get_reply()
+    assert opcode == OP.INVOCATION
+    opcode, args = transport.get_reply()
+    assert opcode == OP.REGISTERED
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import socket
+import struct
+import sys
+
+import pytest
+
+from ..opcodes import OP
+from ..transports.rawsocket import start_rawsocket_server
+from ..transports.sharding import ShardedRouter, ShardRing
+
+
+class RawSocketClient:
+    def __init__(self, port):
+        self.socket = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.socket.sendall(bytes([0x7F, 0xF1, 0, 0]))
+        assert self.recv_exactly(4)[0] == 0x7F
+
+    def recv_exactly(self, length):
+        data = b""
+        while len(data) < length:
+            chunk = self.socket.recv(length - len(data))
+            assert chunk
+            data += chunk
+        return data
+
+    def send(self, *message):
+        payload = json.dumps(message).encode("utf-8")
+        self.socket.sendall(struct.pack("!I", len(payload)) + payload)
+
+    def receive(self):
+        (length,) = struct.unpack("!I", self.recv_exactly(4))
+        return json.loads(self.recv_exactly(length))
+
+    def close(self):
+        self.socket.close()
+
+
+def test_shard_ring():
+    ring = ShardRing(range(4))
+    realms = [f"realm{i}" for i in range(1000)]
+    owners = {realm: ring.get_shard(realm) for realm in realms}
+    assert set(owners.values()) == {0, 1, 2, 3}
+    assert all(ring.get_shard(realm) == owners[realm] for realm in realms)
+
+    ring.remove_shard(3)
+    for realm in realms:
+        if owners[realm] != 3:
+            assert ring.get_shard(realm) == owners[realm]
+        else:
+            assert ring.get_shard(realm) != 3
+
+
+def test_rawsocket_server():
+    async def run():
+        server = await start_rawsocket_server(port=0)
+        port = server.sockets[0].getsockname()[1]
+
+        def client():
+            subscriber = RawSocketClient(port)
+            subscriber.send(OP.HELLO, "a.realm", {})
+            assert subscriber.receive()[0] == OP.WELCOME
+            subscriber.send(OP.SUBSCRIBE, 1, {}, "a.topic")
+            assert subscriber.receive()[0] == OP.SUBSCRIBED
+
+            publisher = RawSocketClient(port)
+            publisher.send(OP.HELLO, "a.realm", {})
+            assert publisher.receive()[0] == OP.WELCOME
+            publisher.send(OP.PUBLISH, 1, {}, "a.topic", ["a"])
+
+            message = subscriber.receive()
+            assert message[0] == OP.EVENT
+            assert message[4] == ["a"]
+            subscriber.close()
+            publisher.close()
+
+        await asyncio.get_running_loop().run_in_executor(None, client)
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+
+
+@pytest.mark.skipif(not hasattr(socket, "send_fds"), reason="Requires send_fds")
+def test_sharded_router():
+    async def run():
+        router = ShardedRouter(port=0, workers=2)
+        await router.start()
+
+        def client():
+            clients = []
+            for realm in ["realm1", "realm2", "realm3", "realm4"]:
+                subscriber = RawSocketClient(router.port)
+                subscriber.send(OP.HELLO, realm, {})
+                assert subscriber.receive()[0] == OP.WELCOME
+                subscriber.send(OP.SUBSCRIBE, 1, {}, "a.topic")
+                assert subscriber.receive()[0] == OP.SUBSCRIBED
+
+                publisher = RawSocketClient(router.port)
+                publisher.send(OP.HELLO, realm, {})
+                assert publisher.receive()[0] == OP.WELCOME
+                publisher.send(OP.PUBLISH, 1, {}, "a.topic", [realm])
+
+                message = subscriber.receive()
+                assert message[0] == OP.EVENT
+                assert message[4] == [realm]
+                clients += [subscriber, publisher]
+
+            for c in clients:
+                c.close()
+
+        await asyncio.get_running_loop().run_in_executor(None, client)
+        await router.stop()
+
+    asyncio.run(run())
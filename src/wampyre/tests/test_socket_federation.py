@@ -0,0 +1,88 @@
+import asyncio
+
+from ..opcodes import OP
+from ..realm import RealmManager
+from ..transports.federation import SocketFederation
+from .test_session import transport_base
+
+
+def connect(federation, realm="a.realm"):
+    transport = transport_base()
+    transport.realm_manager = federation.realm_manager
+    transport.connect(realm)
+    return transport
+
+
+async def wait_for(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Condition never became true")
+
+
+def test_routers_on_localhost():
+    async def run():
+        node_a = SocketFederation(realm_manager=RealmManager())
+        await node_a.start()
+        node_b = SocketFederation(
+            realm_manager=RealmManager(), peers=[("127.0.0.1", node_a.port)]
+        )
+        await node_b.start()
+        node_c = SocketFederation(
+            realm_manager=RealmManager(),
+            peers=[("127.0.0.1", node_a.port), ("127.0.0.1", node_b.port)],
+        )
+        await node_c.start()
+        nodes = (node_a, node_b, node_c)
+        await wait_for(lambda: all(len(node.links) == 2 for node in nodes))
+
+        transport_a = connect(node_a)
+        transport_b = connect(node_b)
+        transport_c = connect(node_c)
+
+        transport_b.receive(
+            OP.SUBSCRIBE, transport_b.generate_id(), {"match": "prefix"}, "a"
+        )
+        transport_b.get_reply()
+        transport_c.receive(OP.REGISTER, transport_c.generate_id(), {}, "a.procedure")
+        transport_c.get_reply()
+        await wait_for(
+            lambda: "a.realm" in node_a.remote_subscriptions
+            and "a.realm" in node_a.remote_registrations
+        )
+        assert "a.realm" not in node_c.remote_registrations
+
+        transport_a.receive(OP.PUBLISH, transport_a.generate_id(), {}, "a.topic", [1])
+        await wait_for(lambda: not transport_b.is_empty())
+        opcode, args = transport_b.get_reply()
+        assert opcode == OP.EVENT
+        assert args[2] == {"topic": "a.topic"}
+        assert args[3] == [1]
+        assert transport_c.is_empty()
+
+        transport_a.receive(OP.CALL, transport_a.generate_id(), {}, "a.procedure", [2])
+        await wait_for(lambda: not transport_c.is_empty())
+        opcode, args = transport_c.get_reply()
+        assert opcode == OP.INVOCATION
+        assert args[3] == [2]
+
+        transport_c.receive(OP.YIELD, args[0], {}, [3])
+        await wait_for(lambda: not transport_a.is_empty())
+        opcode, args = transport_a.get_reply()
+        assert opcode == OP.RESULT
+        assert args[0] == transport_a._last_id
+        assert args[2] == [3]
+
+        transport_a.receive(OP.CALL, transport_a.generate_id(), {}, "a.procedure")
+        await wait_for(lambda: not transport_c.is_empty())
+        await node_c.stop()
+        await wait_for(lambda: not transport_a.is_empty())
+        opcode, args = transport_a.get_reply()
+        assert opcode == OP.ERROR
+        assert args[3] == "wamp.error.callee_lost"
+
+        await node_b.stop()
+        await node_a.stop()
+
+    asyncio.run(run())
@@ -1,4 +1,4 @@
-from ..utils import URIPattern
+from ..utils import URIPattern, payload_too_deep
 
 
 def test_uri_pattern_no_duplicate():
@@ -64,3 +64,70 @@ def test_uri_unregister():
         ("testsession2", pattern_s2_p2)
     ]
     assert pattern.unregister_session("testsession2")
+
+
+def test_uri_interest_callback():
+    pattern = URIPattern(True)
+    changes = []
+    pattern.interest_callback = lambda uri, match, added: changes.append(
+        (uri, match, added)
+    )
+
+    pattern_s1_p1 = pattern.register_uri("testsession1", "a1.b2", "exact")
+    pattern_s2_p1 = pattern.register_uri("testsession2", "a1.b2", "exact")
+    pattern.register_uri("testsession2", "a1", "prefix")
+    pattern.register_uri("testsession2", "a1..c3", "wildcard")
+    assert changes == [
+        ("a1.b2", "exact", True),
+        ("a1", "prefix", True),
+        ("a1..c3", "wildcard", True),
+    ]
+    assert sorted(pattern.iter_patterns()) == [
+        ("a1", "prefix"),
+        ("a1..c3", "wildcard"),
+        ("a1.b2", "exact"),
+    ]
+
+    changes.clear()
+    assert pattern.unregister_uri("testsession1", pattern_s1_p1)
+    assert changes == []
+    assert pattern.unregister_session("testsession2")
+    assert sorted(changes) == [
+        ("a1", "prefix", False),
+        ("a1..c3", "wildcard", False),
+        ("a1.b2", "exact", False),
+    ]
+
+
+def test_payload_too_deep():
+    assert not payload_too_deep(1, 0)
+    assert not payload_too_deep([1, {"a": [2]}], 3)
+    assert payload_too_deep([1, {"a": [2]}], 2)
+    assert payload_too_deep([[[[]]]], 3)
+    assert not payload_too_deep([[]] * 1000, 2)
+
+
+def test_uri_pattern_unregister_sessions():
+    pattern = URIPattern(True)
+    interest = []
+    pattern.interest_callback = lambda uri, match, added: interest.append(
+        (uri, match, added)
+    )
+
+    for session in ["s1", "s2", "s3"]:
+        pattern.register_uri(session, "a.b.c", "exact")
+        pattern.register_uri(session, "a.b", "prefix")
+    pattern_id = pattern.register_uri("s3", "a.d", "exact", "x == 1")
+    pattern.register_uri("s1", "e", "exact")
+    interest.clear()
+
+    pattern.unregister_sessions({"s1", "s2"})
+    assert [s for s, _ in pattern.match_uri("a.b.c")] == ["s3", "s3"]
+    assert "e" not in pattern.dict
+    assert interest == [("e", "exact", False)]
+
+    pattern.unregister_sessions({"s3"})
+    assert not pattern.dict
+    assert not pattern.filters
+    assert not pattern.sessions
+    assert len(interest) == 4
@@ -0,0 +1,38 @@
+import asyncio
+
+from .autowamp_common import ApplicationRunnerBase, WampLocalProtocolBase
+
+# Based on Autobahn ApplicationRunner, for autobahn.asyncio components
+
+
+class ApplicationRunner(ApplicationRunnerBase):
+    def __init__(self, realm=None, extra=None, loop=None):
+        super().__init__(realm, extra)
+        self.loop = loop
+
+    def create_protocol(self, session):
+        return WampLocalProtocol(session, loop=self.loop or asyncio.get_running_loop())
+
+
+class WampLocalProtocol(WampLocalProtocolBase):
+    """
+    Messages are passed as lists through the event loop.
+    """
+
+    def __init__(self, session, loop):
+        super().__init__(session)
+        self._loop = loop
+
+    def deliver_to_router(self, f, *args):
+        self._loop.call_soon(f, *args)
+
+    def deliver_to_session(self, f, *args):
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self._loop:
+            self._loop.call_soon(f, *args)
+        else:
+            self._loop.call_soon_threadsafe(f, *args)
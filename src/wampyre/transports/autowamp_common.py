@@ -0,0 +1,184 @@
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+
+import txaio
+
+from autobahn.wamp.interfaces import ITransport, ISerializer, IObjectSerializer
+from autobahn.wamp.serializer import Serializer
+from autobahn.wamp.types import ComponentConfig
+
+from ..session import STATE_CLOSED
+from .base import TransportBase
+
+# Shared between the Twisted and asyncio flavours of the Autobahn transport
+
+
+class ApplicationRunnerBase(ABC):
+    log = txaio.make_logger()
+
+    def __init__(self, realm=None, extra=None):
+        self.realm = realm
+        self.extra = extra or dict()
+
+    @abstractmethod
+    def create_protocol(self, session):
+        """Returns the protocol connecting session to the router"""
+
+    def run(self, make):
+        if callable(make):
+
+            def create():
+                cfg = ComponentConfig(self.realm, self.extra)
+                try:
+                    session = make(cfg)
+                except Exception:
+                    self.log.failure(
+                        "ApplicationSession could not be instantiated: {log_failure.value}"
+                    )
+                    raise
+                else:
+                    return session
+
+        else:
+            create = make
+
+        # Setup all the plumbing
+        session = create()
+        protocol = self.create_protocol(session)
+        transport = AutobahnTransport(protocol)
+        protocol._transport = transport
+
+        # Trigger a start
+        protocol.onOpen()
+
+        # Return callable to shut down the application
+        return protocol.close
+
+
+class LocalDelivery(threading.local):
+    """
+    Delivers messages in the calling thread.
+    Messages sent while delivering are queued to keep the stack flat,
+    every thread has its own queue.
+    """
+
+    log = txaio.make_logger()
+
+    def __init__(self):
+        self.queue = deque()
+        self.delivering = False
+
+    def __call__(self, f, *args):
+        self.queue.append((f, args))
+        if self.delivering:
+            return
+
+        self.delivering = True
+        try:
+            while self.queue:
+                f, args = self.queue.popleft()
+                try:
+                    f(*args)
+                except Exception:
+                    self.log.failure("Failed to deliver message: {log_failure.value}")
+        finally:
+            self.delivering = False
+
+
+local_delivery = LocalDelivery()
+
+
+class WampLocalProtocolBase(ABC):
+    """
+    Connects an Autobahn session to the router.
+    Subclasses decide how messages travel between them.
+    """
+
+    log = txaio.make_logger()
+
+    _session = None
+    _transport = None
+    _open = True
+    transport_details = None
+
+    def __init__(self, session):
+        self._session = session
+        self._serializer = PythonSerializer(PythonObjectSerializer())
+
+    @abstractmethod
+    def deliver_to_router(self, f, *args):
+        """Call f with a message for the router"""
+
+    @abstractmethod
+    def deliver_to_session(self, f, *args):
+        """Call f with a message for the session, in the thread of the session"""
+
+    def onOpen(self):
+        self._session.onOpen(self)
+
+    def send(self, message):
+        # Autobahn keeps args as tuples, the router and peers expect lists
+        msg = [list(v) if isinstance(v, tuple) else v for v in message.marshal()]
+        self.deliver_to_router(self._transport.receive, *msg)
+
+    def isOpen(self):
+        return self._open
+
+    def close(self):
+        if not self._open:
+            return
+
+        self._open = False
+        if self._transport.session.state != STATE_CLOSED:
+            self._transport.session_lost()
+        # After the messages still being delivered, in the thread of the session
+        self.deliver_to_session(self._session.onClose, True)
+
+    def abort(self):
+        self.close()
+
+    def onMessage(self, payload):
+        for msg in self._serializer.unserialize(payload):
+            self.deliver_to_session(self._session.onMessage, msg)
+
+
+ITransport.register(WampLocalProtocolBase)
+
+
+class AutobahnTransport(TransportBase):
+    def __init__(self, protocol):
+        super().__init__()
+        self.protocol = protocol
+
+    def send(self, opcode, *args):
+        self.protocol.onMessage([opcode] + list(args))
+
+    def realm_allowed(self, realm):
+        return True
+
+    def close_session(self):
+        self.protocol.close()
+
+    def method_uri_allowed(self, method, uri):
+        return True
+
+
+class PythonObjectSerializer:
+    NAME = "python"
+
+    def serialize(self, obj):
+        return obj
+
+    def unserialize(self, payload):
+        return [payload]
+
+
+IObjectSerializer.register(PythonObjectSerializer)
+
+
+class PythonSerializer(Serializer):
+    SERIALIZER_ID = "python"
+
+
+ISerializer.register(PythonSerializer)
@@ -1,9 +1,93 @@
+import re
+import time
 from abc import ABC, abstractmethod
+from collections import deque
 
+from ..opcodes import OP
+from ..realm import realm_manager
 from ..session import Session
 
+# Opcode and request id at the start of a message, read without decoding it
+MESSAGE_PREFIX = re.compile(r"^\s*\[\s*(\d+)\s*,\s*(\d+)")
+
+PRIORITY_CONTROL = 0
+PRIORITY_INVOCATION = 1
+PRIORITY_EVENT = 2
+
+
+def parse_message_prefix(data):
+    """
+    Returns (opcode, request_id) from the start of an encoded message,
+    (None, None) if they cannot be read.
+    """
+    prefix = data[:64]
+    if isinstance(prefix, (bytes, bytearray, memoryview)):
+        prefix = bytes(prefix).decode("ascii", "ignore")
+
+    match = MESSAGE_PREFIX.match(prefix)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    return None, None
+
+
+def message_priority(opcode):
+    if opcode in (OP.EVENT, OP.EVENT_BATCH):
+        return PRIORITY_EVENT
+    elif opcode == OP.INVOCATION:
+        return PRIORITY_INVOCATION
+    else:
+        return PRIORITY_CONTROL
+
+
+class PriorityOutbox:
+    """
+    Outbound messages of a session waiting to be written, in priority classes.
+
+    Messages are taken in weighted round robin, a class gets up to its weight of messages
+    before the next class gets a turn, so events are never starved by replies.
+    Messages of the same class keep their order. A last message, e.g. closing
+    the connection, is only taken when all classes are empty.
+    """
+
+    weights = (4, 2, 1)
+
+    def __init__(self):
+        self.queues = tuple(deque() for _ in self.weights)
+        self.last = None
+        self._current = 0
+        self._credit = self.weights[0]
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues) + (self.last is not None)
+
+    def put(self, priority, message):
+        self.queues[priority].append(message)
+
+    def put_last(self, message):
+        self.last = message
+
+    def pop(self):
+        for _ in range(len(self.queues) + 1):
+            queue = self.queues[self._current]
+            if queue and self._credit > 0:
+                self._credit -= 1
+                return queue.popleft()
+
+            self._current = (self._current + 1) % len(self.queues)
+            self._credit = self.weights[self._current]
+
+        if self.last is not None:
+            message, self.last = self.last, None
+            return message
+
+        raise IndexError("pop from an empty outbox")
+
 
 class TransportBase(ABC):
+    realm_manager = realm_manager
+    max_payload_depth = 32
+    max_paused_commands = 1000
+
     def __init__(self):
         self.session = Session(self)
 
@@ -13,18 +97,51 @@ class TransportBase(ABC):
 
     @abstractmethod
     def realm_allowed(self, realm):
-        """Check if a transport can access a realm"""
+        """Check if a transport can access a realm, may return an awaitable or a Deferred"""
 
     @abstractmethod
     def close_session(self):
         """Close a session"""
 
     def receive(self, *args):
-        self.session.handle_command(*args)
+        self.touch()
+        self.realm_manager.submit(self.session.handle_command, *args)
+
+    def touch(self):
+        """The client is alive, e.g. it sent a message or answered a heartbeat"""
+        self.session.last_activity = time.monotonic()
+
+    def send_heartbeat(self):
+        """Ask the client for a sign of life, if the transport supports it"""
+
+    def receive_too_large(self, opcode, request_id):
+        """
+        A message was larger than the transport allows and was not decoded.
+        """
+        self.realm_manager.submit(
+            self.session.payload_size_exceeded, opcode, request_id
+        )
 
     def session_lost(self):
-        self.session.close_session()
+        self.realm_manager.submit(self.session.close_session)
+
+    def get_authid(self, details):
+        """
+        Returns the authid of the session if the transport authenticated it.
+        The authid sent in HELLO is not checked and is not trusted.
+        """
+        return None
+
+    def get_user_key(self):
+        """
+        Returns a key for the authenticated user, sessions with the same key
+        can share authorization decisions. None if the user is not known.
+        """
+        return None
 
     @abstractmethod
     def method_uri_allowed(self, method, uri):
-        """Check if method and uri call is allowed by this transport"""
+        """
+        Check if method and uri call is allowed by this transport,
+        may return an awaitable or a Deferred
+        """
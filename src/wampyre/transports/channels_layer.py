@@ -0,0 +1,128 @@
+import asyncio
+import logging
+
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+
+from ..federation import FederationBase
+from ..realm import realm_manager
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelsLayerFederation(FederationBase):
+    """
+    Shares realms between Django Channels workers using the channel layer.
+
+    Every worker gets its own channel and joins a common group, interest
+    changes are sent to the group while publications and calls are only
+    sent to the channels of the workers that need them. Workers send heartbeats
+    to the group, a worker that stops sending them is forgotten.
+    """
+
+    group_name = "wampyre"
+
+    def __init__(
+        self, channel_layer=None, realm_manager=realm_manager, group_name=None
+    ):
+        super().__init__(realm_manager)
+        self.channel_layer = channel_layer or get_channel_layer()
+        if group_name is not None:
+            self.group_name = group_name
+
+        self.loop = None
+        self._outbox = None
+        self._tasks = []
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue()
+
+        self.node = await self.channel_layer.new_channel("wampyre.")
+        await self.channel_layer.group_add(self.group_name, self.node)
+
+        self.realm_manager.set_federation(self)
+        self._tasks = [
+            self.loop.create_task(self._receive_loop()),
+            self.loop.create_task(self._send_loop()),
+            self.loop.create_task(self._heartbeat_loop()),
+        ]
+        self.hello()
+
+    async def stop(self):
+        self.realm_manager.set_federation(None)
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+        await self.channel_layer.group_send(
+            self.group_name, {"type": "wampyre.goodbye", "node": self.node}
+        )
+        await self.channel_layer.group_discard(self.group_name, self.node)
+
+    def send_to(self, node, message):
+        self._submit(node, message)
+
+    def broadcast(self, message):
+        self._submit(None, message)
+
+    def _submit(self, node, message):
+        """
+        Queue a message for the sender task, safe to call from any thread.
+        """
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self.loop:
+            self._outbox.put_nowait((node, message))
+        else:
+            self.loop.call_soon_threadsafe(self._outbox.put_nowait, (node, message))
+
+    async def _send_loop(self):
+        while True:
+            node, message = await self._outbox.get()
+            try:
+                if node is None:
+                    await self.channel_layer.group_send(self.group_name, message)
+                else:
+                    await self.channel_layer.send(node, message)
+            except ChannelFull:
+                logger.warning(f"Channel for {node} is full, dropping message")
+            except Exception:
+                logger.exception(f"Failed to send message to {node}")
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            self.heartbeat()
+            self.realm_manager.submit(self.expire_nodes)
+
+    async def _receive_loop(self):
+        while True:
+            message = await self.channel_layer.receive(self.node)
+            try:
+                self.dispatch(message)
+            except Exception:
+                logger.exception(f"Failed to handle message {message!r}")
+
+
+class FederationMiddleware:
+    """
+    ASGI middleware that starts the federation when the first connection arrives.
+    """
+
+    def __init__(self, inner, federation=None):
+        self.inner = inner
+        self.federation = federation
+        self._started = None
+
+    async def __call__(self, scope, receive, send):
+        if self._started is None:
+            if self.federation is None:
+                self.federation = ChannelsLayerFederation()
+            self._started = asyncio.ensure_future(self.federation.start())
+        await self._started
+
+        return await self.inner(scope, receive, send)
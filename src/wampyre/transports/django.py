@@ -1,24 +1,88 @@
+import asyncio
+import inspect
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
 from channels.generic.websocket import JsonWebsocketConsumer
 
-from .base import TransportBase
+from ..codec import get_codec
+from ..router_loop import AsyncioRouterLoop
+from .base import (
+    PriorityOutbox,
+    TransportBase,
+    message_priority,
+    parse_message_prefix,
+)
 
 
 class WAMPRouter(JsonWebsocketConsumer):
     guard = None
     realm_authenticator = None
     user = None
+    codec = get_codec()
+    max_message_size = 16 * 1024 * 1024
 
     def __init__(self, *args, **kwargs):
         self.realm_authenticator = kwargs.pop("realm_authenticator", None)
         self.guard = kwargs.pop("guard", None)
+        max_message_size = kwargs.pop("max_message_size", None)
+        if max_message_size is not None:
+            self.max_message_size = max_message_size
+        max_payload_depth = kwargs.pop("max_payload_depth", None)
+
+        codec = kwargs.pop("codec", None)
+        if isinstance(codec, str):
+            codec = get_codec(codec)
+        if codec is not None:
+            self.codec = codec
 
         super().__init__(*args, **kwargs)
         self.transport = DjangoWebsocketTransport(self)
+        if (
+            inspect.iscoroutinefunction(self.guard)
+            or inspect.iscoroutinefunction(self.realm_authenticator)
+        ) and not isinstance(
+            self.transport.realm_manager.router_loop, AsyncioRouterLoop
+        ):
+            raise ValueError(
+                "A coroutine guard or realm_authenticator needs RouterLoopMiddleware"
+            )
+        if max_payload_depth is not None:
+            self.transport.max_payload_depth = max_payload_depth
 
     def connect(self):
         self.user = self.scope.get("user")
         self.accept("wamp.2.json")
 
+    def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if text_data is not None:
+            data = text_data
+            # A character takes up to 4 bytes, only longer texts are encoded to measure them
+            if len(data) * 4 > self.max_message_size:
+                size = len(data.encode("utf-8"))
+            else:
+                size = len(data)
+        elif bytes_data is not None:
+            data = bytes_data
+            size = len(data)
+        else:
+            raise ValueError("No data in incoming WebSocket frame!")
+
+        if size > self.max_message_size:
+            self.message_too_large(data)
+            return
+
+        self.receive_json(self.decode_json(data), **kwargs)
+
+    def message_too_large(self, data):
+        self.transport.receive_too_large(*parse_message_prefix(data))
+
+    def decode_json(self, data):
+        return self.codec.decode(data)
+
+    def encode_json(self, content):
+        return self.codec.encode(content)
+
     def receive_json(self, content):
         if not isinstance(content, list):
             pass  # TODO: some error?
@@ -27,10 +91,25 @@ class WAMPRouter(JsonWebsocketConsumer):
 
     def realm_allowed(self, realm):
         if self.realm_authenticator:
-            return self.realm_authenticator(self.user, realm)
+            return self.run_check(self.realm_authenticator, self.user, realm)
         else:
             return True
 
+    def run_check(self, check, *args):
+        """
+        Run a guard or realm_authenticator. When the router runs in the event loop,
+        a sync check runs in a worker thread as the Django ORM refuses sync queries there.
+        """
+        if not inspect.iscoroutinefunction(check):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+            else:
+                return database_sync_to_async(check)(*args)
+
+        return check(*args)
+
     def disconnect(self, code):
         self.transport.session_lost()
 
@@ -39,20 +118,67 @@ class DjangoWebsocketTransport(TransportBase):
     def __init__(self, consumer):
         super().__init__()
         self.consumer = consumer
+        self.outbox = PriorityOutbox()
+        self._flushing = False
 
     def send(self, opcode, *args):
-        self.consumer.send_json([opcode] + list(args))
+        self._base_send(
+            {
+                "type": "websocket.send",
+                "text": self.consumer.encode_json([opcode] + list(args)),
+            },
+            message_priority(opcode),
+        )
 
     def realm_allowed(self, realm):
-        if self.consumer.realm_authenticator:
-            self.consumer.realm_allowed(realm)
-        return True
+        return self.consumer.realm_allowed(realm)
 
     def close_session(self):
-        self.consumer.close()
+        # Sent last, after every message queued before it
+        self._base_send({"type": "websocket.close"})
+
+    def get_authid(self, details):
+        user = self.consumer.user
+        if user is not None and user.is_authenticated:
+            return user.get_username()
+        return None
+
+    def get_user_key(self):
+        user = self.consumer.user
+        if user is not None and user.is_authenticated:
+            return ("user", user.pk)
+        return None
+
+    def _base_send(self, message, priority=None):
+        """
+        Send from a consumer thread or from the event loop when it owns the router.
+        In the event loop, messages are queued and replies overtake events,
+        a message without priority is sent when the queue is empty.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            async_to_sync(self.consumer.base_send)(message)
+        else:
+            if priority is None:
+                self.outbox.put_last(message)
+            else:
+                self.outbox.put(priority, message)
+            if not self._flushing:
+                self._flushing = True
+                loop.create_task(self._flush())
+
+    async def _flush(self):
+        try:
+            while self.outbox:
+                await self.consumer.base_send(self.outbox.pop())
+        finally:
+            self._flushing = False
 
     def method_uri_allowed(self, method, uri):
         if self.consumer.guard:
-            return self.consumer.guard(self.consumer.user, method, uri)
+            return self.consumer.run_check(
+                self.consumer.guard, self.consumer.user, method, uri
+            )
         else:
             return True
@@ -0,0 +1,156 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ..opcodes import OP
+from .base import TransportBase
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorCallee(TransportBase):
+    """
+    Embedded callee that runs procedures in an executor, e.g. a ProcessPoolExecutor,
+    so slow procedures do not block the router.
+
+    At most max_concurrency invocations run at the same time, the rest wait in order.
+    Results are handed back through receive one at a time, use a router loop when
+    other threads call the router too.
+    """
+
+    def __init__(self, realm, executor=None, max_concurrency=None):
+        super().__init__()
+        self.realm_name = realm
+        self.executor = executor or ThreadPoolExecutor()
+        self.max_concurrency = max_concurrency
+
+        self.last_id = 0
+        self.procedures = {}
+        self.pending_registrations = {}
+
+        self._lock = threading.Lock()
+        # A result can be handed back while handing back another one, e.g. when
+        # the yield starts a queued call and the executor finishes it right away
+        self._receive_lock = threading.RLock()
+        self._running = 0
+        self._queue = deque()
+
+    def generate_id(self):
+        self.last_id += 1
+        return self.last_id
+
+    def connect(self):
+        self.receive(OP.HELLO, self.realm_name, {"roles": {"callee": {}}})
+
+    def register(self, procedure, f, options=None):
+        """
+        Register f as procedure, it is called with the args and kwargs of the call.
+        """
+        request_id = self.generate_id()
+        self.pending_registrations[request_id] = (procedure, f)
+        self.receive(OP.REGISTER, request_id, options or {}, procedure)
+
+    def close(self, wait=True):
+        self.receive(OP.GOODBYE, {}, "wamp.close.system_shutdown")
+        self.executor.shutdown(wait=wait)
+
+    ### Messages from the router ###
+    def send(self, opcode, *args):
+        if opcode == OP.REGISTERED:
+            request_id, registration_id = args
+            procedure, f = self.pending_registrations.pop(request_id)
+            self.procedures[registration_id] = f
+        elif opcode == OP.ERROR and args[0] == OP.REGISTER:
+            procedure, f = self.pending_registrations.pop(args[1])
+            logger.warning(f"Failed to register {procedure}: {args[3]}")
+        elif opcode == OP.INVOCATION:
+            self.invoke(*args)
+        elif opcode == OP.ABORT:
+            logger.warning(f"Session aborted: {args!r}")
+
+    def invoke(self, invocation_id, registration_id, details, args=None, kwargs=None):
+        f = self.procedures.get(registration_id)
+        if f is None:
+            self.receive(
+                OP.ERROR,
+                OP.INVOCATION,
+                invocation_id,
+                {},
+                "wamp.error.no_such_procedure",
+            )
+            return
+
+        with self._lock:
+            if (
+                self.max_concurrency is not None
+                and self._running >= self.max_concurrency
+            ):
+                self._queue.append((invocation_id, f, args, kwargs))
+                return
+            self._running += 1
+
+        self._submit((invocation_id, f, args, kwargs))
+
+    def _submit(self, invocation):
+        while invocation is not None:
+            invocation_id, f, args, kwargs = invocation
+            try:
+                future = self.executor.submit(f, *(args or []), **(kwargs or {}))
+            except Exception as e:
+                logger.exception(f"Failed to submit invocation {invocation_id}")
+                self._reply_error(invocation_id, e)
+                invocation = self._release()
+            else:
+                future.add_done_callback(
+                    lambda future, invocation_id=invocation_id: self._invocation_done(
+                        invocation_id, future
+                    )
+                )
+                return
+
+    def _invocation_done(self, invocation_id, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.exception(f"Invocation {invocation_id} failed")
+            self._reply_error(invocation_id, e)
+        else:
+            self._reply(OP.YIELD, invocation_id, {}, [result])
+
+        invocation = self._release()
+        if invocation is not None:
+            self._submit(invocation)
+
+    def _release(self):
+        """
+        Free the slot of a finished invocation, returns the next queued invocation to run in it.
+        """
+        with self._lock:
+            if not self._queue:
+                self._running -= 1
+                return None
+            return self._queue.popleft()
+
+    def _reply(self, *args):
+        with self._receive_lock:
+            self.receive(*args)
+
+    def _reply_error(self, invocation_id, e):
+        self._reply(
+            OP.ERROR,
+            OP.INVOCATION,
+            invocation_id,
+            {},
+            "wamp.error.runtime_error",
+            [str(e)],
+        )
+
+    def realm_allowed(self, realm):
+        return True
+
+    def close_session(self):
+        pass
+
+    def method_uri_allowed(self, method, uri):
+        return True
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import uuid
+
+from ..codec import get_codec
+from ..federation import FederationBase
+from ..realm import realm_manager
+
+logger = logging.getLogger(__name__)
+
+
+class SocketFederation(FederationBase):
+    """
+    Links router instances over TCP sockets.
+
+    Every router listens on host and port and connects to the routers listed in peers,
+    the links are bidirectional so a pair of routers only needs to be linked once.
+    Messages are newline delimited JSON.
+    """
+
+    max_message_size = 16 * 1024 * 1024
+    reconnect_delay = 1.0
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        peers=None,
+        realm_manager=realm_manager,
+        codec=None,
+    ):
+        super().__init__(realm_manager)
+        self.node = uuid.uuid4().hex
+        self.host = host
+        self.port = port
+        self.peers_addresses = list(peers or [])
+        self.codec = codec or get_codec()
+
+        self.links = {}
+        self.loop = None
+        self.server = None
+        self._tasks = []
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(
+            self._handle_incoming, self.host, self.port, limit=self.max_message_size
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+        self.realm_manager.set_federation(self)
+        for host, port in self.peers_addresses:
+            self.add_peer(host, port)
+
+    def add_peer(self, host, port):
+        """
+        Keep a link open to the router listening on host and port.
+        """
+        self._tasks.append(self.loop.create_task(self._connect_loop(host, port)))
+
+    async def stop(self):
+        self.realm_manager.set_federation(None)
+        self.goodbye()
+
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+        self.server.close()
+        for writer in list(self.links.values()):
+            writer.close()
+        await self.server.wait_closed()
+
+    def send_to(self, node, message):
+        writer = self.links.get(node)
+        if writer is None:
+            logger.debug(f"No link to {node}, dropping message")
+            return
+
+        self._write(writer, message)
+
+    def broadcast(self, message):
+        for writer in list(self.links.values()):
+            self._write(writer, message)
+
+    def _write(self, writer, message):
+        data = self.codec.encode(message).encode("utf-8") + b"\n"
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self.loop:
+            writer.write(data)
+        else:
+            self.loop.call_soon_threadsafe(writer.write, data)
+
+    async def _connect_loop(self, host, port):
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(
+                    host, port, limit=self.max_message_size
+                )
+            except OSError:
+                logger.debug(f"Unable to connect to {host}:{port}")
+            else:
+                await self._handle_link(reader, writer)
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _handle_incoming(self, reader, writer):
+        await self._handle_link(reader, writer)
+
+    async def _handle_link(self, reader, writer):
+        self._write(
+            writer,
+            {"type": "wampyre.hello", "node": self.node, "changes": self.snapshot()},
+        )
+
+        node = None
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+
+            message = self.codec.decode(line)
+            if message.get("type") != "wampyre.hello":
+                logger.warning("Federation link did not start with hello")
+                return
+
+            node = message["node"]
+            if node in self.links:
+                logger.debug(f"Already linked to {node}, closing new link")
+                node = None
+                return
+
+            self.links[node] = writer
+            self.realm_manager.submit(self.node_joined, node, message["changes"])
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    self.dispatch(self.codec.decode(line))
+                except Exception:
+                    logger.exception("Failed to handle federation message")
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            logger.info(f"Lost federation link to {node}")
+        finally:
+            writer.close()
+            if node is not None and self.links.get(node) is writer:
+                del self.links[node]
+                self.realm_manager.submit(self.node_lost, node)
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import struct
+
+from ..codec import get_codec
+from ..realm import realm_manager
+from ..session import STATE_CLOSED
+from .base import (
+    PriorityOutbox,
+    TransportBase,
+    message_priority,
+    parse_message_prefix,
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x7F
+
+SERIALIZER_JSON = 1
+
+FRAME_REGULAR = 0
+FRAME_PING = 1
+FRAME_PONG = 2
+
+ERROR_SERIALIZER_UNSUPPORTED = 1
+ERROR_MAX_LENGTH_UNACCEPTABLE = 2
+ERROR_RESERVED_BITS = 3
+
+
+def parse_handshake(data):
+    """
+    Parse the four byte handshake sent by a client.
+    Returns (serializer, max_length) or raises ValueError with the error code.
+    """
+    if data[0] != MAGIC:
+        raise ValueError(0)
+
+    if data[2] != 0 or data[3] != 0:
+        raise ValueError(ERROR_RESERVED_BITS)
+
+    serializer = data[1] & 0x0F
+    if serializer != SERIALIZER_JSON:
+        raise ValueError(ERROR_SERIALIZER_UNSUPPORTED)
+
+    return serializer, 2 ** (9 + (data[1] >> 4))
+
+
+def build_handshake(max_length_exponent, serializer):
+    return bytes([MAGIC, (max_length_exponent << 4) | serializer, 0, 0])
+
+
+def build_handshake_error(error_code):
+    return bytes([MAGIC, error_code << 4, 0, 0])
+
+
+def build_frame(payload, frame_type=FRAME_REGULAR):
+    return struct.pack("!I", (frame_type << 24) | len(payload)) + payload
+
+
+class RawSocketTransport(TransportBase):
+    def __init__(self, protocol):
+        super().__init__()
+        self.protocol = protocol
+
+    def send(self, opcode, *args):
+        self.protocol.send_message([opcode] + list(args))
+
+    def realm_allowed(self, realm):
+        return True
+
+    def close_session(self):
+        self.protocol.close()
+
+    def send_heartbeat(self):
+        self.protocol.send_ping()
+
+    def method_uri_allowed(self, method, uri):
+        return True
+
+
+class RawSocketProtocol(asyncio.Protocol):
+    """
+    WAMP over RawSocket, only the JSON serializer is supported.
+
+    If serializer is given the handshake is expected to already be done,
+    e.g. by a front end that handed over the connection.
+
+    Frames larger than max_length are skipped and answered with
+    wamp.error.payload_size_exceeded, the largest power of two within
+    max_length is announced in the handshake.
+    """
+
+    max_length_exponent = 15
+
+    def __init__(
+        self,
+        realm_manager=realm_manager,
+        codec=None,
+        serializer=None,
+        max_length=None,
+        max_payload_depth=None,
+    ):
+        self.realm_manager = realm_manager
+        self.codec = codec or get_codec()
+        self.serializer = serializer
+        self.client_max_length = 2**24
+        self.max_payload_depth = max_payload_depth
+
+        if max_length is None:
+            self.max_length = 2 ** (9 + self.max_length_exponent)
+        else:
+            self.max_length = max_length
+            self.max_length_exponent = min(15, max(0, max_length.bit_length() - 10))
+
+        self.transport = None
+        self.wamp_transport = None
+        self._buffer = bytearray()
+
+        self.outbox = PriorityOutbox()
+        self._paused = False
+        # Bytes left of a frame that was too large
+        self._skip = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.wamp_transport = RawSocketTransport(self)
+        self.wamp_transport.realm_manager = self.realm_manager
+        if self.max_payload_depth is not None:
+            self.wamp_transport.max_payload_depth = self.max_payload_depth
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        while self.outbox and not self._paused:
+            if self.transport.is_closing():
+                return
+            self.transport.write(self.outbox.pop())
+
+    def connection_lost(self, exc):
+        if self.wamp_transport.session.state != STATE_CLOSED:
+            self.wamp_transport.session_lost()
+
+    def data_received(self, data):
+        self._buffer += data
+        self.wamp_transport.touch()
+
+        if self.serializer is None:
+            if len(self._buffer) < 4:
+                return
+
+            try:
+                self.serializer, self.client_max_length = parse_handshake(
+                    self._buffer[:4]
+                )
+            except ValueError as e:
+                self.transport.write(build_handshake_error(e.args[0]))
+                self.transport.close()
+                return
+
+            del self._buffer[:4]
+            self.transport.write(
+                build_handshake(self.max_length_exponent, self.serializer)
+            )
+
+        offset = 0
+        while True:
+            if self._skip:
+                skipped = min(self._skip, len(self._buffer) - offset)
+                offset += skipped
+                self._skip -= skipped
+                if self._skip:
+                    break
+
+            if len(self._buffer) - offset < 4:
+                break
+
+            (header,) = struct.unpack_from("!I", self._buffer, offset)
+            frame_type, length = header >> 24, header & 0xFFFFFF
+            if length > self.max_length:
+                # The start of the frame is enough to answer the request
+                prefix_length = min(length, 64)
+                if len(self._buffer) - offset - 4 < prefix_length:
+                    break
+
+                logger.warning("Client sent a frame larger than allowed")
+                prefix = self._buffer[offset + 4 : offset + 4 + prefix_length]
+                self.wamp_transport.receive_too_large(*parse_message_prefix(prefix))
+                offset += 4
+                self._skip = length
+                if self.transport.is_closing():
+                    return
+                continue
+
+            if len(self._buffer) - offset - 4 < length:
+                break
+
+            payload = self._buffer[offset + 4 : offset + 4 + length]
+            offset += 4 + length
+
+            if frame_type == FRAME_REGULAR:
+                try:
+                    message = self.codec.decode(payload)
+                except ValueError:
+                    message = None
+
+                if isinstance(message, list) and message:
+                    self.wamp_transport.receive(*message)
+                else:
+                    logger.warning("Client sent a message that is not a list")
+                    self.close()
+                    return
+            elif frame_type == FRAME_PING:
+                self.transport.write(build_frame(bytes(payload), FRAME_PONG))
+
+            if self.transport.is_closing():
+                return
+
+        del self._buffer[:offset]
+
+    def send_message(self, message):
+        if self.transport is None or self.transport.is_closing():
+            return
+
+        payload = self.codec.encode(message).encode("utf-8")
+        if len(payload) > self.client_max_length:
+            logger.warning("Message is larger than the client accepts, dropping it")
+            return
+
+        # While the client is slow, replies overtake events
+        if self._paused or self.outbox:
+            self.outbox.put(message_priority(message[0]), build_frame(payload))
+        else:
+            self.transport.write(build_frame(payload))
+
+    def send_ping(self):
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.write(build_frame(b"", FRAME_PING))
+
+    def close(self):
+        if self.transport is not None:
+            # The transport writes its buffer before closing
+            while self.outbox and not self.transport.is_closing():
+                self.transport.write(self.outbox.pop())
+            self.transport.close()
+
+
+async def start_rawsocket_server(
+    host="127.0.0.1", port=8080, realm_manager=realm_manager
+):
+    """
+    Start a RawSocket router on host and port, returns an asyncio server.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(
+        lambda: RawSocketProtocol(realm_manager=realm_manager), host, port
+    )
@@ -0,0 +1,243 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import socket
+import struct
+
+from ..codec import get_codec
+from ..opcodes import OP
+from ..realm import realm_manager
+from .rawsocket import (
+    RawSocketProtocol,
+    build_handshake,
+    build_handshake_error,
+    parse_handshake,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_HELLO_LENGTH = 65536
+
+
+def hash_key(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class ShardRing:
+    """
+    Consistent hash ring, maps a realm to one of the shards.
+    Adding or removing a shard only moves the realms owned by that shard.
+    """
+
+    def __init__(self, shards, replicas=100):
+        self.replicas = replicas
+        self.ring = []
+        self.hashes = []
+        for shard in shards:
+            self.add_shard(shard)
+
+    def add_shard(self, shard):
+        for i in range(self.replicas):
+            bisect.insort(self.ring, (hash_key(f"{shard}:{i}"), shard))
+        self.hashes = [h for h, _ in self.ring]
+
+    def remove_shard(self, shard):
+        self.ring = [(h, s) for h, s in self.ring if s != shard]
+        self.hashes = [h for h, _ in self.ring]
+
+    def get_shard(self, key):
+        if not self.ring:
+            return None
+
+        i = bisect.bisect(self.hashes, hash_key(key)) % len(self.ring)
+        return self.ring[i][1]
+
+
+class ShardedRouter:
+    """
+    Runs a RawSocket router in a number of worker processes.
+
+    The front end accepts connections, does the RawSocket handshake and reads HELLO,
+    then hands the socket to the worker owning the realm.
+    All sessions of a realm end up in the same worker.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, workers=None, worker_init=None):
+        self.host = host
+        self.port = port
+        self.worker_count = workers or multiprocessing.cpu_count()
+        self.worker_init = worker_init
+        self.codec = get_codec()
+
+        self.ring = ShardRing(range(self.worker_count))
+        self.processes = []
+        self.worker_sockets = []
+        self.server_socket = None
+
+    def start_workers(self):
+        for i in range(self.worker_count):
+            parent_socket, child_socket = socket.socketpair(
+                socket.AF_UNIX, socket.SOCK_DGRAM
+            )
+            process = multiprocessing.Process(
+                target=run_worker,
+                args=(child_socket, self.worker_init),
+                name=f"wampyre-worker-{i}",
+                daemon=True,
+            )
+            process.start()
+            child_socket.close()
+
+            self.processes.append(process)
+            self.worker_sockets.append(parent_socket)
+
+    def stop_workers(self):
+        for worker_socket in self.worker_sockets:
+            worker_socket.send(b"")
+            worker_socket.close()
+
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        self.processes = []
+        self.worker_sockets = []
+
+    async def start(self):
+        """
+        Start the workers and listen for connections.
+        """
+        self.start_workers()
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(1024)
+        self.server_socket.setblocking(False)
+        self.port = self.server_socket.getsockname()[1]
+
+        self._accept_task = asyncio.get_running_loop().create_task(self._accept_loop())
+
+    async def stop(self):
+        self._accept_task.cancel()
+        self.server_socket.close()
+        self.stop_workers()
+
+    def run(self):
+        async def main():
+            await self.start()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await self.stop()
+
+        asyncio.run(main())
+
+    async def _accept_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            client_socket, address = await loop.sock_accept(self.server_socket)
+            loop.create_task(self._dispatch(client_socket))
+
+    async def _recv_exactly(self, client_socket, length):
+        loop = asyncio.get_running_loop()
+        data = bytearray()
+        while len(data) < length:
+            chunk = await loop.sock_recv(client_socket, length - len(data))
+            if not chunk:
+                raise ConnectionError("Connection closed during hand-off")
+            data += chunk
+        return bytes(data)
+
+    async def _dispatch(self, client_socket):
+        loop = asyncio.get_running_loop()
+        try:
+            handshake = await self._recv_exactly(client_socket, 4)
+            try:
+                serializer, max_length = parse_handshake(handshake)
+            except ValueError as e:
+                await loop.sock_sendall(client_socket, build_handshake_error(e.args[0]))
+                client_socket.close()
+                return
+
+            await loop.sock_sendall(
+                client_socket,
+                build_handshake(RawSocketProtocol.max_length_exponent, serializer),
+            )
+
+            header = await self._recv_exactly(client_socket, 4)
+            (length,) = struct.unpack("!I", header)
+            if length > MAX_HELLO_LENGTH:
+                raise ValueError("HELLO is too large")
+
+            payload = await self._recv_exactly(client_socket, length)
+            message = self.codec.decode(payload)
+            if (
+                not isinstance(message, list)
+                or len(message) < 2
+                or message[0] != OP.HELLO
+                or not isinstance(message[1], str)
+            ):
+                raise ValueError("First message was not HELLO")
+        except (ConnectionError, ValueError):
+            logger.info("Client failed before sending HELLO")
+            client_socket.close()
+            return
+
+        worker = self.ring.get_shard(message[1])
+        socket.send_fds(
+            self.worker_sockets[worker],
+            [handshake[1:2] + header + payload],
+            [client_socket.fileno()],
+        )
+        client_socket.close()
+
+
+def run_worker(control_socket, worker_init=None):
+    """
+    Entry point of a worker process, receives sockets from the front end.
+    """
+    if worker_init is not None:
+        worker_init()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        closed = loop.create_future()
+        control_socket.setblocking(False)
+
+        def receive_socket():
+            try:
+                data, fds, flags, address = socket.recv_fds(
+                    control_socket, MAX_HELLO_LENGTH + 5, 1
+                )
+            except BlockingIOError:
+                return
+
+            if not fds:
+                loop.remove_reader(control_socket)
+                closed.set_result(None)
+                return
+
+            loop.create_task(accept_socket(data, fds[0]))
+
+        async def accept_socket(data, fd):
+            def create_protocol():
+                protocol = RawSocketProtocol(
+                    realm_manager=realm_manager, serializer=data[0] & 0x0F
+                )
+                protocol.client_max_length = 2 ** (9 + (data[0] >> 4))
+                return protocol
+
+            client_socket = socket.socket(fileno=fd)
+            transport, protocol = await loop.connect_accepted_socket(
+                create_protocol, client_socket
+            )
+            protocol.data_received(data[1:])
+
+        loop.add_reader(control_socket, receive_socket)
+        await closed
+
+    asyncio.run(main())
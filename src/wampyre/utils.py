@@ -1,5 +1,8 @@
 import logging
 import random
+from weakref import WeakValueDictionary
+
+from .filter import EventFilter
 
 logger = logging.getLogger(__name__)
 
@@ -8,6 +11,24 @@ def generate_id():
     return random.randint(1, 2 ** 53)
 
 
+def payload_too_deep(value, max_depth):
+    """
+    Check if lists and dicts in value are nested deeper than max_depth.
+    """
+    containers = (list, tuple, dict)
+    stack = [(value, 0)] if isinstance(value, containers) else []
+    while stack:
+        value, depth = stack.pop()
+        if depth >= max_depth:
+            return True
+
+        if isinstance(value, dict):
+            value = value.values()
+        stack.extend((v, depth + 1) for v in value if isinstance(v, containers))
+
+    return False
+
+
 class TraverseDict(dict):
     def __init__(self, uri_fragment, parent=None, *args, **kwargs):
         self.uri_fragment = uri_fragment
@@ -28,6 +49,13 @@ class TraverseDict(dict):
 
         self.cleanup()
 
+    def unregister_sessions(self, sessions):
+        """
+        Unregister all patterns of a set of sessions in one pass.
+        """
+        self.sessions = [s for s in self.sessions if s[0] not in sessions]
+        self.cleanup()
+
     def has_sessions(self):
         return bool(self.sessions)
 
@@ -42,18 +70,35 @@ class TraverseDict(dict):
     def uri(self):
         d = self
         uri = []
-        while d.parent:
+        while d.parent is not None:
             uri.append(d.uri_fragment)
             d = d.parent
 
         return ".".join(uri[::-1])
 
+    @property
+    def pattern(self):
+        """
+        Returns the (uri, match) this node was registered with.
+        """
+        uri = self.uri
+        if self.uri_fragment == "*":
+            return uri[:-2], "prefix"
+        elif "" in uri.split("."):
+            return uri, "wildcard"
+        else:
+            return uri, "exact"
+
 
 class URIPattern:
     def __init__(self, allow_duplicate):
         self.allow_duplicate = allow_duplicate
         self.dict = TraverseDict(None)
         self.sessions = {}
+        self.interest_callback = None
+
+        self.filters = {}
+        self._compiled_filters = WeakValueDictionary()
 
     def traverse_patterns(self, uri_fragments, pattern, create=False):
         uri_fragment = uri_fragments.pop(0)
@@ -84,7 +129,10 @@ class URIPattern:
         else:
             return patterns
 
-    def register_uri(self, session, uri, match):
+    def register_uri(self, session, uri, match, event_filter=None):
+        if event_filter is not None:
+            event_filter = self.compile_filter(event_filter)
+
         pattern_id = generate_id()
 
         uri_fragments = uri.split(".")
@@ -93,10 +141,16 @@ class URIPattern:
             uri_fragments = uri_fragments + ["*"]
 
         pattern = self.traverse_patterns(uri_fragments, self.dict, create=True)[0]
-        if not self.allow_duplicate and pattern.has_sessions():
+        had_sessions = pattern.has_sessions()
+        if not self.allow_duplicate and had_sessions:
             return None
         pattern.register_session(session, pattern_id)
         self.sessions.setdefault(session, {})[pattern_id] = pattern
+        if event_filter is not None:
+            self.filters[pattern_id] = event_filter
+
+        if not had_sessions:
+            self._trigger_interest(pattern, True)
 
         return pattern_id
 
@@ -109,6 +163,10 @@ class URIPattern:
         pattern = session_uris[pattern_id]
         pattern.unregister_session(session, pattern_id)
         del session_uris[pattern_id]
+        self.filters.pop(pattern_id, None)
+
+        if not pattern.has_sessions():
+            self._trigger_interest(pattern, False)
 
         return True
 
@@ -119,9 +177,32 @@ class URIPattern:
         session_uris = self.sessions.pop(session)
         for pattern_id, pattern in session_uris.items():
             pattern.unregister_session(session, pattern_id)
+            self.filters.pop(pattern_id, None)
+            if not pattern.has_sessions():
+                self._trigger_interest(pattern, False)
 
         return True
 
+    def unregister_sessions(self, sessions):
+        """
+        Unregister a set of sessions, e.g. after a mass disconnect.
+        Every affected node is only pruned once.
+        """
+        patterns = {}
+        for session in sessions:
+            session_uris = self.sessions.pop(session, None)
+            if not session_uris:
+                continue
+
+            for pattern_id, pattern in session_uris.items():
+                patterns[id(pattern)] = pattern
+                self.filters.pop(pattern_id, None)
+
+        for pattern in patterns.values():
+            pattern.unregister_sessions(sessions)
+            if not pattern.has_sessions():
+                self._trigger_interest(pattern, False)
+
     def match_uri(self, uri):
         patterns = self.traverse_patterns(uri.split("."), self.dict)
         if self.allow_duplicate:
@@ -130,3 +211,32 @@ class URIPattern:
             return patterns[0].sessions[0]
         else:
             return None
+
+    def compile_filter(self, expression):
+        """
+        Returns the EventFilter for expression, identical expressions share one.
+        Raises InvalidFilterException if the expression is not allowed.
+        """
+        event_filter = self._compiled_filters.get(expression)
+        if event_filter is None:
+            event_filter = EventFilter(expression)
+            self._compiled_filters[expression] = event_filter
+        return event_filter
+
+    def iter_patterns(self, d=None):
+        """
+        Yields all (uri, match) patterns with at least one session.
+        """
+        if d is None:
+            d = self.dict
+
+        if d.has_sessions():
+            yield d.pattern
+
+        for child in list(d.values()):
+            yield from self.iter_patterns(child)
+
+    def _trigger_interest(self, pattern, added):
+        if self.interest_callback is not None:
+            uri, match = pattern.pattern
+            self.interest_callback(uri, match, added)